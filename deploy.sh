@@ -188,6 +188,28 @@ sudo systemctl start givepulse
 sudo systemctl enable givepulse
 sudo systemctl restart nginx
 
+# Background workers: queued email is only delivered while givepulse-mail runs,
+# and bulk-accepted appointments only get QR images while givepulse-qr runs
+print_status "Setting up background workers..."
+for worker in givepulse-mail givepulse-qr; do
+    sudo sed "s/^User=ubuntu$/User=$USER/" /var/www/givepulse/$worker.service | sudo tee /etc/systemd/system/$worker.service > /dev/null
+done
+sudo systemctl daemon-reload
+for worker in givepulse-mail givepulse-qr; do
+    sudo systemctl enable $worker
+    # Restart so a redeploy picks up the new code
+    sudo systemctl restart $worker
+done
+
+# Schedule the statistics rollup and dashboard counter refresh
+print_status "Setting up scheduled jobs..."
+for job in givepulse-daily-stats givepulse-site-counters; do
+    sudo sed "s/^User=ubuntu$/User=$USER/" /var/www/givepulse/$job.service | sudo tee /etc/systemd/system/$job.service > /dev/null
+    sudo cp /var/www/givepulse/$job.timer /etc/systemd/system/
+done
+sudo systemctl daemon-reload
+sudo systemctl enable --now givepulse-daily-stats.timer givepulse-site-counters.timer
+
 # Configure firewall
 print_status "Configuring firewall..."
 sudo ufw allow 'Nginx Full'
@@ -206,8 +228,11 @@ echo
 print_status "To check service status:"
 echo "sudo systemctl status givepulse"
 echo "sudo systemctl status nginx"
+echo "sudo systemctl status givepulse-mail givepulse-qr"
+echo "systemctl list-timers 'givepulse-*'"
 echo
 print_status "To view logs:"
 echo "sudo journalctl -u givepulse -f"
+echo "sudo journalctl -u givepulse-mail -u givepulse-qr -f"
 echo "tail -f /var/www/givepulse/logs/django.log"
 
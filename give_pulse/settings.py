@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "give_pulse_app.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -83,6 +84,9 @@ DATABASES = {
     "HOST": "127.0.0.1",
     "PORT": "3306",
     "OPTIONS": {"charset": "utf8mb4"},
+    # Keep each worker's connection for a minute, checked before reuse
+    "CONN_MAX_AGE": 60,
+    "CONN_HEALTH_CHECKS": True,
   }
 }
 
@@ -127,6 +131,19 @@ STATICFILES_DIRS = [
 ]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Certificates and appointment QR codes are sent by views after a permission
+# check (give_pulse_app.protected_media). "django" streams them with
+# FileResponse; "nginx" hands the transfer to nginx via X-Accel-Redirect.
+PROTECTED_MEDIA_SERVER = "django"
+PROTECTED_MEDIA_INTERNAL_URL = "/protected-media/"
+
+# Backend for generated media (QR codes, certificates, avatars); see
+# give_pulse_app.media_storage. S3MediaStorage takes bucket/endpoint_url/... OPTIONS.
+MEDIA_STORAGE = {
+    "BACKEND": "give_pulse_app.media_storage.LocalMediaStorage",
+    "OPTIONS": {},
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -134,3 +151,42 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Custom User Model
 AUTH_USER_MODEL = "give_pulse_app.User"
+
+# Sessions
+# The session only holds user_id, user_role and session_version, so it fits in
+# a signed cookie ("django.contrib.sessions.backends.signed_cookies") or the
+# cache ("django.contrib.sessions.backends.cache", only with a cache shared by
+# every worker such as Redis or Memcached, never LocMemCache) instead of a
+# django_session row. Logout bumps User.session_version, which revokes every
+# session issued to that user regardless of the engine.
+SESSION_ENGINE = "django.contrib.sessions.backends.db"
+
+# Per-view query/latency metrics (give_pulse_app.middleware.QueryMetricsMiddleware)
+# Fraction of requests measured; 0 disables. Summarise with `manage.py view_metrics`.
+VIEW_METRICS_SAMPLE_RATE = 0.0
+VIEW_METRICS_FLUSH_SECONDS = 60
+VIEW_METRICS_FILE = BASE_DIR / "logs" / "view_metrics.jsonl"
+
+# Seconds a verified appointment/certificate summary stays cached for scanners
+VERIFICATION_CACHE_SECONDS = 60
+
+# Keys handheld scanners send in X-Scanner-Key to call /api/verify/ without a staff login
+SCANNER_API_KEYS = []
+
+# Appointment scheduling (give_pulse_app.scheduling): slot length, earliest
+# start after an accept, and how far ahead to look for a free slot
+APPOINTMENT_SLOT_MINUTES = 120
+APPOINTMENT_LEAD_HOURS = 24
+APPOINTMENT_HORIZON_DAYS = 14
+
+# Admin changelists (give_pulse_app.pagination): unfiltered tables above this
+# many rows are counted from engine statistics; other counts are cached briefly
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100_000
+ADMIN_COUNT_CACHE_SECONDS = 60
+
+# Outgoing mail is queued (give_pulse_app.mail_queue) and delivered by
+# `manage.py send_queued_email`. In development messages are written to
+# files; for a local SMTP stand-in use the smtp backend with
+# EMAIL_HOST="localhost", EMAIL_PORT=1025 and `python -m aiosmtpd -n -l localhost:1025`.
+EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+EMAIL_FILE_PATH = BASE_DIR / "logs" / "emails"
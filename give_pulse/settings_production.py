@@ -6,6 +6,7 @@ This file contains production-specific configurations for AWS EC2 deployment.
 import os
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "give_pulse_app.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # For static files
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -76,9 +78,23 @@ DATABASES = {
             "charset": "utf8mb4",
             "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Persistent connections: each worker keeps its connection for
+        # CONN_MAX_AGE seconds and checks it is alive before reusing it
+        "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=60, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Optional read replica for read-only views (give_pulse_app.db.ReplicaRouter)
+if config('DB_REPLICA_HOST', default=''):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": config('DB_REPLICA_HOST'),
+        "PORT": config('DB_REPLICA_PORT', default=DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["give_pulse_app.db.ReplicaRouter"]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -118,6 +134,34 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Certificates and appointment QR codes are sent by views after a permission
+# check (give_pulse_app.protected_media). "nginx" hands the transfer to the
+# internal /protected-media/ location in nginx.conf via X-Accel-Redirect.
+PROTECTED_MEDIA_SERVER = config('PROTECTED_MEDIA_SERVER', default='nginx')
+PROTECTED_MEDIA_INTERNAL_URL = '/protected-media/'
+
+# Backend for generated media (QR codes, certificates, avatars); see
+# give_pulse_app.media_storage. Set MEDIA_S3_BUCKET to use an S3-compatible store.
+if config('MEDIA_S3_BUCKET', default=''):
+    MEDIA_STORAGE = {
+        'BACKEND': 'give_pulse_app.media_storage.S3MediaStorage',
+        'OPTIONS': {
+            'bucket': config('MEDIA_S3_BUCKET'),
+            'location': config('MEDIA_S3_PREFIX', default='media'),
+            'endpoint_url': config('MEDIA_S3_ENDPOINT_URL', default=None),
+            'region_name': config('MEDIA_S3_REGION', default=None),
+            'access_key': config('MEDIA_S3_ACCESS_KEY', default=None),
+            'secret_key': config('MEDIA_S3_SECRET_KEY', default=None),
+        },
+    }
+    # nginx cannot X-Accel-Redirect into a bucket; stream from Django instead.
+    PROTECTED_MEDIA_SERVER = 'django'
+else:
+    MEDIA_STORAGE = {
+        'BACKEND': 'give_pulse_app.media_storage.LocalMediaStorage',
+        'OPTIONS': {},
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -139,6 +183,10 @@ X_FRAME_OPTIONS = 'DENY'
 # CSRF_COOKIE_SECURE = True
 
 # Session Configuration
+# Signed-cookie sessions avoid a django_session read/write on every request;
+# logout revokes them server side through User.session_version.
+# Set SESSION_ENGINE=django.contrib.sessions.backends.db to go back to DB rows.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.signed_cookies')
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 3600  # 1 hour
@@ -206,8 +254,35 @@ CACHES = {
     }
 }
 
+# LocMemCache is per process: cache-backed sessions would be lost whenever a
+# request lands on another gunicorn worker
+if SESSION_ENGINE == 'django.contrib.sessions.backends.cache' and CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    raise ImproperlyConfigured('SESSION_ENGINE=cache needs a cache shared by all workers, not LocMemCache.')
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+# Per-view query/latency metrics (give_pulse_app.middleware.QueryMetricsMiddleware)
+# Fraction of requests measured; 0 disables. Summarise with `manage.py view_metrics`.
+VIEW_METRICS_SAMPLE_RATE = config('VIEW_METRICS_SAMPLE_RATE', default=0.05, cast=float)
+VIEW_METRICS_FLUSH_SECONDS = config('VIEW_METRICS_FLUSH_SECONDS', default=60, cast=int)
+VIEW_METRICS_FILE = BASE_DIR / 'logs' / 'view_metrics.jsonl'
+
+# Seconds a verified appointment/certificate summary stays cached for scanners
+VERIFICATION_CACHE_SECONDS = config('VERIFICATION_CACHE_SECONDS', default=60, cast=int)
+
+# Keys handheld scanners send in X-Scanner-Key to call /api/verify/ without a staff login
+SCANNER_API_KEYS = [key for key in config('SCANNER_API_KEYS', default='').split(',') if key]
+
+# Appointment scheduling (give_pulse_app.scheduling): slot length, earliest
+# start after an accept, and how far ahead to look for a free slot
+APPOINTMENT_SLOT_MINUTES = config('APPOINTMENT_SLOT_MINUTES', default=120, cast=int)
+APPOINTMENT_LEAD_HOURS = config('APPOINTMENT_LEAD_HOURS', default=24, cast=int)
+APPOINTMENT_HORIZON_DAYS = config('APPOINTMENT_HORIZON_DAYS', default=14, cast=int)
+
+# Admin changelists (give_pulse_app.pagination): unfiltered tables above this
+# many rows are counted from engine statistics; other counts are cached briefly
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+ADMIN_COUNT_CACHE_SECONDS = config('ADMIN_COUNT_CACHE_SECONDS', default=60, cast=int)
@@ -1,13 +1,19 @@
 from django.contrib import admin
+from django.http import HttpResponseRedirect
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.template.response import TemplateResponse
 from django.db.models import Count
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
 from .models import (
     Governorate, City, Hospital, User, Staff, Donor, BloodRequest, 
-    Match, DonationAppointment, Donation, SuccessStory, ContactMessage
+    Match, DonationAppointment, AppointmentSlot, Donation, SuccessStory, ContactMessage, OutboundEmail, EmailStatus
 )
+from .scheduling import apply_capacity
+from . import search, site_stats
+from .pagination import EstimatedCountPaginator
 
 # Custom Admin Site Configuration
 admin.site.site_header = "GivePulse Admin"
@@ -22,32 +28,19 @@ def custom_admin_index(request, extra_context=None):
     """Custom admin index with dashboard statistics"""
     extra_context = extra_context or {}
     
-    # Get statistics
-    total_hospitals = Hospital.objects.count()
-    verified_hospitals = Hospital.objects.filter(is_verified=True).count()
-    unverified_hospitals = total_hospitals - verified_hospitals
-    
-    total_staff = Staff.objects.count()
-    verified_staff = Staff.objects.filter(is_verified=True).count()
-    unverified_staff = total_staff - verified_staff
-    
-    total_donors = Donor.objects.count()
-    total_requests = BloodRequest.objects.count()
-    total_donations = Donation.objects.count()
-    total_lives_saved = total_donations  # Each donation saves one life
+    # Counters come from the stored snapshot; the "Refresh now" form POSTs to recompute them
+    if request.method == 'POST' and 'refresh_stats' in request.POST:
+        site_stats.refresh()
+        return HttpResponseRedirect(request.path)
+    counters, refreshed_at = site_stats.snapshot()
     
     # Add statistics to context
+    extra_context.update(counters)
     extra_context.update({
-        'total_hospitals': total_hospitals,
-        'verified_hospitals': verified_hospitals,
-        'unverified_hospitals': unverified_hospitals,
-        'total_staff': total_staff,
-        'verified_staff': verified_staff,
-        'unverified_staff': unverified_staff,
-        'total_donors': total_donors,
-        'total_requests': total_requests,
-        'total_donations': total_donations,
-        'total_lives_saved': total_lives_saved,
+        'unverified_hospitals': counters['total_hospitals'] - counters['verified_hospitals'],
+        'unverified_staff': counters['total_staff'] - counters['verified_staff'],
+        'total_lives_saved': counters['total_donations'],  # Each donation saves one life
+        'stats_refreshed_at': refreshed_at,
     })
     
     return original_index(request, extra_context)
@@ -55,9 +48,28 @@ def custom_admin_index(request, extra_context=None):
 # Replace the admin index view
 admin.site.index = custom_admin_index
 
+
+class GivePulseModelAdmin(admin.ModelAdmin):
+    """Base for every ModelAdmin here: changelists never run an exact COUNT(*) over a large table"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FullTextSearchMixin:
+    """Answer the changelist search box from the full-text search index.
+
+    ``search_fields`` still enables the box and documents what is indexed;
+    see search.FIELDS for the fields actually searched.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.words(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search.matching_ids(self.model, search_term)), False
+
 # Governorate Admin
 @admin.register(Governorate)
-class GovernorateAdmin(admin.ModelAdmin):
+class GovernorateAdmin(GivePulseModelAdmin):
     list_display = ['name', 'city_count']
     search_fields = ['name']
     ordering = ['name']
@@ -68,7 +80,7 @@ class GovernorateAdmin(admin.ModelAdmin):
 
 # City Admin
 @admin.register(City)
-class CityAdmin(admin.ModelAdmin):
+class CityAdmin(GivePulseModelAdmin):
     list_display = ['name', 'governorate', 'hospital_count', 'donor_count']
     list_filter = ['governorate']
     search_fields = ['name', 'governorate__name']
@@ -84,7 +96,7 @@ class CityAdmin(admin.ModelAdmin):
 
 # Hospital Admin
 @admin.register(Hospital)
-class HospitalAdmin(admin.ModelAdmin):
+class HospitalAdmin(GivePulseModelAdmin):
     list_display = ['name', 'city', 'verification_status', 'staff_count', 'request_count', 'created_at']
     list_filter = ['is_verified', 'city__governorate', 'created_at']
     search_fields = ['name', 'city__name']
@@ -99,12 +111,21 @@ class HospitalAdmin(admin.ModelAdmin):
             'fields': ('is_verified',),
             'description': 'Only verified hospitals can create blood requests'
         }),
+        ('Scheduling', {
+            'fields': ('slot_capacity',),
+            'description': 'Donors booked into each appointment slot; changes apply to upcoming slots'
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'slot_capacity' in form.changed_data:
+            apply_capacity(obj)
+    
     def verification_status(self, obj):
         if obj.is_verified:
             return format_html('<span class="verification-badge verified">Verified</span>')
@@ -134,7 +155,7 @@ class HospitalAdmin(admin.ModelAdmin):
 
 # User Admin
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(FullTextSearchMixin, GivePulseModelAdmin):
     list_display = ['email', 'first_name', 'last_name', 'role', 'created_at']
     list_filter = ['role', 'created_at']
     search_fields = ['first_name', 'last_name', 'email']
@@ -160,7 +181,7 @@ class UserAdmin(admin.ModelAdmin):
 
 # Staff Admin
 @admin.register(Staff)
-class StaffAdmin(admin.ModelAdmin):
+class StaffAdmin(GivePulseModelAdmin):
     list_display = ['user_name', 'hospital', 'verification_status', 'request_count', 'created_at']
     list_filter = ['is_verified', 'hospital__city__governorate', 'created_at']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'hospital__name']
@@ -208,14 +229,28 @@ class StaffAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} staff members have been unverified.')
     unverify_staff.short_description = "Unverify selected staff"
 
+class EligibilityFilter(admin.SimpleListFilter):
+    title = 'eligibility'
+    parameter_name = 'eligible'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Available now'), ('no', 'In cooldown')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.eligible()
+        if self.value() == 'no':
+            return queryset.in_cooldown()
+        return queryset
+
 # Donor Admin
 @admin.register(Donor)
-class DonorAdmin(admin.ModelAdmin):
+class DonorAdmin(FullTextSearchMixin, GivePulseModelAdmin):
     list_display = ['user_name', 'blood_type', 'city', 'cooldown_status', 'donation_count', 'created_at']
-    list_filter = ['abo', 'rh', 'city__governorate', 'eligibility_consent', 'created_at']
+    list_filter = [EligibilityFilter, 'abo', 'rh', 'city__governorate', 'eligibility_consent', 'created_at']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'city__name']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['donation_count', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Personal Information', {
@@ -225,7 +260,7 @@ class DonorAdmin(admin.ModelAdmin):
             'fields': ('abo', 'rh', 'city')
         }),
         ('Donation History', {
-            'fields': ('last_donation', 'cooldown_until')
+            'fields': ('donation_count', 'last_donation', 'cooldown_until')
         }),
         ('Settings', {
             'fields': ('eligibility_consent',)
@@ -236,6 +271,16 @@ class DonorAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_eligibility()
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        upload = form.cleaned_data.get('profile_picture')
+        if 'profile_picture' in form.changed_data and isinstance(upload, UploadedFile):
+            # Replace the raw upload with the resized WebP variants
+            obj.set_profile_picture(upload)
+    
     def user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}"
     user_name.short_description = 'Donor'
@@ -245,19 +290,17 @@ class DonorAdmin(admin.ModelAdmin):
     blood_type.short_description = 'Blood Type'
     
     def cooldown_status(self, obj):
-        if obj.is_in_cooldown():
+        if not obj.is_eligible:
             return format_html('<span class="verification-badge pending">In Cooldown</span>')
         else:
             return format_html('<span class="verification-badge verified">Available</span>')
     cooldown_status.short_description = 'Status'
+    cooldown_status.admin_order_field = 'is_eligible'
     
-    def donation_count(self, obj):
-        return obj.matches.filter(status='donated').count()
-    donation_count.short_description = 'Donations'
 
 # Blood Request Admin
 @admin.register(BloodRequest)
-class BloodRequestAdmin(admin.ModelAdmin):
+class BloodRequestAdmin(FullTextSearchMixin, GivePulseModelAdmin):
     list_display = ['request_id', 'hospital', 'blood_type', 'units_info', 'status', 'deadline', 'created_by_staff', 'created_at']
     list_filter = ['status', 'abo', 'rh', 'hospital__city__governorate', 'created_at']
     search_fields = ['hospital__name', 'created_by__user__first_name', 'created_by__user__last_name', 'notes']
@@ -317,7 +360,7 @@ class BloodRequestAdmin(admin.ModelAdmin):
 
 # Match Admin
 @admin.register(Match)
-class MatchAdmin(admin.ModelAdmin):
+class MatchAdmin(FullTextSearchMixin, GivePulseModelAdmin):
     list_display = ['match_id', 'blood_request', 'donor_name', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['blood_request__hospital__name', 'donor__user__first_name', 'donor__user__last_name']
@@ -334,7 +377,7 @@ class MatchAdmin(admin.ModelAdmin):
 
 # Donation Appointment Admin
 @admin.register(DonationAppointment)
-class DonationAppointmentAdmin(admin.ModelAdmin):
+class DonationAppointmentAdmin(GivePulseModelAdmin):
     list_display = ['appointment_id', 'match', 'window_start', 'window_end', 'qr_code_status']
     list_filter = ['created_at']
     search_fields = ['match__donor__user__first_name', 'match__donor__user__last_name']
@@ -352,9 +395,21 @@ class DonationAppointmentAdmin(admin.ModelAdmin):
             return format_html('<span class="verification-badge pending">Pending</span>')
     qr_code_status.short_description = 'QR Code'
 
+# Appointment Slot Admin
+@admin.register(AppointmentSlot)
+class AppointmentSlotAdmin(GivePulseModelAdmin):
+    list_display = ['hospital', 'starts_at', 'booked', 'capacity']
+    list_filter = ['hospital']
+    list_select_related = ['hospital']
+    ordering = ['-starts_at']
+    readonly_fields = ['hospital', 'starts_at', 'booked']
+    
+    def has_add_permission(self, request):
+        return False  # Slots are created by the scheduler when appointments are booked
+
 # Donation Admin
 @admin.register(Donation)
-class DonationAdmin(admin.ModelAdmin):
+class DonationAdmin(GivePulseModelAdmin):
     list_display = ['donation_id', 'match', 'units', 'confirmed_by_staff', 'certificate_status', 'confirmed_at']
     list_filter = ['confirmed_at']
     search_fields = ['match__donor__user__first_name', 'match__donor__user__last_name', 'certificate_serial']
@@ -380,7 +435,7 @@ class DonationAdmin(admin.ModelAdmin):
 
 # Success Story Admin
 @admin.register(SuccessStory)
-class SuccessStoryAdmin(admin.ModelAdmin):
+class SuccessStoryAdmin(GivePulseModelAdmin):
     list_display = ['title', 'donor_name', 'is_published', 'display_order', 'created_at']
     list_filter = ['is_published', 'created_at']
     search_fields = ['title', 'donor_name', 'story_text']
@@ -398,7 +453,7 @@ class SuccessStoryAdmin(admin.ModelAdmin):
 
 # Contact Message Admin
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(GivePulseModelAdmin):
     list_display = ['name', 'email', 'message_preview', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'email', 'message']
@@ -411,3 +466,28 @@ class ContactMessageAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False  # Contact messages are only created through the contact form
+
+# Outbound Email Admin
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(GivePulseModelAdmin):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to']
+    ordering = ['-created_at']
+    readonly_fields = ['subject', 'body', 'from_email', 'to', 'reply_to', 'attempts', 'last_error', 'created_at', 'sent_at']
+    
+    actions = ['retry_now']
+    
+    def recipients(self, obj):
+        return ", ".join(obj.to)
+    recipients.short_description = 'To'
+    
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=EmailStatus.SENT).update(
+            status=EmailStatus.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} emails queued for immediate retry.')
+    retry_now.short_description = "Retry selected emails now"
+    
+    def has_add_permission(self, request):
+        return False  # Emails are queued by the application
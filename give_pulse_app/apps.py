@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GivePulseAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "give_pulse_app"
+
+    def ready(self):
+        from . import scheduling  # noqa: F401  (releases slots of deleted appointments)
+        from . import search  # noqa: F401  (keeps the admin search index up to date)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@contextmanager
+def sandbox():
+    """Run benchmark traffic without leaving anything behind.
+
+    Enables the test client's "testserver" host, points MEDIA_ROOT at a
+    temporary directory (QR codes, certificates) and rolls back every
+    database write when the block exits.
+    """
+    media_root = tempfile.mkdtemp(prefix="givepulse-bench-")
+    setup_test_environment()
+    try:
+        with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+    finally:
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def login_client(email: str, password: str) -> Client:
+    client = Client()
+    client.post(reverse("login"), {"email": email, "password": password})
+    return client
+
+
+class Recorder:
+    """Collect latency and query counts for one benchmark scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings_ms: list[float] = []
+        self.queries = 0
+        self.errors = 0
+        self.last_queries = []
+        self._wall_start = time.perf_counter()
+        self._wall_seconds = 0.0
+
+    def request(self, client: Client, method: str, path: str, data=None, ok_statuses=(200, 302)):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data or {})
+            self.timings_ms.append((time.perf_counter() - start) * 1000)
+        self.last_queries = ctx.captured_queries
+        self.queries += len(ctx.captured_queries)
+        if response.status_code not in ok_statuses:
+            self.errors += 1
+        self._wall_seconds = time.perf_counter() - self._wall_start
+        return response
+
+    def result(self) -> dict:
+        n = len(self.timings_ms)
+        return {
+            "scenario": self.name,
+            "requests": n,
+            "errors": self.errors,
+            "throughput_rps": round(n / self._wall_seconds, 2) if self._wall_seconds else 0.0,
+            "mean_ms": round(sum(self.timings_ms) / n, 3) if n else 0.0,
+            "p50_ms": round(percentile(self.timings_ms, 50), 3),
+            "p95_ms": round(percentile(self.timings_ms, 95), 3),
+            "queries_per_request": round(self.queries / n, 2) if n else 0.0,
+        }
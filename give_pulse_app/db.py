@@ -0,0 +1,134 @@
+"""
+Database connection management: worker connection scopes and read replicas.
+
+Web requests reuse one persistent connection per worker process for
+``CONN_MAX_AGE`` seconds, checked with ``CONN_HEALTH_CHECKS`` before reuse;
+Django applies both at the start and end of every request. Long-running
+management commands have no requests, so their loops wrap each batch in
+``unit_of_work()``, which does the same: the process keeps its connection
+between batches and drops it once it has expired or broken (for example
+after MySQL's ``wait_timeout`` while the worker slept).
+
+With a ``replica`` database configured, ReplicaRouter sends the reads of
+views marked ``@replica_reads`` to it. Everything else, including every
+write and all reads of other views, stays on ``default``, so a user never
+reads their own write from a lagging replica. Sessions and users always
+stay on the primary, so logins and revoked sessions take effect at once.
+Lookups that report or cache a miss re-check it with ``recheck_on_primary``.
+
+Views whose transaction can lose a deadlock to a concurrent request (slot
+booking) are marked ``@retry_on_deadlock`` and run once more when it does.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+REPLICA = "replica"
+# Models always read from the primary (session lookups and revocation)
+PRIMARY_MODELS = {"give_pulse_app.user"}
+
+_use_replica = ContextVar("use_replica", default=False)
+
+# MySQL ER_LOCK_DEADLOCK and PostgreSQL deadlock_detected
+MYSQL_DEADLOCK = 1213
+POSTGRES_DEADLOCK = "40P01"
+
+
+def close_old_connections():
+    """Like django.db.close_old_connections, but leaves connections inside a transaction alone"""
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+@contextmanager
+def unit_of_work():
+    """Expire or health-check the process's connections around one batch of work"""
+    close_old_connections()
+    try:
+        yield
+    finally:
+        close_old_connections()
+
+
+def is_deadlock(error) -> bool:
+    """True for the database error raised when the transaction was chosen as a deadlock victim"""
+    cause = error.__cause__
+    return (
+        bool(error.args) and error.args[0] == MYSQL_DEADLOCK
+        or getattr(cause, "pgcode", None) == POSTGRES_DEADLOCK
+        or getattr(cause, "sqlstate", None) == POSTGRES_DEADLOCK
+    )
+
+
+def retry_on_deadlock(view_func):
+    """Run the view once more if its transaction lost a deadlock.
+
+    The database has already rolled the whole transaction back, so the retry
+    starts from scratch. Inside an outer atomic block (ATOMIC_REQUESTS, tests)
+    that is not possible and the error is raised as usual.
+    """
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        try:
+            return view_func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_deadlock(e) or transaction.get_connection().in_atomic_block:
+                raise
+        return view_func(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def replica():
+    """Route this app's reads to the replica (if configured) inside the block"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def recheck_on_primary(queryset):
+    """``queryset`` read from the primary if it is routed to the replica, else None.
+
+    A row written moments ago may not have reached the replica yet, so confirm
+    a miss here before reporting it or caching it as missing.
+    """
+    return queryset.using("default") if queryset.db == REPLICA else None
+
+
+def replica_reads(view_func):
+    """Serve a read-only view's queries from the replica"""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        with replica():
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads made under ``replica()`` to the ``replica`` database"""
+
+    def db_for_read(self, model, **hints):
+        label = model._meta.label_lower
+        if (
+            _use_replica.get() and REPLICA in settings.DATABASES
+            and label.startswith("give_pulse_app.") and label not in PRIMARY_MODELS
+        ):
+            return REPLICA
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
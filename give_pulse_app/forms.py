@@ -203,9 +203,7 @@ class DonorRegistrationForm(forms.Form):
         # Add profile picture if uploaded
         pic = cd.get("profile_picture")
         if pic:
-            donor.profile_picture = pic
-            donor.full_clean()
-            donor.save(update_fields=["profile_picture"])
+            donor.set_profile_picture(pic)
 
         return user, donor
 
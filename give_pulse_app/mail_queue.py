@@ -0,0 +1,115 @@
+"""
+Outbound email queue.
+
+Views call ``enqueue_email`` instead of ``send_mail``; the row is written in
+the request's transaction and the ``send_queued_email`` worker delivers it
+later, so a slow or unavailable SMTP server never blocks a request. The
+worker sends each batch over one connection and retries failures with
+exponential backoff.
+"""
+from __future__ import annotations
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailStatus, OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=2)
+# Claimed rows are hidden from other workers for this long; if a worker dies
+# mid-batch they become due again afterwards.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before retry number ``attempts`` (1, 2, 4, ... minutes, capped)"""
+    return min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+
+
+def _message(email: OutboundEmail) -> EmailMessage:
+    return EmailMessage(
+        subject=email.subject, body=email.body, from_email=email.from_email,
+        to=email.to, reply_to=email.reply_to or None,
+    )
+
+
+def enqueue_email(subject, body, to, *, from_email=None, reply_to=None) -> OutboundEmail:
+    """Queue an email for the worker.
+
+    Headers are validated here, so a bad subject raises BadHeaderError in the
+    request instead of failing forever in the queue.
+    """
+    email = OutboundEmail(
+        subject=subject, body=body, to=list(to), reply_to=list(reply_to or []),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+    _message(email).message()
+    email.save()
+    return email
+
+
+def _claim(batch_size, now):
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[e.pk for e in batch]).update(next_attempt_at=now + CLAIM_LEASE)
+    return batch
+
+
+def _record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = EmailStatus.FAILED
+        logger.error("Giving up on email %s after %s attempts: %s", email.pk, email.attempts, error)
+    else:
+        email.next_attempt_at = now + backoff(email.attempts)
+
+
+def send_pending(batch_size=50, now=None) -> tuple[int, int]:
+    """Send one batch of due emails over a single connection.
+
+    Returns (sent, failed) counts for the batch.
+    """
+    now = now or timezone.now()
+    batch = _claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not connect to the mail server: %s", e)
+        for email in batch:
+            _record_failure(email, e, now)
+        failed = batch
+    else:
+        try:
+            for email in batch:
+                try:
+                    connection.send_messages([_message(email)])
+                except Exception as e:
+                    _record_failure(email, e, now)
+                    failed.append(email)
+                else:
+                    sent.append(email)
+        finally:
+            connection.close()
+
+    OutboundEmail.objects.filter(pk__in=[e.pk for e in sent]).update(
+        status=EmailStatus.SENT, sent_at=timezone.now(), last_error="",
+    )
+    OutboundEmail.objects.bulk_update(failed, ["attempts", "last_error", "status", "next_attempt_at"])
+    return len(sent), len(failed)
@@ -0,0 +1,30 @@
+"""
+Django management command to recompute each donor's donation count and last donation date
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app.models import Donor
+
+
+class Command(BaseCommand):
+    help = 'Reconcile Donor.donation_count and Donor.last_donation with the donated matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Donors read and updated per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many donors drifted without updating them'
+        )
+
+    def handle(self, *args, **options):
+        changed = Donor.objects.reconcile_donation_stats(
+            batch_size=options['batch_size'], dry_run=options['dry_run'],
+        )
+        verb = 'would be updated' if options['dry_run'] else 'updated'
+        self.stdout.write(self.style.SUCCESS(f'{changed} donors {verb}.'))
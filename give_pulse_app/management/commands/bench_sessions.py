@@ -0,0 +1,81 @@
+"""
+Django management command to compare session engines on authenticated traffic
+"""
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from give_pulse_app import benchmark
+from give_pulse_app.models import User
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+BENCH_EMAIL = 'bench-sessions@example.invalid'
+BENCH_PASSWORD = 'Bench#Sessions1'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark DB-backed sessions against cache and signed-cookie sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Authenticated requests per engine (default: 200)'
+        )
+        parser.add_argument(
+            '--engines',
+            nargs='+',
+            choices=sorted(SESSION_ENGINES),
+            default=['db', 'cache', 'signed_cookies'],
+            help='Session engines to compare'
+        )
+        parser.add_argument(
+            '--url-name',
+            default='dashboard',
+            help='Named URL to request while logged in (default: dashboard)'
+        )
+
+    def handle(self, *args, **options):
+        path = reverse(options['url_name'])
+        results = []
+
+        with benchmark.sandbox():
+            User.objects.create_user(
+                first_name='Bench',
+                last_name='Sessions',
+                email=BENCH_EMAIL,
+                password=BENCH_PASSWORD,
+                role='donor',
+            )
+            for label in options['engines']:
+                with override_settings(SESSION_ENGINE=SESSION_ENGINES[label]):
+                    results.append(self.run_engine(label, path, options['requests']))
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_engine(self, label, path, total):
+        """Log in once, then time ``total`` GETs of ``path``"""
+        client = benchmark.login_client(BENCH_EMAIL, BENCH_PASSWORD)
+        recorder = benchmark.Recorder(label)
+        session_queries = 0
+        for _ in range(total):
+            recorder.request(client, 'get', path)
+            session_queries += sum('django_session' in q['sql'] for q in recorder.last_queries)
+
+        result = recorder.result()
+        cookie = client.cookies.get(settings.SESSION_COOKIE_NAME)
+        return {
+            'engine': result.pop('scenario'),
+            **result,
+            'session_queries_per_request': round(session_queries / total, 2) if total else 0.0,
+            'session_cookie_bytes': len(cookie.value) if cookie else 0,
+        }
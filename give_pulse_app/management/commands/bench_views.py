@@ -0,0 +1,154 @@
+"""
+Django management command to benchmark the main views against a seeded dataset
+"""
+
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.urls import reverse
+from give_pulse_app import benchmark
+from give_pulse_app.models import BloodRequest, DonationAppointment, Donor, Match, Staff
+from give_pulse_app.synthetic import SYNTHETIC_PASSWORD
+
+SCENARIOS = ['index', 'blood_requests_list', 'manage_matches', 'accept_match', 'complete_donation']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark index, blood_requests_list, manage_matches, accept_match and complete_donation (JSON output)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Requests per scenario (default: 50)'
+        )
+        parser.add_argument(
+            '--scenarios',
+            nargs='+',
+            choices=SCENARIOS,
+            default=SCENARIOS,
+            help='Scenarios to run (default: all)'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='synth',
+            help='Prefix of the seed_synthetic dataset to log in as (default: synth)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Also write the JSON report to this file'
+        )
+
+    def handle(self, *args, **options):
+        self.total = options['requests']
+        self.prefix = options['prefix']
+        results = []
+
+        with benchmark.sandbox():
+            for name in options['scenarios']:
+                results.append(getattr(self, f'bench_{name}')())
+
+        report = {
+            'started_at': datetime.now(dt_timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'requests_per_scenario': self.total,
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output + '\n')
+        self.stdout.write(output)
+
+    # Actors -------------------------------------------------------------
+
+    def synthetic_email_filter(self, field):
+        return Q(**{f'{field}__startswith': f'{self.prefix}-'})
+
+    def staff_client(self):
+        """Log in as verified staff of the hospital whose request has the most matches"""
+        busiest = (
+            BloodRequest.objects
+            .filter(created_by__is_verified=True)
+            .filter(self.synthetic_email_filter('created_by__user__email'))
+            .annotate(n=Count('matches'))
+            .order_by('-n')
+            .first()
+        )
+        if busiest is None:
+            raise CommandError(f'No "{self.prefix}" dataset found. Run seed_synthetic first.')
+        staff = (
+            Staff.objects.filter(hospital_id=busiest.hospital_id, is_verified=True)
+            .select_related('user').first()
+        )
+        return benchmark.login_client(staff.user.email, SYNTHETIC_PASSWORD), busiest
+
+    def donor_client(self):
+        """Log in as an eligible donor in the city with the most open requests"""
+        city_id = (
+            BloodRequest.objects.filter(status__in=['open', 'partial'])
+            .values('city_id').annotate(n=Count('id')).order_by('-n')
+            .values_list('city_id', flat=True).first()
+        )
+        donor = (
+            Donor.objects.eligible().filter(city_id=city_id)
+            .filter(self.synthetic_email_filter('user__email'))
+            .select_related('user').first()
+        )
+        if donor is None:
+            raise CommandError(f'No eligible "{self.prefix}" donor found. Run seed_synthetic first.')
+        return benchmark.login_client(donor.user.email, SYNTHETIC_PASSWORD)
+
+    # Scenarios ----------------------------------------------------------
+
+    def bench_index(self):
+        client = Client()
+        recorder = benchmark.Recorder('index')
+        for _ in range(self.total):
+            recorder.request(client, 'get', reverse('index'))
+        return recorder.result()
+
+    def bench_blood_requests_list(self):
+        client = self.donor_client()
+        recorder = benchmark.Recorder('blood_requests_list')
+        for _ in range(self.total):
+            recorder.request(client, 'get', reverse('blood_requests_list'))
+        return recorder.result()
+
+    def bench_manage_matches(self):
+        client, blood_request = self.staff_client()
+        path = reverse('manage_matches', args=[blood_request.pk])
+        recorder = benchmark.Recorder('manage_matches')
+        for _ in range(self.total):
+            recorder.request(client, 'get', path)
+        return recorder.result()
+
+    def bench_accept_match(self):
+        client, blood_request = self.staff_client()
+        pending = list(
+            Match.objects.filter(blood_request__hospital_id=blood_request.hospital_id, status='pending')
+            .values_list('pk', flat=True)[:self.total]
+        )
+        recorder = benchmark.Recorder('accept_match')
+        for match_id in pending:
+            recorder.request(client, 'post', reverse('accept_match', args=[match_id]))
+        return recorder.result()
+
+    def bench_complete_donation(self):
+        client, blood_request = self.staff_client()
+        appointments = list(
+            DonationAppointment.objects.filter(
+                match__blood_request__hospital_id=blood_request.hospital_id,
+                match__status='accepted',
+                match__donation__isnull=True,
+            ).values_list('pk', flat=True)[:self.total]
+        )
+        recorder = benchmark.Recorder('complete_donation')
+        for appointment_id in appointments:
+            recorder.request(client, 'post', reverse('complete_donation', args=[appointment_id]))
+        return recorder.result()
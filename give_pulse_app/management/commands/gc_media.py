@@ -0,0 +1,187 @@
+"""
+Django management command to delete media files no longer referenced by any record
+
+Content-addressed files are shared by identical uploads, and a re-upload only
+touches the existing file (media_storage.save_content). Just before deleting a
+batch the command re-checks the database and then each file's modified time,
+so a file re-uploaded at any point before that re-check is kept. A re-upload
+that touches the file in the instant between the final age check and the
+delete still loses it; that window is per file and a few milliseconds long.
+"""
+
+import os
+import time
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from give_pulse_app.media_storage import media_storage
+from give_pulse_app.models import Donation, DonationAppointment, Donor
+from give_pulse_app.uploads import AVATAR_FIELD_VARIANT, AVATAR_VARIANTS, avatar_variant_name
+
+# Top-level media folders holding generated or uploaded files. "donors" has
+# avatars from before the content-addressed layout, "temp" leftovers of the
+# old certificate generator.
+MEDIA_DIRS = ['qr_codes', 'certificates', 'avatars', 'donors', 'temp']
+
+REFERENCING_FIELDS = [
+    (DonationAppointment, 'qr_code_image'),
+    (Donation, 'certificate_file'),
+    (Donor, 'profile_picture'),
+]
+
+
+def owner_name(name):
+    """The name stored in the database for ``name`` (avatar variants map to the field variant)"""
+    for variant in AVATAR_VARIANTS:
+        suffix = f'_{variant}.webp'
+        if name.startswith('avatars/') and name.endswith(suffix):
+            return f'{name[:-len(suffix)]}_{AVATAR_FIELD_VARIANT}.webp'
+    return name
+
+
+class Command(BaseCommand):
+    help = 'Delete orphaned QR codes, certificates, avatars and temp files from the media storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            action='append',
+            choices=MEDIA_DIRS,
+            help='Only scan this media folder (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Keep files younger than this, so in-flight writes are never collected (default: 24)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Files deleted per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report orphans without deleting them'
+        )
+
+    def referenced_names(self, only=None):
+        """Media names referenced from the database, loaded in bulk.
+
+        ``only`` limits the lookup to those names (one query per model).
+        """
+        names = set()
+        for model, field in REFERENCING_FIELDS:
+            rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            if only is not None:
+                rows = rows.filter(**{f'{field}__in': only})
+            names.update(rows.values_list(field, flat=True).iterator(chunk_size=10_000))
+        for name in list(names):
+            for variant in AVATAR_VARIANTS:
+                names.add(avatar_variant_name(name, variant))
+        names.discard(None)
+        return names
+
+    def walk(self, top):
+        """Yield (name, modified timestamp, size) for every file below ``top``"""
+        try:
+            root = media_storage.path(top)
+        except NotImplementedError:
+            yield from self._walk_storage(top)
+            return
+        stack = [(root, top)]
+        while stack:
+            path, prefix = stack.pop()
+            try:
+                entries = os.scandir(path)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = f'{prefix}/{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, name))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        yield name, stat.st_mtime, stat.st_size
+
+    def _walk_storage(self, top):
+        directories, files = media_storage.listdir(top)
+        for filename in files:
+            name = f'{top}/{filename}'
+            yield name, self._timestamp(media_storage.get_modified_time(name)), media_storage.size(name)
+        for directory in directories:
+            yield from self._walk_storage(f'{top}/{directory}')
+
+    @staticmethod
+    def _timestamp(modified):
+        if timezone.is_naive(modified):
+            modified = timezone.make_aware(modified, dt_timezone.utc)
+        return modified.timestamp()
+
+    def modified_at(self, name):
+        """Current modified timestamp of ``name``, or None if it is gone"""
+        try:
+            try:
+                return os.stat(media_storage.path(name)).st_mtime
+            except NotImplementedError:
+                return self._timestamp(media_storage.get_modified_time(name))
+        except FileNotFoundError:
+            return None
+
+    def handle(self, *args, **options):
+        referenced = self.referenced_names()
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        dry_run = options['dry_run']
+
+        scanned = kept_recent = deleted = freed = 0
+        batch = []
+
+        def flush():
+            nonlocal deleted, freed, kept_recent
+            if batch and not dry_run:
+                # Content-addressed files can be re-referenced by an identical
+                # upload after the scan started; re-check the references, then
+                # the age (a re-upload touches the file), just before deleting.
+                owners = {owner_name(name) for name, size in batch}
+                in_use = self.referenced_names(only=owners)
+                for name, size in batch:
+                    if name in in_use:
+                        continue
+                    modified = self.modified_at(name)
+                    if modified is None:
+                        continue
+                    if modified > cutoff:
+                        kept_recent += 1
+                        continue
+                    media_storage.delete(name)
+                    deleted += 1
+                    freed += size
+            else:
+                deleted += len(batch)
+                freed += sum(size for name, size in batch)
+            batch.clear()
+
+        for top in options['dir'] or MEDIA_DIRS:
+            for name, mtime, size in self.walk(top):
+                scanned += 1
+                if name in referenced:
+                    continue
+                if mtime > cutoff:
+                    kept_recent += 1
+                    continue
+                if dry_run:
+                    self.stdout.write(f'Orphan: {name}')
+                batch.append((name, size))
+                if len(batch) >= options['batch_size']:
+                    flush()
+        flush()
+
+        verb = 'would delete' if dry_run else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files: {verb} {deleted} orphans ({freed / 1024 / 1024:.1f} MB), '
+            f'kept {kept_recent} recent unreferenced files.'
+        ))
@@ -0,0 +1,73 @@
+"""
+Django management command to move generated media into the content-addressed layout
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app.media_storage import media_storage
+from give_pulse_app.models import Donation, DonationAppointment
+
+# (model, file field, storage category, suffix)
+GENERATED_MEDIA = [
+    (DonationAppointment, 'qr_code_image', 'qr_codes', '.png'),
+    (Donation, 'certificate_file', 'certificates', '.pdf'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Copy QR codes and certificates stored under flat names into sharded content-addressed names'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows updated per batch (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the files that would move without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, category, suffix in GENERATED_MEDIA:
+            # Content-addressed names look like <category>/aa/bb/<digest><suffix>
+            legacy = (
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .exclude(**{f'{field}__regex': rf'^{category}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/'})
+                .only('pk', field).order_by('pk')
+            )
+            moved = missing = 0
+            batch = []
+            for obj in legacy.iterator(chunk_size=options['batch_size']):
+                old_name = getattr(obj, field).name
+                if options['dry_run']:
+                    moved += 1
+                    continue
+                try:
+                    with media_storage.open(old_name, 'rb') as fh:
+                        data = fh.read()
+                except OSError:
+                    missing += 1
+                    continue
+                getattr(obj, field).name = media_storage.save_content(category, data, suffix)
+                batch.append((obj, old_name))
+                if len(batch) >= options['batch_size']:
+                    moved += self._flush(model, field, batch)
+            moved += self._flush(model, field, batch)
+
+            verb = 'would move' if options['dry_run'] else 'moved'
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field}: {verb} {moved} files ({missing} missing on disk).'
+            ))
+
+    def _flush(self, model, field, batch):
+        if not batch:
+            return 0
+        model.objects.bulk_update([obj for obj, _ in batch], [field])
+        # Old files are removed only after the rows point at the new names.
+        for _, old_name in batch:
+            media_storage.delete(old_name)
+        count = len(batch)
+        batch.clear()
+        return count
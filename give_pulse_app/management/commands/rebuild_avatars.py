@@ -0,0 +1,43 @@
+"""
+Django management command to convert stored donor avatars to resized WebP variants
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app.models import Donor
+from give_pulse_app.uploads import AVATAR_FIELD_VARIANT
+
+
+class Command(BaseCommand):
+    help = 'Re-encode avatars uploaded before the image pipeline into thumbnail/display WebP variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the avatars that would be converted without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        legacy = (
+            Donor.objects.exclude(profile_picture__isnull=True).exclude(profile_picture='')
+            .exclude(profile_picture__endswith=f'_{AVATAR_FIELD_VARIANT}.webp')
+            .only('id', 'user_id', 'profile_picture')
+        )
+        converted = failed = 0
+        for donor in legacy.iterator(chunk_size=500):
+            name = donor.profile_picture.name
+            if options['dry_run']:
+                self.stdout.write(f'Would convert {name}')
+                converted += 1
+                continue
+            try:
+                with donor.profile_picture.open('rb') as fh:
+                    donor.set_profile_picture(fh)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'Skipped {name}: {e}'))
+                failed += 1
+            else:
+                converted += 1
+
+        verb = 'Would convert' if options['dry_run'] else 'Converted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {converted} avatars ({failed} failed).'))
@@ -0,0 +1,14 @@
+"""
+Django management command to rebuild the full-text index behind the admin search boxes
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the admin search index (run after bulk imports, which skip the save signals)'
+
+    def handle(self, *args, **options):
+        written = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} rows for admin search.'))
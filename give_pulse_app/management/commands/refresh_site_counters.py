@@ -0,0 +1,15 @@
+"""
+Django management command to refresh the site-wide counters shown on the dashboards
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app import site_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hospital, staff, donor, request and donation counters'
+
+    def handle(self, *args, **options):
+        counters, refreshed_at = site_stats.refresh()
+        summary = ', '.join(f'{name}={value}' for name, value in counters.items())
+        self.stdout.write(self.style.SUCCESS(f'Refreshed site counters: {summary}'))
@@ -0,0 +1,66 @@
+"""
+Django management command to render QR code images for appointments that have none
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from give_pulse_app.db import unit_of_work
+from give_pulse_app.models import DonationAppointment
+
+
+class Command(BaseCommand):
+    help = 'Render missing appointment QR code images (appointments booked by bulk accept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Appointments rendered per batch (default: 100)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling for new appointments every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait when nothing is pending in --loop mode (default: 5)'
+        )
+
+    def pending(self, batch_size, failed):
+        return list(
+            DonationAppointment.objects.exclude(qr_code_data='')
+            .filter(Q(qr_code_image='') | Q(qr_code_image__isnull=True))
+            .exclude(pk__in=failed)
+            .only('id', 'match_id', 'qr_code_data', 'qr_code_image')
+            .order_by('pk')[:batch_size]
+        )
+
+    def handle(self, *args, **options):
+        rendered = 0
+        # Appointments that failed are retried on the next run, not in a tight loop
+        failed = set()
+        try:
+            while True:
+                with unit_of_work():
+                    batch = self.pending(options['batch_size'], failed)
+                    for appointment in batch:
+                        try:
+                            appointment.render_qr_code()
+                            rendered += 1
+                        except Exception as e:
+                            failed.add(appointment.pk)
+                            self.stderr.write(f'Appointment {appointment.pk}: {e}')
+                if batch:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} QR codes ({len(failed)} failed).'))
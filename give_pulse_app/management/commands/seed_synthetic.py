@@ -0,0 +1,64 @@
+"""
+Django management command to generate a synthetic dataset for load testing
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from give_pulse_app import synthetic
+from give_pulse_app.models import Governorate
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic governorates, hospitals, staff, donors, requests, matches and donations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=sorted(synthetic.SCALES),
+            default='small',
+            help='Preset dataset size (default: small)'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='synth',
+            help='Prefix for generated names and emails (default: synth)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed; the same seed reproduces the same dataset'
+        )
+        for option in ('donors', 'requests', 'matches-per-request'):
+            parser.add_argument(
+                f'--{option}',
+                type=int,
+                help=f'Override the preset number of {option.replace("-", " ")}'
+            )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Governorate.objects.filter(name__startswith=f'{prefix} ').exists():
+            raise CommandError(
+                f'A dataset with prefix "{prefix}" already exists. Use --prefix to create another one.'
+            )
+
+        params = dict(synthetic.SCALES[options['scale']])
+        for key in ('donors', 'requests', 'matches_per_request'):
+            if options.get(key) is not None:
+                params[key] = options[key]
+
+        self.stdout.write(f'Generating "{options["scale"]}" dataset with prefix "{prefix}"...')
+        start = time.perf_counter()
+        counts = synthetic.generate(prefix=prefix, seed=options['seed'], **params)
+        elapsed = time.perf_counter() - start
+
+        for name, count in counts.items():
+            self.stdout.write(f'  {name}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Synthetic dataset created in {elapsed:.1f}s. '
+                f'All users log in with password "{synthetic.SYNTHETIC_PASSWORD}".'
+            )
+        )
@@ -0,0 +1,50 @@
+"""
+Django management command to deliver queued outbound email
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from give_pulse_app.db import unit_of_work
+from give_pulse_app.mail_queue import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Send due emails from the outbound queue over one SMTP connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Emails sent per connection (default: 50)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling the queue every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait when the queue is empty in --loop mode (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                with unit_of_work():
+                    sent, failed = send_pending(batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} emails ({total_failed} failed attempts).'))
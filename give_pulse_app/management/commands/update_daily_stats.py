@@ -0,0 +1,21 @@
+"""
+Django management command to refresh the daily per-hospital statistics rollups
+"""
+
+from django.core.management.base import BaseCommand
+from give_pulse_app import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily hospital statistics for rows changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every day from scratch instead of only days changed since the watermark'
+        )
+
+    def handle(self, *args, **options):
+        days, rows = rollups.update(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {days} days ({rows} rollup rows).'))
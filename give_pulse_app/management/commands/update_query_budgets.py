@@ -0,0 +1,21 @@
+"""
+Django management command to re-record the per-view query budgets
+"""
+
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from give_pulse_app.query_budgets import QUERY_BUDGETS_FILE, UPDATE_BUDGETS_ENV
+
+
+class Command(BaseCommand):
+    help = 'Re-measure every view as each role and rewrite give_pulse_app/query_budgets.json'
+
+    def handle(self, *args, **options):
+        os.environ[UPDATE_BUDGETS_ENV] = '1'
+        try:
+            call_command('test', 'give_pulse_app.tests.QueryBudgetTests', interactive=False)
+        finally:
+            os.environ.pop(UPDATE_BUDGETS_ENV, None)
+        self.stdout.write(self.style.SUCCESS(f'Query budgets written to {QUERY_BUDGETS_FILE}'))
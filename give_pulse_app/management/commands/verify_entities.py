@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 from give_pulse_app.models import Hospital, Staff
 
+PAST_TENSE = {'verify': 'verified', 'unverify': 'unverified'}
+
 
 class Command(BaseCommand):
     help = 'Verify or unverify hospitals and staff members'
@@ -29,6 +32,27 @@ class Command(BaseCommand):
             type=int,
             help='Hospital ID for staff verification (optional)'
         )
+        parser.add_argument(
+            '--governorate-id',
+            type=int,
+            help='Only process hospitals/staff in this governorate (optional)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=0,
+            help='Update at most this many rows per UPDATE/transaction (default: all at once)'
+        )
+        parser.add_argument(
+            '--summary',
+            action='store_true',
+            help='Only print totals, not one line per entity'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many rows would change without updating anything'
+        )
         parser.add_argument(
             '--force',
             action='store_true',
@@ -40,53 +64,44 @@ class Command(BaseCommand):
         entity_type = options['type']
         entity_id = options.get('id')
         hospital_id = options.get('hospital_id')
+        self.governorate_id = options.get('governorate_id')
+        self.batch_size = max(options['batch_size'] or 0, 0)
+        self.summary = options['summary']
+        self.dry_run = options['dry_run']
         force = options['force']
 
-        with transaction.atomic():
-            if entity_type == 'hospital':
-                self.handle_hospitals(action, entity_id, force)
-            elif entity_type == 'staff':
-                self.handle_staff(action, entity_id, hospital_id, force)
-            elif entity_type == 'all':
-                self.handle_hospitals(action, entity_id, force)
-                self.handle_staff(action, entity_id, hospital_id, force)
+        if entity_type == 'hospital':
+            self.handle_hospitals(action, entity_id, force)
+        elif entity_type == 'staff':
+            self.handle_staff(action, entity_id, hospital_id, force)
+        elif entity_type == 'all':
+            self.handle_hospitals(action, entity_id, force)
+            self.handle_staff(action, entity_id, hospital_id, force)
 
     def handle_hospitals(self, action, entity_id, force):
         """Handle hospital verification/unverification"""
+        hospitals = Hospital.objects.all()
+
         if entity_id:
-            try:
-                hospital = Hospital.objects.get(id=entity_id)
-                hospitals = [hospital]
-            except Hospital.DoesNotExist:
+            hospitals = hospitals.filter(id=entity_id)
+            if not hospitals.exists():
                 self.stdout.write(
                     self.style.ERROR(f'Hospital with ID {entity_id} not found')
                 )
                 return
-        else:
-            hospitals = Hospital.objects.all()
-
-        if not force and not entity_id:
-            count = hospitals.count()
-            confirm = input(f'Are you sure you want to {action} {count} hospitals? (y/N): ')
-            if confirm.lower() != 'y':
-                self.stdout.write('Operation cancelled.')
-                return
+        if self.governorate_id:
+            hospitals = hospitals.filter(city__governorate_id=self.governorate_id)
 
-        updated_count = 0
-        for hospital in hospitals:
-            if action == 'verify':
-                hospital.is_verified = True
-                hospital.save()
-                updated_count += 1
-                self.stdout.write(f'Verified hospital: {hospital.name}')
-            else:
-                hospital.is_verified = False
-                hospital.save()
-                updated_count += 1
-                self.stdout.write(f'Unverified hospital: {hospital.name}')
+        updated_count = self.apply(
+            hospitals, action, ('hospital', 'hospitals'), entity_id, force,
+            label_fields=('name',),
+            extra_values={'updated_at': timezone.now()},
+        )
+        if updated_count is None:
+            return
 
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully {action}ed {updated_count} hospitals')
+            self.style.SUCCESS(f'Successfully {PAST_TENSE[action]} {updated_count} hospitals')
         )
 
     def handle_staff(self, action, entity_id, hospital_id, force):
@@ -94,44 +109,80 @@ class Command(BaseCommand):
         staff_queryset = Staff.objects.all()
 
         if entity_id:
-            try:
-                staff = Staff.objects.get(id=entity_id)
-                staff_queryset = [staff]
-            except Staff.DoesNotExist:
+            staff_queryset = staff_queryset.filter(id=entity_id)
+            if not staff_queryset.exists():
                 self.stdout.write(
                     self.style.ERROR(f'Staff with ID {entity_id} not found')
                 )
                 return
         elif hospital_id:
-            try:
-                hospital = Hospital.objects.get(id=hospital_id)
-                staff_queryset = Staff.objects.filter(hospital=hospital)
-            except Hospital.DoesNotExist:
+            if not Hospital.objects.filter(id=hospital_id).exists():
                 self.stdout.write(
                     self.style.ERROR(f'Hospital with ID {hospital_id} not found')
                 )
                 return
+            staff_queryset = staff_queryset.filter(hospital_id=hospital_id)
+        if self.governorate_id:
+            staff_queryset = staff_queryset.filter(hospital__city__governorate_id=self.governorate_id)
+
+        updated_count = self.apply(
+            staff_queryset, action, ('staff', 'staff members'), entity_id, force,
+            label_fields=('user__first_name', 'user__last_name'),
+        )
+        if updated_count is None:
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully {PAST_TENSE[action]} {updated_count} staff members')
+        )
 
-        if not force and not entity_id:
-            count = staff_queryset.count()
-            confirm = input(f'Are you sure you want to {action} {count} staff members? (y/N): ')
+    def apply(self, queryset, action, nouns, entity_id, force, label_fields, extra_values=None):
+        """Set is_verified on every row of ``queryset`` that needs it.
+
+        Rows already in the target state are skipped. Returns the number of
+        rows updated, or None if nothing was written (dry run / cancelled).
+        """
+        target = action == 'verify'
+        singular, noun = nouns
+        pending = queryset.exclude(is_verified=target)
+        count = pending.count()
+        already = queryset.filter(is_verified=target).count()
+
+        if self.dry_run:
+            self.stdout.write(
+                f'Dry run: would {action} {count} {noun} ({already} already {PAST_TENSE[action]})'
+            )
+            return None
+
+        if not force and not entity_id and count:
+            confirm = input(f'Are you sure you want to {action} {count} {noun}? (y/N): ')
             if confirm.lower() != 'y':
                 self.stdout.write('Operation cancelled.')
-                return
+                return None
 
-        updated_count = 0
-        for staff in staff_queryset:
-            if action == 'verify':
-                staff.is_verified = True
-                staff.save()
-                updated_count += 1
-                self.stdout.write(f'Verified staff: {staff.user.first_name} {staff.user.last_name}')
-            else:
-                staff.is_verified = False
-                staff.save()
-                updated_count += 1
-                self.stdout.write(f'Unverified staff: {staff.user.first_name} {staff.user.last_name}')
+        if not self.summary:
+            verb = 'Verified' if target else 'Unverified'
+            for values in pending.values_list(*label_fields).iterator():
+                self.stdout.write(f'{verb} {singular}: {" ".join(values)}')
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully {action}ed {updated_count} staff members')
-        )
+        values = {'is_verified': target, **(extra_values or {})}
+        return self.batched_update(pending, values)
+
+    def batched_update(self, queryset, values):
+        """Run ``UPDATE ... SET values`` over ``queryset``, ``batch_size`` rows at a time"""
+        if not self.batch_size:
+            with transaction.atomic():
+                return queryset.update(**values)
+
+        model = queryset.model
+        pks = queryset.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(pks.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += model.objects.filter(pk__in=batch).update(**values)
+            last_pk = batch[-1]
+        return updated
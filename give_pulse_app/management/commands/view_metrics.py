@@ -0,0 +1,75 @@
+"""
+Django management command to summarise per-view metrics written by QueryMetricsMiddleware
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from give_pulse_app.metrics import bucket_percentile, load_metrics
+
+
+class Command(BaseCommand):
+    help = 'Print the slowest views by p95 latency and the heaviest by queries per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=None,
+            help='JSONL metrics file (default: settings.VIEW_METRICS_FILE)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of views to show per table (default: 10)'
+        )
+        parser.add_argument(
+            '--min-requests',
+            type=int,
+            default=1,
+            help='Ignore views with fewer sampled requests (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'VIEW_METRICS_FILE', None)
+        if not path or not os.path.exists(path):
+            raise CommandError(f'Metrics file not found: {path}')
+
+        rows = []
+        for view, stats in load_metrics(path).items():
+            if stats.requests < options['min_requests']:
+                continue
+            rows.append({
+                'view': view,
+                'requests': stats.requests,
+                'p50_ms': bucket_percentile(stats.buckets, 50),
+                'p95_ms': bucket_percentile(stats.buckets, 95),
+                'queries': stats.queries / stats.requests,
+                'max_queries': stats.max_queries,
+                'db_ms': stats.db_ms / stats.requests,
+                'kb': stats.bytes / stats.requests / 1024,
+            })
+
+        if not rows:
+            self.stdout.write('No metrics recorded yet.')
+            return
+
+        top = options['top']
+        self.stdout.write(self.style.SUCCESS('Top views by p95 latency'))
+        self.write_table(sorted(rows, key=lambda r: r['p95_ms'], reverse=True)[:top])
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('Top views by queries per request'))
+        self.write_table(sorted(rows, key=lambda r: r['queries'], reverse=True)[:top])
+
+    def write_table(self, rows):
+        width = max(len(r['view']) for r in rows)
+        self.stdout.write(
+            f"{'view':<{width}}  {'reqs':>7}  {'p50 ms':>8}  {'p95 ms':>8}  "
+            f"{'q/req':>7}  {'max q':>6}  {'db ms':>8}  {'KB':>7}"
+        )
+        for r in rows:
+            self.stdout.write(
+                f"{r['view']:<{width}}  {r['requests']:>7}  {r['p50_ms']:>8.0f}  {r['p95_ms']:>8.0f}  "
+                f"{r['queries']:>7.1f}  {r['max_queries']:>6}  {r['db_ms']:>8.1f}  {r['kb']:>7.1f}"
+            )
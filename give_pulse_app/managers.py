@@ -3,6 +3,7 @@ from .validators import validate_password_strength
 import bcrypt
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce, Greatest
 
 BCRYPT_PREFIX_RE = re.compile(r"^\$2[aby]\$")
 
@@ -65,7 +66,77 @@ class StaffManager(models.Manager):
         return staff
 
 
-class DonorManager(models.Manager):
+class DonorQuerySet(models.QuerySet):
+    """Eligibility filters backed by the (city, abo, rh, cooldown_until) index"""
+
+    @staticmethod
+    def _eligible_q(at=None):
+        from django.utils import timezone
+        at = at or timezone.now()
+        return models.Q(cooldown_until__isnull=True) | models.Q(cooldown_until__lte=at)
+
+    def eligible(self, at=None):
+        """Donors out of cooldown at ``at`` (default: now)"""
+        return self.filter(self._eligible_q(at))
+
+    def in_cooldown(self, at=None):
+        """Donors still in cooldown at ``at`` (default: now)"""
+        return self.exclude(self._eligible_q(at))
+
+    def with_eligibility(self, at=None):
+        """Annotate ``is_eligible`` so lists can show and sort on it without per-row checks"""
+        return self.annotate(
+            is_eligible=models.ExpressionWrapper(self._eligible_q(at), output_field=models.BooleanField())
+        )
+
+    def record_donation(self, donated_on):
+        """Count one donation for these donors, in the same UPDATE that moves
+        ``last_donation`` forward (never back) to ``donated_on``"""
+        on = models.Value(donated_on, output_field=models.DateField())
+        return self.update(
+            donation_count=models.F("donation_count") + 1,
+            last_donation=Greatest(Coalesce("last_donation", on), on),
+        )
+
+    def reconcile_donation_stats(self, *, batch_size=1000, dry_run=False):
+        """Recompute ``donation_count``/``last_donation`` from donated matches
+        and fix rows that drifted. Returns the number of donors changed.
+
+        A self-reported ``last_donation`` later than any recorded donation is kept.
+        """
+        from django.utils import timezone
+        from .models import DONATED_STATUSES, Match
+        donated = Match.objects.filter(donor=models.OuterRef("pk"), status__in=DONATED_STATUSES).values("donor")
+        rows = self.annotate(
+            actual_count=Coalesce(
+                models.Subquery(donated.annotate(n=models.Count("id")).values("n")), 0
+            ),
+            actual_last=models.Subquery(donated.annotate(last=models.Max("donated_at")).values("last")),
+        ).only("id", "donation_count", "last_donation")
+
+        changed, batch = 0, []
+        for donor in rows.iterator(chunk_size=batch_size):
+            last = donor.actual_last and timezone.localdate(donor.actual_last)
+            if last and donor.last_donation:
+                last = max(last, donor.last_donation)
+            last = last or donor.last_donation
+            if (donor.donation_count, donor.last_donation) == (donor.actual_count, last):
+                continue
+            donor.donation_count, donor.last_donation = donor.actual_count, last
+            batch.append(donor)
+            if len(batch) >= batch_size:
+                changed += self._save_stats(batch, dry_run)
+        return changed + self._save_stats(batch, dry_run)
+
+    def _save_stats(self, donors, dry_run):
+        if not dry_run:
+            self.model.objects.bulk_update(donors, ["donation_count", "last_donation"])
+        count = len(donors)
+        donors.clear()
+        return count
+
+
+class DonorManager(models.Manager.from_queryset(DonorQuerySet)):
     def create_donor(
         self,
         *,
@@ -133,4 +204,87 @@ class BloodRequestManager(models.Manager):
         )
         obj.full_clean()
         obj.save()
-        return obj
\ No newline at end of file
+        return obj
+
+class MatchQuerySet(models.QuerySet):
+    """Relation graphs for the pages that list matches"""
+
+    def with_request_details(self):
+        """donor_matches: request, hospital and city per row"""
+        return self.select_related("blood_request__hospital", "blood_request__city")
+
+    def with_donor(self):
+        """Donor contact details per row"""
+        return self.select_related("donor__user")
+
+    def for_staff_board(self):
+        """manage_matches: donor contact details plus appointment/donation state.
+
+        The reverse one-to-ones are joined, so a match without an appointment
+        is known to have none without a query per row.
+        """
+        return self.select_related("donor__user", "appointment", "donation")
+
+    def status_counts(self):
+        """Per-status counts (plus "total") from a single aggregate query"""
+        from .models import MatchStatus
+        return self.aggregate(
+            total=models.Count("id"),
+            **{status: models.Count("id", filter=models.Q(status=status)) for status in MatchStatus.values},
+        )
+
+
+class DonationAppointmentQuerySet(models.QuerySet):
+    """Relation graphs for the pages that show appointments"""
+
+    def for_donor_history(self):
+        """donor_appointments: match status, request and hospital/city per row"""
+        return self.select_related("match__blood_request__hospital__city").only(
+            "id", "window_start", "window_end", "qr_code_data", "qr_code_image", "created_at",
+            "match__id", "match__status",
+            "match__blood_request__id", "match__blood_request__abo", "match__blood_request__rh",
+            "match__blood_request__hospital__id", "match__blood_request__hospital__name",
+            "match__blood_request__hospital__city__id", "match__blood_request__hospital__city__name",
+        )
+
+    def with_verification_graph(self):
+        """QR verification and complete_donation: donor, user, request and hospital"""
+        return self.select_related(
+            "match__donor__user", "match__donor__city", "match__blood_request__hospital",
+        )
+
+    def accessible_to(self, user):
+        """Appointments the user may see: their own, or any at their hospital (staff)"""
+        return self.filter(
+            models.Q(match__donor__user_id=user.pk)
+            | models.Q(match__blood_request__hospital__staff__user_id=user.pk)
+        )
+
+
+class DonationQuerySet(models.QuerySet):
+    """Relation graphs for the pages that show donations"""
+
+    def for_donor_history(self):
+        """donor_donations: request, hospital/city and confirming staff per row"""
+        return self.select_related(
+            "match__blood_request__hospital__city", "confirmed_by__user",
+        ).only(
+            "id", "units", "certificate_file", "certificate_serial", "confirmed_at",
+            "match__id",
+            "match__blood_request__id", "match__blood_request__abo", "match__blood_request__rh",
+            "match__blood_request__hospital__id", "match__blood_request__hospital__name",
+            "match__blood_request__hospital__city__id", "match__blood_request__hospital__city__name",
+            "confirmed_by__id", "confirmed_by__user__id",
+            "confirmed_by__user__first_name", "confirmed_by__user__last_name",
+        )
+
+    def with_verification_graph(self):
+        """Certificate verification: donor, user, request and hospital"""
+        return self.select_related("match__donor__user", "match__blood_request__hospital")
+
+    def accessible_to(self, user):
+        """Donations the user may download: their own, or any at their hospital (staff)"""
+        return self.filter(
+            models.Q(match__donor__user_id=user.pk)
+            | models.Q(match__blood_request__hospital__staff__user_id=user.pk)
+        )
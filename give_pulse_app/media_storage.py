@@ -0,0 +1,245 @@
+"""
+Storage for generated media (appointment QR codes, certificates, avatars).
+
+Generated files are content-addressed and sharded::
+
+    <category>/<aa>/<bb>/<sha256><suffix>
+
+where ``aa``/``bb`` are the first two byte pairs of the digest, so no
+directory grows beyond a few hundred entries and identical files are stored
+once. The backend is configured with ``MEDIA_STORAGE`` (``BACKEND`` and
+``OPTIONS``); ``LocalMediaStorage`` writes under MEDIA_ROOT and
+``S3MediaStorage`` talks to any S3-compatible service (boto3 required).
+"""
+from __future__ import annotations
+import hashlib
+import mimetypes
+import os
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.signals import setting_changed
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import LazyObject, empty
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = "give_pulse_app.media_storage.LocalMediaStorage"
+
+
+def content_name(category, digest, suffix):
+    """Sharded storage name for a file whose sha256 hex digest is ``digest``"""
+    return f"{category}/{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+class ContentAddressedMixin:
+    def save_content(self, category, data, suffix, *, digest=None):
+        """Store ``data`` under its content address and return the name.
+
+        ``digest`` overrides the hash, for groups of files (image variants)
+        that share one key. Existing files are not rewritten but touched, so
+        to ``gc_media`` a re-upload looks as new as a first upload.
+        """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        name = content_name(category, digest, suffix)
+        if not self.touch(name):
+            self._save(name, ContentFile(data))
+        return name
+
+    def touch(self, name) -> bool:
+        """Set the modified time of ``name`` to now; False if there is no such file"""
+        raise NotImplementedError
+
+
+@deconstructible
+class LocalMediaStorage(ContentAddressedMixin, FileSystemStorage):
+    """FileSystemStorage whose writes are atomic.
+
+    Content is written to a temporary file in the target directory and moved
+    into place with os.replace, so a reader (or nginx) never sees a partial
+    file and a crash leaves only a ``.tmp`` file behind.
+    """
+
+    def touch(self, name):
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        tmp = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "wb") as fh:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    fh.write(chunk)
+                fh.flush()
+                os.fsync(fh.fileno())
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return str(name).replace("\\", "/")
+
+
+@deconstructible
+class S3MediaStorage(ContentAddressedMixin, Storage):
+    """Minimal storage for S3-compatible object stores.
+
+    ``client`` may be any object with the boto3 S3 client methods used here
+    (put_object, get_object, head_object, copy_object, delete_object,
+    list_objects_v2, generate_presigned_url); by default one is built with boto3.
+    """
+
+    NOT_FOUND_CODES = {"404", "NoSuchKey", "NotFound"}
+
+    def __init__(self, bucket=None, *, location="", endpoint_url=None, region_name=None,
+                 access_key=None, secret_key=None, url_expiry=3600, client=None):
+        if not bucket:
+            raise ImproperlyConfigured("S3MediaStorage needs a bucket.")
+        self.bucket = bucket
+        self.location = location.strip("/")
+        self.url_expiry = url_expiry
+        self._client = client
+        self._client_kwargs = {
+            "endpoint_url": endpoint_url,
+            "region_name": region_name,
+            "aws_access_key_id": access_key,
+            "aws_secret_access_key": secret_key,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImproperlyConfigured("S3MediaStorage requires boto3 (pip install boto3).")
+            self._client = boto3.client("s3", **{k: v for k, v in self._client_kwargs.items() if v})
+        return self._client
+
+    def _key(self, name):
+        name = str(name).replace("\\", "/").lstrip("/")
+        return f"{self.location}/{name}" if self.location else name
+
+    @staticmethod
+    def _error_code(exc):
+        return str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as e:
+            if self._error_code(e) in self.NOT_FOUND_CODES:
+                return None
+            raise
+
+    def _open(self, name, mode="rb"):
+        if "w" in mode or "a" in mode:
+            raise ValueError("S3MediaStorage files are read-only; use save().")
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as e:
+            if self._error_code(e) in self.NOT_FOUND_CODES:
+                raise FileNotFoundError(name) from e
+            raise
+        content = ContentFile(obj["Body"].read())
+        content.name = name
+        return content
+
+    def _save(self, name, content):
+        if hasattr(content, "seek"):
+            content.seek(0)
+        data = b"".join(content.chunks())
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        # A PUT only becomes visible once complete, so writes are atomic.
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=data, ContentType=content_type)
+        return name
+
+    def touch(self, name):
+        # Objects are immutable; copying one onto itself renews LastModified
+        key = self._key(name)
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                MetadataDirective="REPLACE",
+                ContentType=mimetypes.guess_type(name)[0] or "application/octet-stream",
+            )
+        except Exception as e:
+            if self._error_code(e) in self.NOT_FOUND_CODES:
+                return False
+            raise
+        return True
+
+    def delete(self, name):
+        if name:
+            self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["ContentLength"]
+
+    def get_modified_time(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["LastModified"]
+
+    def url(self, name):
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(name)}, ExpiresIn=self.url_expiry,
+        )
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip("/")
+        prefix = f"{prefix}/" if prefix else ""
+        directories, files = [], []
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix, "Delimiter": "/"}
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            directories += [p["Prefix"][len(prefix):].rstrip("/") for p in page.get("CommonPrefixes", [])]
+            files += [o["Key"][len(prefix):] for o in page.get("Contents", [])]
+            if not page.get("IsTruncated"):
+                return directories, files
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+class MediaStorage(LazyObject):
+    def _setup(self):
+        config = getattr(settings, "MEDIA_STORAGE", None) or {}
+        backend = import_string(config.get("BACKEND", DEFAULT_BACKEND))
+        self._wrapped = backend(**config.get("OPTIONS", {}))
+
+
+media_storage = MediaStorage()
+
+
+def get_media_storage():
+    """Storage callable for the FileFields holding generated media"""
+    return media_storage
+
+
+def _reset_media_storage(*, setting, **kwargs):
+    if setting == "MEDIA_STORAGE":
+        media_storage._wrapped = empty
+
+
+setting_changed.connect(_reset_media_storage)
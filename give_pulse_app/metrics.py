@@ -0,0 +1,158 @@
+from __future__ import annotations
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def bucket_index(value_ms: float) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)
+
+
+def bucket_percentile(buckets, pct: float) -> float:
+    """Estimate a percentile from histogram counts (returns a bucket upper bound)"""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    threshold = total * pct / 100
+    seen = 0
+    for i, count in enumerate(buckets):
+        seen += count
+        if seen >= threshold:
+            if i < len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[i])
+            return float("inf")
+    return float("inf")
+
+
+class ViewStats:
+    """Running totals for one URL name"""
+
+    __slots__ = ("requests", "queries", "db_ms", "latency_ms", "bytes", "max_queries", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.latency_ms = 0.0
+        self.bytes = 0
+        self.max_queries = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, *, queries: int, db_ms: float, latency_ms: float, size: int):
+        self.requests += 1
+        self.queries += queries
+        self.db_ms += db_ms
+        self.latency_ms += latency_ms
+        self.bytes += size
+        self.max_queries = max(self.max_queries, queries)
+        self.buckets[bucket_index(latency_ms)] += 1
+
+    def merge(self, data: dict):
+        self.requests += data["requests"]
+        self.queries += data["queries"]
+        self.db_ms += data["db_ms"]
+        self.latency_ms += data["latency_ms"]
+        self.bytes += data["bytes"]
+        self.max_queries = max(self.max_queries, data["max_queries"])
+        for i, count in enumerate(data["buckets"][:len(self.buckets)]):
+            self.buckets[i] += count
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 3),
+            "latency_ms": round(self.latency_ms, 3),
+            "bytes": self.bytes,
+            "max_queries": self.max_queries,
+            "buckets": list(self.buckets),
+        }
+
+
+class MetricsStore:
+    """Process-local per-view histograms, flushed to JSONL (or the log) periodically"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, ViewStats] = {}
+        self._last_flush = time.monotonic()
+        self._exit_path = None
+        self._exit_registered = False
+
+    def flush_at_exit(self, path=None):
+        """Flush to ``path`` when the interpreter exits; the hook is registered once per process"""
+        with self._lock:
+            self._exit_path = path
+            if self._exit_registered:
+                return
+            self._exit_registered = True
+        atexit.register(self._flush_on_exit)
+
+    def _flush_on_exit(self):
+        self.flush(self._exit_path)
+
+    def record(self, view_name: str, **values):
+        with self._lock:
+            stats = self._stats.get(view_name)
+            if stats is None:
+                stats = self._stats[view_name] = ViewStats()
+            stats.add(**values)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def maybe_flush(self, interval: float, path=None):
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush(path)
+
+    def flush(self, path=None):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            self._last_flush = time.monotonic()
+        if not stats:
+            return
+
+        flushed_at = time.time()
+        lines = [
+            json.dumps({"ts": flushed_at, "pid": os.getpid(), "view": name, **s.as_dict()})
+            for name, s in stats.items()
+        ]
+        if not path:
+            for line in lines:
+                logger.info("view metrics %s", line)
+            return
+        try:
+            os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write view metrics to {path}: {e}")
+
+
+def load_metrics(path) -> dict[str, ViewStats]:
+    """Merge every flushed record in a JSONL metrics file, keyed by view name"""
+    merged: dict[str, ViewStats] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            merged.setdefault(data["view"], ViewStats()).merge(data)
+    return merged
+
+
+store = MetricsStore()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import store
+
+
+class _QueryCounter:
+    """``execute_wrapper`` hook that counts queries and their wall time"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class QueryMetricsMiddleware:
+    """Record query count, DB time, latency and response size per URL name.
+
+    Only a VIEW_METRICS_SAMPLE_RATE fraction of requests is measured; the
+    rest pay for one random() call. Totals are kept in memory and appended
+    to VIEW_METRICS_FILE (or logged) every VIEW_METRICS_FLUSH_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, "VIEW_METRICS_SAMPLE_RATE", 0.0))
+        self.flush_seconds = float(getattr(settings, "VIEW_METRICS_FLUSH_SECONDS", 60))
+        self.path = getattr(settings, "VIEW_METRICS_FILE", None)
+        store.flush_at_exit(self.path)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(counter))
+            response = self.get_response(request)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.view_name if match else None) or "<unresolved>"
+        if response.streaming:
+            size = int(response.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+
+        store.record(
+            view_name,
+            queries=counter.queries,
+            db_ms=counter.db_seconds * 1000,
+            latency_ms=latency_ms,
+            size=size,
+        )
+        store.maybe_flush(self.flush_seconds, self.path)
+        return response
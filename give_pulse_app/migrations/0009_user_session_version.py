@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0008_contactmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="session_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bumped on logout to revoke issued sessions",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:26
+
+import django.core.validators
+from django.db import migrations, models
+import give_pulse_app.media_storage
+import give_pulse_app.uploads
+import give_pulse_app.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0009_user_session_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="donation",
+            name="certificate_file",
+            field=models.FileField(
+                blank=True,
+                storage=give_pulse_app.media_storage.get_media_storage,
+                upload_to="certificates/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="donationappointment",
+            name="qr_code_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=give_pulse_app.media_storage.get_media_storage,
+                upload_to="qr_codes/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="donor",
+            name="profile_picture",
+            field=models.ImageField(
+                blank=True,
+                help_text="JPEG/PNG/WEBP, ≤2MB",
+                null=True,
+                storage=give_pulse_app.media_storage.get_media_storage,
+                upload_to=give_pulse_app.uploads.donor_avatar_path,
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        allowed_extensions=["jpg", "jpeg", "png", "webp"]
+                    ),
+                    give_pulse_app.validators.validate_profile_image,
+                ],
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0011_outbound_email"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="donor",
+            index=models.Index(
+                fields=["cooldown_until"], name="give_pulse__cooldow_4754bb_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="donor",
+            index=models.Index(
+                fields=["city", "abo", "rh", "cooldown_until"],
+                name="give_pulse__city_id_3c2adb_idx",
+            ),
+        ),
+    ]
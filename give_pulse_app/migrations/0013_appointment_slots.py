@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0012_donor_eligibility_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hospital",
+            name="slot_capacity",
+            field=models.PositiveSmallIntegerField(
+                default=4, help_text="Donors booked per appointment slot"
+            ),
+        ),
+        migrations.CreateModel(
+            name="AppointmentSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("starts_at", models.DateTimeField()),
+                ("capacity", models.PositiveSmallIntegerField()),
+                ("booked", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="appointment_slots",
+                        to="give_pulse_app.hospital",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="appointmentslot",
+            constraint=models.UniqueConstraint(
+                fields=("hospital", "starts_at"), name="unique_hospital_slot"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0013_appointment_slots"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="donor",
+            name="donation_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="donor",
+            index=models.Index(
+                fields=["-donation_count"], name="donor_donation_count_idx"
+            ),
+        ),
+    ]
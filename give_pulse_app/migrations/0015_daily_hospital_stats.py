@@ -0,0 +1,112 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0014_donor_donation_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DailyHospitalStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "abo",
+                    models.CharField(
+                        choices=[("O", "O"), ("A", "A"), ("B", "B"), ("AB", "AB")],
+                        max_length=2,
+                    ),
+                ),
+                (
+                    "rh",
+                    models.CharField(
+                        choices=[("+", "Rh+"), ("-", "Rh-")], max_length=1
+                    ),
+                ),
+                ("requests_created", models.PositiveIntegerField(default=0)),
+                ("units_requested", models.PositiveIntegerField(default=0)),
+                ("units_fulfilled", models.PositiveIntegerField(default=0)),
+                ("requests_fulfilled", models.PositiveIntegerField(default=0)),
+                ("matches_created", models.PositiveIntegerField(default=0)),
+                ("matches_accepted", models.PositiveIntegerField(default=0)),
+                ("matches_declined", models.PositiveIntegerField(default=0)),
+                ("donations", models.PositiveIntegerField(default=0)),
+                ("median_hours_to_fulfil", models.FloatField(blank=True, null=True)),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="give_pulse_app.hospital",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailyhospitalstats",
+            constraint=models.UniqueConstraint(
+                fields=("hospital", "day", "abo", "rh"),
+                name="unique_daily_hospital_stats",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bloodrequest",
+            index=models.Index(
+                fields=["created_at"], name="give_pulse__created_9de387_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bloodrequest",
+            index=models.Index(
+                fields=["updated_at"], name="give_pulse__updated_4150d0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="match",
+            index=models.Index(
+                fields=["created_at"], name="give_pulse__created_2036a3_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="match",
+            index=models.Index(
+                fields=["accepted_at"], name="give_pulse__accepte_454d3c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="match",
+            index=models.Index(
+                fields=["declined_at"], name="give_pulse__decline_766356_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0015_daily_hospital_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+                ("refreshed_at", models.DateTimeField()),
+            ],
+        ),
+    ]
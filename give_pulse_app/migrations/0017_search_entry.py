@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+TABLE = "give_pulse_app_searchentry"
+FTS = "give_pulse_app_searchentry_fts"
+
+# Full-text index on SearchEntry.text for each supported database
+CREATE = {
+    "mysql": [f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX searchentry_text_ft (text)"],
+    "postgresql": [
+        f"CREATE INDEX searchentry_text_tsv ON {TABLE} USING GIN (to_tsvector('simple', text))"
+    ],
+    # External-content FTS5 table kept in step with the entries by triggers
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE {FTS} USING fts5(text, content='{TABLE}', content_rowid='id')",
+        f"""CREATE TRIGGER {TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {FTS}(rowid, text) VALUES (new.id, new.text);
+        END""",
+        f"""CREATE TRIGGER {TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {FTS}({FTS}, rowid, text) VALUES ('delete', old.id, old.text);
+        END""",
+        f"""CREATE TRIGGER {TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+            INSERT INTO {FTS}({FTS}, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    ],
+}
+DROP = {
+    "mysql": [f"ALTER TABLE {TABLE} DROP INDEX searchentry_text_ft"],
+    "postgresql": ["DROP INDEX searchentry_text_tsv"],
+    "sqlite": [
+        f"DROP TRIGGER {TABLE}_ai",
+        f"DROP TRIGGER {TABLE}_ad",
+        f"DROP TRIGGER {TABLE}_au",
+        f"DROP TABLE {FTS}",
+    ],
+}
+
+
+def create_fulltext_index(apps, schema_editor):
+    for sql in CREATE.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    for sql in DROP.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0016_site_counter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=20)),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("text", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchentry",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="unique_search_entry"
+            ),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
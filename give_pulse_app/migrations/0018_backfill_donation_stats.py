@@ -0,0 +1,53 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# models.DONATED_STATUSES as of this migration
+DONATED_STATUSES = ["donated", "completed"]
+BATCH_SIZE = 1000
+
+
+def backfill_donation_stats(apps, schema_editor):
+    """Fill the donation_count/last_donation columns added by 0014 from donated
+    matches, as DonorQuerySet.reconcile_donation_stats does (historical models
+    have no custom querysets). A later self-reported last_donation is kept.
+    """
+    Donor = apps.get_model("give_pulse_app", "Donor")
+    Match = apps.get_model("give_pulse_app", "Match")
+    donated = Match.objects.filter(
+        donor=models.OuterRef("pk"), status__in=DONATED_STATUSES
+    ).values("donor")
+    rows = Donor.objects.annotate(
+        actual_count=Coalesce(
+            models.Subquery(donated.annotate(n=models.Count("id")).values("n")), 0
+        ),
+        actual_last=models.Subquery(
+            donated.annotate(last=models.Max("donated_at")).values("last")
+        ),
+    ).only("id", "donation_count", "last_donation")
+
+    batch = []
+    for donor in rows.iterator(chunk_size=BATCH_SIZE):
+        last = donor.actual_last and timezone.localdate(donor.actual_last)
+        if last and donor.last_donation:
+            last = max(last, donor.last_donation)
+        last = last or donor.last_donation
+        if (donor.donation_count, donor.last_donation) == (donor.actual_count, last):
+            continue
+        donor.donation_count, donor.last_donation = donor.actual_count, last
+        batch.append(donor)
+        if len(batch) >= BATCH_SIZE:
+            Donor.objects.bulk_update(batch, ["donation_count", "last_donation"])
+            batch = []
+    Donor.objects.bulk_update(batch, ["donation_count", "last_donation"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0017_search_entry"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_donation_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def rebuild_search_index(apps, schema_editor):
+    """Index the rows that existed before 0017 created the (empty) search index,
+    so admin search still finds them after deploy.
+
+    Entries are built from several related tables, so this reuses
+    search.rebuild() (the rebuild_search_index command) rather than repeating
+    it with historical models; it only reads the fields listed in
+    search.FIELDS and writes nothing on an empty database.
+    """
+    from give_pulse_app import search
+
+    search.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("give_pulse_app", "0018_backfill_donation_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
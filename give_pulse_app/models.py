@@ -1,10 +1,15 @@
 from __future__ import annotations
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
+from django.utils import timezone
 from .validators import validate_person_name, validate_phone, validate_profile_image
-from .uploads import donor_avatar_path
-from .managers import UserManager, StaffManager, DonorManager,BloodRequestManager
+from .media_storage import get_media_storage, media_storage
+from .uploads import avatar_variant_name, delete_avatar, donor_avatar_path, store_avatar
+from .managers import (
+    UserManager, StaffManager, DonorManager, BloodRequestManager,
+    MatchQuerySet, DonationAppointmentQuerySet, DonationQuerySet,
+)
 # Choices :
 class Role(models.TextChoices):
     GUEST = "guest", "Guest"
@@ -35,6 +40,14 @@ class MatchStatus(models.TextChoices):
     CHECKED_IN = "checked_in", "Checked-in"
     DONATED = "donated", "Donated"
 
+# Match statuses that count as a completed donation ("completed" is legacy data)
+DONATED_STATUSES = [MatchStatus.DONATED, "completed"]
+
+class EmailStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    SENT = "sent", "Sent"
+    FAILED = "failed", "Failed"
+
 # Models
 class Governorate(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -62,6 +75,7 @@ class Hospital(models.Model):
     name = models.CharField(max_length=255)
     city = models.ForeignKey(City, on_delete=models.PROTECT, related_name="hospitals")
     is_verified = models.BooleanField(default=False)
+    slot_capacity = models.PositiveSmallIntegerField(default=4, help_text="Donors booked per appointment slot")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -81,6 +95,7 @@ class User(models.Model):
     phone = models.CharField(max_length=20, blank=True, validators=[validate_phone])
     password = models.CharField(max_length=128)
     role = models.CharField(max_length=20, choices=Role.choices, default=Role.GUEST)
+    session_version = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped on logout to revoke issued sessions")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     objects = UserManager()
@@ -161,6 +176,7 @@ class Donor(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="donor")
     profile_picture = models.ImageField(
         upload_to=donor_avatar_path, 
+        storage=get_media_storage,
         blank=True,
         null=True,
         validators=[FileExtensionValidator(allowed_extensions=["jpg", "jpeg", "png", "webp"]),validate_profile_image,],
@@ -170,6 +186,8 @@ class Donor(models.Model):
     rh = models.CharField(max_length=1, choices=RhType.choices)
     city = models.ForeignKey(City, on_delete=models.PROTECT, related_name="donors")
     last_donation = models.DateField(null=True, blank=True)
+    # Maintained by Donor.objects.record_donation(); reconcile with backfill_donation_stats
+    donation_count = models.PositiveIntegerField(default=0, editable=False)
     cooldown_until = models.DateTimeField(null=True, blank=True, help_text="Donor cannot match until this date")
     eligibility_consent = models.BooleanField(default=False)
     public_alias = models.CharField(max_length=50, blank=True)
@@ -177,31 +195,84 @@ class Donor(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = DonorManager()
     
+    # Fields whose loaded value is remembered so save() can tell what changed
+    # without re-reading the row.
+    TRACKED_FIELDS = ("profile_picture",)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def _tracked_value(self, name):
+        value = getattr(self, name)
+        return getattr(value, "name", value) or None
+
+    def changed_fields(self):
+        """Tracked fields that differ from the values loaded from the database"""
+        loaded = getattr(self, "_loaded_values", {})
+        return {
+            name for name, value in loaded.items()
+            if name not in self.get_deferred_fields() and self._tracked_value(name) != (value or None)
+        }
+
     def save(self, *args, **kwargs):
-        try:
-            old = type(self).objects.get(pk=self.pk)
-        except type(self).DoesNotExist:
-            old = None
+        update_fields = kwargs.get("update_fields")
+        old_picture = None
+        if "profile_picture" in self.changed_fields() and (
+            update_fields is None or "profile_picture" in update_fields
+        ):
+            old_picture = self._loaded_values["profile_picture"]
         super().save(*args, **kwargs)
-        if old and old.profile_picture and old.profile_picture != self.profile_picture:
-            old.profile_picture.delete(save=False)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            **getattr(self, "_loaded_values", {}),
+            **{
+                name: self._tracked_value(name) for name in self.TRACKED_FIELDS
+                if name not in deferred and (update_fields is None or name in update_fields)
+            },
+        }
+        if old_picture:
+            # Only drop the old files once the new name is committed.
+            transaction.on_commit(lambda: delete_avatar(old_picture))
     
     def delete(self, *args, **kwargs):
-        if self.profile_picture:
-            self.profile_picture.delete(save=False)
+        picture = self.profile_picture.name if self.profile_picture else None
         super().delete(*args, **kwargs)
+        if picture:
+            transaction.on_commit(lambda: delete_avatar(picture))
+
+    def set_profile_picture(self, file):
+        """Resize, re-encode and store an uploaded avatar, then save the field"""
+        self.profile_picture.name = store_avatar(file)
+        self.save(update_fields=["profile_picture"])
+
+    @property
+    def profile_thumbnail_url(self):
+        """URL of the small avatar variant (the original for legacy uploads)"""
+        if not self.profile_picture:
+            return ""
+        thumb = avatar_variant_name(self.profile_picture.name, "thumb")
+        return self.profile_picture.storage.url(thumb) if thumb else self.profile_picture.url
     class Meta:
         indexes = [
             models.Index(fields=["city"]),
             models.Index(fields=["abo", "rh"]),
+            models.Index(fields=["cooldown_until"]),
+            # Donor.objects.eligible() within a city and blood type is one range scan.
+            models.Index(fields=["city", "abo", "rh", "cooldown_until"]),
+            # Leaderboard and admin sorting by donations
+            models.Index(fields=["-donation_count"], name="donor_donation_count_idx"),
         ]
 
-    def is_in_cooldown(self):
-        """Check if donor is in cooldown period"""
+    def is_in_cooldown(self, at=None):
+        """Check if donor is in cooldown period (same rule as Donor.objects.in_cooldown)"""
         if not self.cooldown_until:
             return False
-        from django.utils import timezone
-        return timezone.now() < self.cooldown_until
+        return (at or timezone.now()) < self.cooldown_until
     
     def can_donate(self):
         """Check if donor can donate (not in cooldown)"""
@@ -242,6 +313,9 @@ class BloodRequest(models.Model):
             models.Index(fields=["status"]),
             models.Index(fields=["deadline_at"]),
             models.Index(fields=["city"]),
+            # Scanned by rollups.changed_days
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["updated_at"]),
         ]
 
     def __str__(self):
@@ -257,11 +331,16 @@ class Match(models.Model):
     checked_in_at = models.DateTimeField(null=True, blank=True)
     donated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = MatchQuerySet.as_manager()
 
     class Meta:
         unique_together = [("blood_request", "donor")]
         indexes = [
             models.Index(fields=["status"]),
+            # Scanned by rollups.changed_days
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["accepted_at"]),
+            models.Index(fields=["declined_at"]),
         ]
 
     def __str__(self):
@@ -272,8 +351,9 @@ class DonationAppointment(models.Model):
     window_start = models.DateTimeField()
     window_end = models.DateTimeField()
     qr_code_data = models.TextField(blank=True, help_text="QR code data for verification")
-    qr_code_image = models.ImageField(upload_to="qr_codes/", blank=True, null=True)
+    qr_code_image = models.ImageField(upload_to="qr_codes/", storage=get_media_storage, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = DonationAppointmentQuerySet.as_manager()
     
     def clean(self):
         super().clean()
@@ -281,33 +361,135 @@ class DonationAppointment(models.Model):
             raise ValidationError({"window_end": "End must be after start."})
     
     def generate_qr_data(self):
-        """Generate QR code data with appointment information"""
-        from django.utils import timezone
-        data = {
+        """Generate the compact signed QR token for this appointment"""
+        from .qr_tokens import EXPIRY_GRACE, make_appointment_token
+        return make_appointment_token(self.id, self.match_id, self.window_end + EXPIRY_GRACE)
+
+    def render_qr_code(self):
+        """Render the QR token as a PNG, store it and save the name on the appointment"""
+        import io
+        import qrcode
+
+        if not self.qr_code_data:
+            raise ValueError("No QR code data available")
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+        qr.add_data(self.qr_code_data)
+        qr.make(fit=True)
+        qr_buffer = io.BytesIO()
+        qr.make_image(fill_color="black", back_color="white").save(qr_buffer)
+
+        # Stored under its content address
+        self.qr_code_image.name = media_storage.save_content("qr_codes", qr_buffer.getvalue(), ".png")
+        self.save(update_fields=["qr_code_image"])
+        return self.qr_code_image.name
+
+    @property
+    def verification_code(self):
+        return f"GP{self.id:06d}{self.match_id:06d}"
+
+    def qr_summary(self):
+        """Details shown after a successful scan (read from the DB, not the QR payload)"""
+        donor = self.match.donor
+        return {
             "appointment_id": self.id,
-            "match_id": self.match.id,
-            "donor_id": self.match.donor.id,
-            "donor_name": f"{self.match.donor.user.first_name} {self.match.donor.user.last_name}",
-            "blood_type": f"{self.match.donor.abo}{self.match.donor.rh}",
+            "match_id": self.match_id,
+            "donor_id": donor.id,
+            "donor_name": f"{donor.user.first_name} {donor.user.last_name}",
+            "blood_type": f"{donor.abo}{donor.rh}",
             "hospital": self.match.blood_request.hospital.name,
             "appointment_date": self.window_start.isoformat(),
-            "verification_code": f"GP{self.id:06d}{self.match.id:06d}",
-            "created_at": timezone.now().isoformat()
+            "verification_code": self.verification_code,
         }
-        import json
-        return json.dumps(data)
     
     def __str__(self):
         return f"Appointment for match {self.match_id}"
 
 
+class AppointmentSlot(models.Model):
+    """Booked places in one appointment slot at one hospital (see scheduling)"""
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="appointment_slots")
+    starts_at = models.DateTimeField()
+    capacity = models.PositiveSmallIntegerField()
+    booked = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for "slots of this hospital in a time range"
+            models.UniqueConstraint(fields=["hospital", "starts_at"], name="unique_hospital_slot"),
+        ]
+
+    def __str__(self):
+        return f"{self.hospital_id} @ {self.starts_at:%Y-%m-%d %H:%M} ({self.booked}/{self.capacity})"
+
+
+class DailyHospitalStats(models.Model):
+    """One day of activity at one hospital for one blood type (see rollups)"""
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    abo = models.CharField(max_length=2, choices=BloodType.choices)
+    rh = models.CharField(max_length=1, choices=RhType.choices)
+    requests_created = models.PositiveIntegerField(default=0)
+    units_requested = models.PositiveIntegerField(default=0)
+    units_fulfilled = models.PositiveIntegerField(default=0)
+    requests_fulfilled = models.PositiveIntegerField(default=0)
+    matches_created = models.PositiveIntegerField(default=0)
+    matches_accepted = models.PositiveIntegerField(default=0)
+    matches_declined = models.PositiveIntegerField(default=0)
+    donations = models.PositiveIntegerField(default=0)
+    median_hours_to_fulfil = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Also the index for a hospital's trend over a date range
+            models.UniqueConstraint(fields=["hospital", "day", "abo", "rh"], name="unique_daily_hospital_stats"),
+        ]
+
+    def __str__(self):
+        return f"{self.hospital_id} {self.day} {self.abo}{self.rh}"
+
+
+class RollupWatermark(models.Model):
+    """Point up to which a rollup has processed its source rows"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+class SiteCounter(models.Model):
+    """Stored value of a site-wide count, refreshed by ``refresh_site_counters``"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class SearchEntry(models.Model):
+    """Words an admin can find a row by, kept in a full-text index (see search.py)"""
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    text = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="unique_search_entry"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+
 class Donation(models.Model):
     match = models.OneToOneField(Match, on_delete=models.PROTECT, related_name="donation")
     confirmed_by = models.ForeignKey(Staff, null=True, blank=True, on_delete=models.SET_NULL)
     units = models.PositiveIntegerField(default=1)
-    certificate_file = models.FileField(upload_to="certificates/", blank=True)
+    certificate_file = models.FileField(upload_to="certificates/", storage=get_media_storage, blank=True)
     certificate_serial = models.CharField(max_length=40, blank=True, unique=True)
     confirmed_at = models.DateTimeField(auto_now_add=True)
+    objects = DonationQuerySet.as_manager()
 
     class Meta:
         indexes = [
@@ -332,8 +514,6 @@ class Donation(models.Model):
             from reportlab.lib import colors
             from reportlab.graphics.shapes import Drawing, Rect
             from reportlab.graphics import renderPDF
-            from django.conf import settings
-            import os
             import qrcode
             import io
         except ImportError:
@@ -343,13 +523,11 @@ class Donation(models.Model):
             self.certificate_serial = self.generate_certificate_serial()
             self.save(update_fields=['certificate_serial'])
         
-        # Create certificate file path
-        filename = f"certificate_{self.certificate_serial}.pdf"
-        filepath = os.path.join(settings.MEDIA_ROOT, "certificates", filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Build the PDF in memory; it is stored once complete
+        pdf_buffer = io.BytesIO()
         
         # Create PDF with margins
-        doc = SimpleDocTemplate(filepath, pagesize=letter, 
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=letter, 
                               leftMargin=0.5*inch, rightMargin=0.5*inch,
                               topMargin=0.5*inch, bottomMargin=0.5*inch)
         styles = getSampleStyleSheet()
@@ -481,14 +659,14 @@ class Donation(models.Model):
         qr.add_data(qr_json)
         qr.make(fit=True)
         
-        # Save QR code to temporary file
+        # Render QR code in memory
         qr_img = qr.make_image(fill_color="black", back_color="white")
-        qr_temp_path = os.path.join(settings.MEDIA_ROOT, "temp", f"qr_{self.certificate_serial}.png")
-        os.makedirs(os.path.dirname(qr_temp_path), exist_ok=True)
-        qr_img.save(qr_temp_path)
+        qr_buffer = io.BytesIO()
+        qr_img.save(qr_buffer)
+        qr_buffer.seek(0)
         
         # Add QR code to PDF
-        qr_image = Image(qr_temp_path, width=1.5*inch, height=1.5*inch)
+        qr_image = Image(qr_buffer, width=1.5*inch, height=1.5*inch)
         story.append(qr_image)
         
         # QR code label
@@ -554,15 +732,11 @@ class Donation(models.Model):
         # Build PDF
         doc.build(story)
         
-        # Clean up temporary QR file
-        if os.path.exists(qr_temp_path):
-            os.remove(qr_temp_path)
-        
-        # Save file path to model
-        self.certificate_file.name = f"certificates/{filename}"
+        # Store it under its content address and save the name to the model
+        self.certificate_file.name = media_storage.save_content("certificates", pdf_buffer.getvalue(), ".pdf")
         self.save(update_fields=['certificate_file'])
         
-        return filepath
+        return self.certificate_file.name
 
     def __str__(self):
         return f"Donation for match {self.match_id}"
@@ -596,3 +770,27 @@ class ContactMessage(models.Model):
 
     def __str__(self):
         return f"{self.name} <{self.email}>"
+
+
+class OutboundEmail(models.Model):
+    """Email waiting to be sent by the send_queued_email worker (see mail_queue)"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(help_text="List of recipient addresses")
+    reply_to = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, help_text="Not sent before this time")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "due now" scan
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.status})"
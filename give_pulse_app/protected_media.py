@@ -0,0 +1,48 @@
+"""
+Serving of access-controlled media (certificates, appointment QR codes).
+
+Views authorize the request and then call ``serve_protected``. With
+``PROTECTED_MEDIA_SERVER = "nginx"`` the response is an empty
+``X-Accel-Redirect`` to an ``internal`` nginx location, so nginx streams the
+file and the worker is free as soon as the headers are written. Otherwise
+(development, or a remote MEDIA_STORAGE) the file is streamed from the media
+storage with ``FileResponse``.
+"""
+from __future__ import annotations
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .media_storage import media_storage
+
+
+def _server():
+    return getattr(settings, "PROTECTED_MEDIA_SERVER", "django")
+
+
+def serve_protected(name, *, filename=None, as_attachment=False):
+    """Return a response that sends the media file ``name`` to an authorized user"""
+    if not name:
+        raise Http404("File not found.")
+    filename = filename or os.path.basename(name)
+
+    if _server() == "nginx":
+        internal_url = getattr(settings, "PROTECTED_MEDIA_INTERNAL_URL", "/protected-media/")
+        content_type, encoding = mimetypes.guess_type(filename)
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        response["X-Accel-Redirect"] = internal_url + quote(name)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    else:
+        try:
+            file = media_storage.open(name, "rb")
+        except OSError:
+            raise Http404("File not found.")
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+
+    # Never let shared caches keep a copy of someone's certificate.
+    response["Cache-Control"] = "private, max-age=3600"
+    return response
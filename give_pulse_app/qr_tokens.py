@@ -0,0 +1,119 @@
+"""
+Compact signed tokens for appointment QR codes.
+
+A token is ``GP`` followed by the unpadded base32 encoding of::
+
+    version (1 byte) | appointment_id | match_id | expires_at | signature (10 bytes)
+
+with the ids and the expiry (unix seconds) stored as unsigned varints and the
+signature a truncated HMAC-SHA256 keyed from SECRET_KEY. Base32 only uses
+characters from the QR alphanumeric set, so a token fits a version 2-3 QR code
+instead of the version 10+ needed for the old JSON payload.
+"""
+from __future__ import annotations
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+TOKEN_PREFIX = "GP"
+TOKEN_VERSION = 1
+SIGNATURE_BYTES = 10
+KEY_SALT = "give_pulse_app.qr_tokens.appointment"
+
+# How long after the appointment window closes a QR code is still accepted.
+EXPIRY_GRACE = timedelta(days=1)
+
+
+class InvalidQRToken(ValueError):
+    """Raised when a QR token is malformed, forged or expired"""
+
+
+@dataclass(frozen=True)
+class AppointmentToken:
+    appointment_id: int
+    match_id: int
+    expires_at: datetime
+    version: int = TOKEN_VERSION
+
+
+def _encode_varint(value: int) -> bytes:
+    if value < 0:
+        raise ValueError("varint values must be non-negative")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _decode_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            break
+    raise InvalidQRToken("Malformed QR token.")
+
+
+def _sign(payload: bytes) -> bytes:
+    return salted_hmac(KEY_SALT, payload, algorithm="sha256").digest()[:SIGNATURE_BYTES]
+
+
+def looks_like_token(data: str) -> bool:
+    return data[:len(TOKEN_PREFIX)].upper() == TOKEN_PREFIX
+
+
+def make_appointment_token(appointment_id: int, match_id: int, expires_at: datetime) -> str:
+    payload = (
+        bytes([TOKEN_VERSION])
+        + _encode_varint(appointment_id)
+        + _encode_varint(match_id)
+        + _encode_varint(int(expires_at.timestamp()))
+    )
+    raw = payload + _sign(payload)
+    return TOKEN_PREFIX + base64.b32encode(raw).decode("ascii").rstrip("=")
+
+
+def read_appointment_token(token: str, *, now: datetime | None = None) -> AppointmentToken:
+    """Check the signature and expiry of ``token`` and return its contents"""
+    token = (token or "").strip().upper()
+    if not token.startswith(TOKEN_PREFIX):
+        raise InvalidQRToken("Not a GivePulse QR token.")
+    body = token[len(TOKEN_PREFIX):]
+    try:
+        raw = base64.b32decode(body + "=" * (-len(body) % 8))
+    except (binascii.Error, ValueError):
+        raise InvalidQRToken("Malformed QR token.")
+    if len(raw) <= SIGNATURE_BYTES + 1:
+        raise InvalidQRToken("Malformed QR token.")
+
+    payload, signature = raw[:-SIGNATURE_BYTES], raw[-SIGNATURE_BYTES:]
+    if not constant_time_compare(signature, _sign(payload)):
+        raise InvalidQRToken("QR code signature is invalid.")
+    if payload[0] != TOKEN_VERSION:
+        raise InvalidQRToken(f"Unsupported QR token version {payload[0]}.")
+
+    appointment_id, pos = _decode_varint(payload, 1)
+    match_id, pos = _decode_varint(payload, pos)
+    expires_ts, pos = _decode_varint(payload, pos)
+    if pos != len(payload):
+        raise InvalidQRToken("Malformed QR token.")
+
+    expires_at = datetime.fromtimestamp(expires_ts, tz=dt_timezone.utc)
+    if (now or timezone.now()) > expires_at:
+        raise InvalidQRToken("This QR code has expired.")
+    return AppointmentToken(appointment_id=appointment_id, match_id=match_id, expires_at=expires_at)
@@ -0,0 +1,9 @@
+"""
+Location of the per-view query budgets shared by the budget test and
+``manage.py update_query_budgets``.
+"""
+from pathlib import Path
+
+QUERY_BUDGETS_FILE = Path(__file__).resolve().parent / "query_budgets.json"
+# Set by update_query_budgets to make the budget test rewrite the file
+UPDATE_BUDGETS_ENV = "UPDATE_QUERY_BUDGETS"
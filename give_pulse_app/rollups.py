@@ -0,0 +1,150 @@
+"""
+Daily per-hospital, per-blood-type rollups behind the staff statistics page.
+
+``update_daily_stats`` finds the (day, hospital) pairs touched since the last
+watermark and recomputes just those rows from the source tables, a handful
+of grouped queries per affected day. The dashboard then reads one small
+table no matter how much history there is. Recomputing a day is idempotent,
+so each run re-reads a short overlap before the watermark to pick up rows
+committed late by long transactions.
+"""
+from __future__ import annotations
+import statistics
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BloodRequest, DailyHospitalStats, Donation, Match, RequestStatus, RollupWatermark
+
+WATERMARK = "daily_hospital_stats"
+OVERLAP = timedelta(minutes=10)
+
+# Source timestamps that put a row into a day's rollup, as (queryset, timestamp, hospital path)
+SOURCES = [
+    (BloodRequest.objects, "created_at", "hospital_id"),
+    (Match.objects, "created_at", "blood_request__hospital_id"),
+    (Match.objects, "accepted_at", "blood_request__hospital_id"),
+    (Match.objects, "declined_at", "blood_request__hospital_id"),
+    (Donation.objects, "confirmed_at", "match__blood_request__hospital_id"),
+]
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _between(field, since, until):
+    bounds = {f"{field}__lte": until}
+    if since is not None:
+        bounds[f"{field}__gt"] = since
+    return bounds
+
+
+def changed_days(since, until):
+    """{day: {hospital_id, ...}} for every row with an event in (since, until].
+
+    ``since=None`` means from the beginning.
+    """
+    touched = defaultdict(set)
+    for queryset, field, hospital in SOURCES:
+        rows = (
+            queryset.filter(**_between(field, since, until))
+            .annotate(day=TruncDate(field)).values_list("day", hospital).distinct()
+        )
+        for day, hospital_id in rows:
+            touched[day].add(hospital_id)
+    # An edited request changes the day it was created on, not the edit day
+    edited = (
+        BloodRequest.objects.filter(**_between("updated_at", since, until))
+        .annotate(day=TruncDate("created_at")).values_list("day", "hospital_id").distinct()
+    )
+    for day, hospital_id in edited:
+        touched[day].add(hospital_id)
+    return touched
+
+
+def _grouped(queryset, field, day, hospital_ids, prefix, **aggregates):
+    start, end = _day_range(day)
+    return queryset.filter(
+        **{f"{field}__gte": start, f"{field}__lt": end, f"{prefix}hospital_id__in": hospital_ids}
+    ).values_list(f"{prefix}hospital_id", f"{prefix}abo", f"{prefix}rh").annotate(**aggregates)
+
+
+def compute_day(day, hospital_ids):
+    """DailyHospitalStats rows (unsaved) for ``day`` at the given hospitals"""
+    rows = {}
+
+    def row(key):
+        if key not in rows:
+            hospital_id, abo, rh = key
+            rows[key] = DailyHospitalStats(hospital_id=hospital_id, day=day, abo=abo, rh=rh)
+        return rows[key]
+
+    for *key, n, units in _grouped(
+        BloodRequest.objects, "created_at", day, hospital_ids, "",
+        n=Count("id"), units=Sum("units_requested"),
+    ):
+        r = row(tuple(key))
+        r.requests_created, r.units_requested = n, units or 0
+
+    for field, attr in (("created_at", "matches_created"), ("accepted_at", "matches_accepted"),
+                        ("declined_at", "matches_declined")):
+        for *key, n in _grouped(Match.objects, field, day, hospital_ids, "blood_request__", n=Count("id")):
+            setattr(row(tuple(key)), attr, n)
+
+    for *key, n, units in _grouped(
+        Donation.objects, "confirmed_at", day, hospital_ids, "match__blood_request__",
+        n=Count("id"), units=Sum("units"),
+    ):
+        r = row(tuple(key))
+        r.donations, r.units_fulfilled = n, units or 0
+
+    # Requests fulfilled on this day: fulfilment time is their last donation
+    start, end = _day_range(day)
+    hours = defaultdict(list)
+    fulfilled = (
+        BloodRequest.objects.filter(status=RequestStatus.FULFILLED, hospital_id__in=hospital_ids)
+        .annotate(fulfilled_at=Max("matches__donation__confirmed_at"))
+        .filter(fulfilled_at__gte=start, fulfilled_at__lt=end)
+        .values_list("hospital_id", "abo", "rh", "created_at", "fulfilled_at")
+    )
+    for hospital_id, abo, rh, created_at, fulfilled_at in fulfilled:
+        hours[(hospital_id, abo, rh)].append((fulfilled_at - created_at).total_seconds() / 3600)
+    for key, values in hours.items():
+        r = row(key)
+        r.requests_fulfilled = len(values)
+        r.median_hours_to_fulfil = statistics.median(values)
+
+    return list(rows.values())
+
+
+def rebuild(touched):
+    """Replace the rollup rows of every (day, hospital) in ``touched``. Returns rows written."""
+    written = 0
+    for day, hospital_ids in sorted(touched.items()):
+        hospital_ids = sorted(hospital_ids)
+        rows = compute_day(day, hospital_ids)
+        with transaction.atomic():
+            DailyHospitalStats.objects.filter(day=day, hospital_id__in=hospital_ids).delete()
+            DailyHospitalStats.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def update(*, full=False, now=None):
+    """Bring the rollups up to date; returns (days recomputed, rows written)"""
+    now = now or timezone.now()
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    since = None if full or watermark is None else watermark.value - OVERLAP
+    touched = changed_days(since, now)
+    if full:
+        # Also drops days whose source rows have since been deleted
+        DailyHospitalStats.objects.all().delete()
+    written = rebuild(touched)
+    RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={"value": now})
+    return len(touched), written
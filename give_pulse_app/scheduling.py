@@ -0,0 +1,159 @@
+"""
+Appointment slot scheduling with per-hospital capacity.
+
+Time is cut into fixed slots of ``APPOINTMENT_SLOT_MINUTES`` and each hospital
+takes ``Hospital.slot_capacity`` donors per slot. Bookings are counted in
+AppointmentSlot rows, one per hospital and slot that has been booked at least
+once. A slot is claimed with a conditional
+``UPDATE ... SET booked = booked + 1 WHERE booked < capacity``, so concurrent
+accepts can never overbook, and full slots are found with one range query on
+the (hospital, starts_at) index. The first booking of a slot inserts its row
+before the UPDATE; if concurrent first bookings still deadlock, the views
+retry once (``db.retry_on_deadlock``). Call the allocators inside the transaction
+that creates the appointments; a rollback then releases the slots too.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.utils import timezone
+
+from .models import AppointmentSlot, DonationAppointment
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class NoSlotAvailable(Exception):
+    """Raised when a hospital has no free slot within the booking horizon"""
+
+
+def slot_length() -> timedelta:
+    return timedelta(minutes=getattr(settings, "APPOINTMENT_SLOT_MINUTES", 120))
+
+
+def lead_time() -> timedelta:
+    """Earliest an appointment can start, counted from the accept"""
+    return timedelta(hours=getattr(settings, "APPOINTMENT_LEAD_HOURS", 24))
+
+
+def booking_horizon() -> timedelta:
+    """How far past the lead time the scheduler looks for a free slot"""
+    return timedelta(days=getattr(settings, "APPOINTMENT_HORIZON_DAYS", 14))
+
+
+def slot_start(at: datetime) -> datetime:
+    """Start of the slot containing ``at``"""
+    return at - (at - EPOCH) % slot_length()
+
+
+def _slot_starts(earliest, until):
+    """Starts of the slots beginning in [earliest, until)"""
+    start = slot_start(earliest)
+    if start < earliest:
+        start += slot_length()
+    while start < until:
+        yield start
+        start += slot_length()
+
+
+def _claim(hospital, starts_at, exists) -> bool:
+    """Book one place in the slot; False if it is full"""
+    if not exists:
+        # Create the row before claiming: a conditional UPDATE of a missing row
+        # takes an InnoDB gap lock, and two first bookings holding it deadlock on
+        # the insert. The insert is a no-op if a concurrent accept got there first.
+        AppointmentSlot.objects.bulk_create(
+            [AppointmentSlot(hospital=hospital, starts_at=starts_at, capacity=hospital.slot_capacity)],
+            ignore_conflicts=True,
+        )
+    slot = AppointmentSlot.objects.filter(hospital=hospital, starts_at=starts_at, booked__lt=F("capacity"))
+    return bool(slot.update(booked=F("booked") + 1))
+
+
+def allocate_slots(hospital, count, earliest=None) -> list[tuple[datetime, datetime]]:
+    """Book ``count`` appointments at ``hospital`` in the earliest free slots.
+
+    Returns (window_start, window_end) pairs in booking order. Raises
+    NoSlotAvailable if the horizon fills up first; places already claimed
+    are released when the caller's transaction rolls back.
+    """
+    if count <= 0:
+        return []
+    if hospital.slot_capacity < 1:
+        raise NoSlotAvailable(f"{hospital} is not taking appointments.")
+    earliest = earliest or timezone.now() + lead_time()
+    until = earliest + booking_horizon()
+    existing, full = set(), set()
+    for starts_at, capacity, booked in AppointmentSlot.objects.filter(
+        hospital=hospital, starts_at__gte=earliest, starts_at__lt=until,
+    ).values_list("starts_at", "capacity", "booked"):
+        existing.add(starts_at)
+        if booked >= capacity:
+            full.add(starts_at)
+    windows = []
+    for start in _slot_starts(earliest, until):
+        while start not in full and len(windows) < count:
+            if _claim(hospital, start, exists=start in existing):
+                windows.append((start, start + slot_length()))
+            else:
+                full.add(start)
+            existing.add(start)
+        if len(windows) == count:
+            return windows
+    raise NoSlotAvailable(f"{hospital} has no free appointment slot in the next {booking_horizon().days} days.")
+
+
+def allocate_slot(hospital, earliest=None) -> tuple[datetime, datetime]:
+    """Book one appointment at ``hospital`` in the earliest free slot"""
+    return allocate_slots(hospital, 1, earliest)[0]
+
+
+def release_slot(hospital_id, starts_at):
+    """Give back one place in a slot (no-op for windows not booked through a slot)"""
+    AppointmentSlot.objects.filter(
+        hospital_id=hospital_id, starts_at=starts_at, booked__gt=0,
+    ).update(booked=F("booked") - 1)
+
+
+def free_slots(hospital, start=None, end=None) -> list[dict]:
+    """Slots in [start, end) with at least one free place, from one query.
+
+    Defaults to the booking horizon.
+    """
+    start = start or timezone.now() + lead_time()
+    end = end or start + booking_horizon()
+    rows = {
+        starts_at: (capacity, booked)
+        for starts_at, capacity, booked in AppointmentSlot.objects.filter(
+            hospital=hospital, starts_at__gte=start, starts_at__lt=end,
+        ).values_list("starts_at", "capacity", "booked")
+    }
+    slots = []
+    for slot in _slot_starts(start, end):
+        capacity, booked = rows.get(slot, (hospital.slot_capacity, 0))
+        free = capacity - booked
+        if free > 0:
+            slots.append({"starts_at": slot, "ends_at": slot + slot_length(), "free": free})
+    return slots
+
+
+def apply_capacity(hospital):
+    """Carry a changed ``Hospital.slot_capacity`` over to its future slots"""
+    AppointmentSlot.objects.filter(
+        hospital=hospital, starts_at__gte=slot_start(timezone.now()),
+    ).update(capacity=hospital.slot_capacity)
+
+
+def _release_on_delete(sender, instance, **kwargs):
+    # pre_delete, so the match and request rows still exist for the lookup
+    hospital_id = (
+        DonationAppointment.objects.filter(pk=instance.pk)
+        .values_list("match__blood_request__hospital_id", flat=True).first()
+    )
+    if hospital_id:
+        release_slot(hospital_id, instance.window_start)
+
+
+pre_delete.connect(_release_on_delete, sender=DonationAppointment)
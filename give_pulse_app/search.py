@@ -0,0 +1,171 @@
+"""
+Denormalized full-text index behind the admin search boxes.
+
+The user, donor, blood request and match changelists used to search with
+``icontains`` across several joins, an unindexable ``LIKE '%x%'`` scan of
+every joined table. Instead each searchable row has one SearchEntry holding
+the lowercased words of its names, email, phone, hospital and notes, and a
+search reads only that table through the database's own full-text index:
+FULLTEXT on MySQL, a GIN ``tsvector`` index on PostgreSQL and an FTS5 table
+on SQLite (created by migration 0017). Every search word must match the
+start of a word in the entry.
+
+Entries are refreshed by post_save signals, including rows whose entry
+embeds the saved row (a renamed user reindexes their donor profile and
+matches, a renamed city its donors). Migration 0019 indexes the rows that
+existed before the index did. Bulk writes bypass signals, so run
+``rebuild_search_index`` after imports. Entries of deleted rows are left behind, which is harmless since
+results are joined back to the live table, and pruned by the rebuild.
+"""
+from __future__ import annotations
+import re
+
+from django.db.models import Lookup
+from django.db.models.signals import post_save
+
+from .models import BloodRequest, City, Donor, Hospital, Match, SearchEntry, User
+
+BATCH_SIZE = 1000
+# InnoDB leaves words shorter than innodb_ft_min_token_size (default 3) out
+# of FULLTEXT indexes, so shorter search words are matched with LIKE instead
+MIN_WORD = 3
+FTS_TABLE = "give_pulse_app_searchentry_fts"
+
+# Searchable models and the fields their entry is built from
+FIELDS = {
+    User: ["first_name", "last_name", "email", "phone"],
+    Donor: ["user__first_name", "user__last_name", "user__email", "user__phone", "city__name"],
+    BloodRequest: ["hospital__name", "created_by__user__first_name", "created_by__user__last_name", "notes"],
+    Match: [
+        "donor__user__first_name", "donor__user__last_name", "donor__user__email", "donor__user__phone",
+        "blood_request__hospital__name",
+    ],
+}
+
+# Saved model -> (fields that feed entries, [(searchable model, lookup of the saved row's pk)])
+DEPENDENTS = {
+    User: (
+        {"first_name", "last_name", "email", "phone"},
+        [(User, "pk"), (Donor, "user_id"), (Match, "donor__user_id"), (BloodRequest, "created_by__user_id")],
+    ),
+    Donor: ({"user", "city"}, [(Donor, "pk")]),
+    BloodRequest: ({"hospital", "created_by", "notes"}, [(BloodRequest, "pk")]),
+    # A match never changes donor or request, so it is indexed when created only
+    Match: (set(), [(Match, "pk")]),
+    Hospital: ({"name"}, [(BloodRequest, "hospital_id"), (Match, "blood_request__hospital_id")]),
+    City: ({"name"}, [(Donor, "city_id")]),
+}
+
+
+def words(value) -> list[str]:
+    """Lowercase words of ``value``, split the same way by every backend's tokenizer"""
+    return re.findall(r"[^\W_]+", str(value).lower())
+
+
+def document(fields, values) -> str:
+    """Entry text for one row"""
+    parts = []
+    for field, value in zip(fields, values):
+        if not value:
+            continue
+        parts += words(value)
+        if field.endswith("phone"):
+            # Also findable when typed without separators
+            parts.append(re.sub(r"\D", "", value))
+    return " ".join(parts)
+
+
+def kind(model) -> str:
+    return model._meta.model_name
+
+
+class Matches(Lookup):
+    """``text__matches=[word, ...]``: every word starts a word of the text"""
+    lookup_name = "matches"
+    prepare_rhs = False
+
+    def as_mysql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        query = " ".join(f"+{word}*" for word in self.rhs)
+        return f"MATCH ({lhs}) AGAINST (%s IN BOOLEAN MODE)", [*params, query]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        query = " & ".join(f"{word}:*" for word in self.rhs)
+        return f"to_tsvector('simple', {lhs}) @@ to_tsquery('simple', %s)", [*params, query]
+
+    def as_sqlite(self, compiler, connection):
+        table = compiler.quote_name_unless_alias(self.lhs.alias)
+        query = " ".join(f'"{word}"*' for word in self.rhs)
+        return f'{table}."id" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)', [query]
+
+    def as_sql(self, compiler, connection):
+        # Other databases: no full-text index, one LIKE per word
+        lhs, params = self.process_lhs(compiler, connection)
+        sql = " AND ".join([f"{lhs} LIKE %s"] * len(self.rhs))
+        return sql, [p for word in self.rhs for p in (*params, f"%{word}%")]
+
+
+SearchEntry._meta.get_field("text").register_lookup(Matches)
+
+
+def _save(entries):
+    SearchEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=["kind", "object_id"], update_fields=["text"],
+    )
+    return len(entries)
+
+
+def index(model, **filters) -> int:
+    """(Re)write the entries of the ``model`` rows matching ``filters``; returns entries written"""
+    fields = FIELDS[model]
+    rows = model.objects.filter(**filters).values_list("pk", *fields)
+    written, batch = 0, []
+    for pk, *values in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(SearchEntry(kind=kind(model), object_id=pk, text=document(fields, values)))
+        if len(batch) >= BATCH_SIZE:
+            written += _save(batch)
+            batch = []
+    return written + _save(batch) if batch else written
+
+
+def rebuild() -> int:
+    """Index every searchable row and drop entries of deleted rows; returns entries written"""
+    written = 0
+    for model in FIELDS:
+        written += index(model)
+        SearchEntry.objects.filter(kind=kind(model)).exclude(object_id__in=model.objects.values("pk")).delete()
+    return written
+
+
+def matching_ids(model, search_term):
+    """Subquery of the ``model`` primary keys whose entry matches every word of ``search_term``"""
+    terms = words(search_term)
+    entries = SearchEntry.objects.filter(kind=kind(model))
+    indexed = [term for term in terms if len(term) >= MIN_WORD]
+    if indexed:
+        entries = entries.filter(text__matches=indexed)
+    for term in terms:
+        if len(term) < MIN_WORD:
+            entries = entries.filter(text__contains=term)
+    return entries.values("object_id")
+
+
+def _reindex_on_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    watched, dependents = DEPENDENTS[sender]
+    if not created:
+        if not watched:
+            return
+        if update_fields is not None and not watched & {field.removesuffix("_id") for field in update_fields}:
+            return
+    for model, lookup in dependents:
+        # A new row has nothing depending on it yet
+        if created and model is not sender:
+            continue
+        index(model, **{lookup: instance.pk})
+
+
+for _sender in DEPENDENTS:
+    post_save.connect(_reindex_on_save, sender=_sender, dispatch_uid=f"search_index_{kind(_sender)}")
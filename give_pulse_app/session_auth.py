@@ -0,0 +1,64 @@
+from __future__ import annotations
+from django.db.models import F
+
+SESSION_USER_KEY = "user_id"
+SESSION_ROLE_KEY = "user_role"
+SESSION_VERSION_KEY = "session_version"
+
+_CACHE_ATTR = "_session_user_cache"
+
+
+def login_session(request, user):
+    """Store the auth payload in the session (works with any SESSION_ENGINE)"""
+    request.session[SESSION_USER_KEY] = user.id
+    request.session[SESSION_ROLE_KEY] = user.role
+    request.session[SESSION_VERSION_KEY] = user.session_version
+    setattr(request, _CACHE_ATTR, user)
+
+
+def logout_session(request):
+    """Revoke the user's sessions server side and clear this one"""
+    user_id = request.session.get(SESSION_USER_KEY)
+    if user_id:
+        revoke_user_sessions(user_id)
+    for k in (SESSION_USER_KEY, SESSION_ROLE_KEY, SESSION_VERSION_KEY):
+        request.session.pop(k, None)
+    request.session.flush()
+    setattr(request, _CACHE_ATTR, None)
+
+
+def revoke_user_sessions(user_id):
+    """Invalidate every session issued to this user.
+
+    Signed-cookie sessions cannot be deleted server side, so each session
+    carries the user's ``session_version`` and is rejected once it is bumped.
+    """
+    from .models import User
+    User.objects.filter(pk=user_id).update(session_version=F("session_version") + 1)
+
+
+def get_session_user(request):
+    """Return the logged-in User for this request, or None.
+
+    The lookup is done once per request; views and the context processor
+    share the result.
+    """
+    if hasattr(request, _CACHE_ATTR):
+        return getattr(request, _CACHE_ATTR)
+
+    user = None
+    user_id = request.session.get(SESSION_USER_KEY)
+    if user_id:
+        from .models import User
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            user = None
+        if user is None or request.session.get(SESSION_VERSION_KEY, 0) != user.session_version:
+            # Deleted user or revoked session
+            for k in (SESSION_USER_KEY, SESSION_ROLE_KEY, SESSION_VERSION_KEY):
+                request.session.pop(k, None)
+            user = None
+
+    setattr(request, _CACHE_ATTR, user)
+    return user
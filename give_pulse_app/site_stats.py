@@ -0,0 +1,62 @@
+"""
+Site-wide counters shown on the admin home page and the public index.
+
+Exact ``COUNT(*)`` over large InnoDB tables scans an index on every page
+view, so both pages read a stored snapshot from SiteCounter instead.
+``refresh_site_counters`` recomputes it on a schedule (one aggregate query
+per table); it is only computed inline when no snapshot exists yet or an
+admin asks for a refresh.
+"""
+from __future__ import annotations
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import BloodRequest, Donation, Donor, Hospital, SiteCounter, Staff
+
+COUNTERS = (
+    "total_hospitals", "verified_hospitals", "total_staff", "verified_staff",
+    "total_donors", "total_requests", "total_donations",
+)
+
+
+def _verified(model):
+    return model.objects.aggregate(total=Count("pk"), verified=Count("pk", filter=Q(is_verified=True)))
+
+
+def compute() -> dict:
+    """Live values of every counter"""
+    hospitals, staff = _verified(Hospital), _verified(Staff)
+    return {
+        "total_hospitals": hospitals["total"],
+        "verified_hospitals": hospitals["verified"],
+        "total_staff": staff["total"],
+        "verified_staff": staff["verified"],
+        "total_donors": Donor.objects.count(),
+        "total_requests": BloodRequest.objects.count(),
+        "total_donations": Donation.objects.count(),
+    }
+
+
+def refresh():
+    """Recompute and store every counter; returns (counters, refreshed_at)"""
+    counters, now = compute(), timezone.now()
+    SiteCounter.objects.bulk_create(
+        [SiteCounter(name=name, value=value, refreshed_at=now) for name, value in counters.items()],
+        update_conflicts=True, unique_fields=["name"], update_fields=["value", "refreshed_at"],
+    )
+    return counters, now
+
+
+def snapshot():
+    """Stored counters and when they were refreshed, from one query.
+
+    Refreshes first if a counter has never been stored.
+    """
+    rows = SiteCounter.objects.filter(name__in=COUNTERS).values_list("name", "value", "refreshed_at")
+    counters = {name: (value, refreshed_at) for name, value, refreshed_at in rows}
+    if len(counters) < len(COUNTERS):
+        return refresh()
+    return (
+        {name: value for name, (value, _) in counters.items()},
+        min(refreshed_at for _, refreshed_at in counters.values()),
+    )
@@ -0,0 +1,22 @@
+document.addEventListener("DOMContentLoaded", function () {
+  const data = JSON.parse(document.getElementById("hospital-trend-data").textContent);
+  const ctx = document.getElementById("hospitalTrendChart").getContext("2d");
+
+  new Chart(ctx, {
+    type: "line",
+    data: {
+      labels: data.labels,
+      datasets: [
+        { label: "Units requested", data: data.units_requested, borderColor: "#ED3744", backgroundColor: "#ED374433", tension: 0.3 },
+        { label: "Units fulfilled", data: data.units_fulfilled, borderColor: "#A5B68E", backgroundColor: "#A5B68E33", tension: 0.3 },
+        { label: "Matches", data: data.matches_created, borderColor: "#212121", borderDash: [4, 4], tension: 0.3 }
+      ]
+    },
+    options: {
+      responsive: true,
+      maintainAspectRatio: false,
+      interaction: { mode: "index", intersect: false },
+      scales: { y: { beginAtZero: true, ticks: { precision: 0 } } }
+    }
+  });
+});
@@ -77,24 +77,32 @@ document.addEventListener('DOMContentLoaded', function() {
     }, 200);
   }
 
+  // Fill the form with the scanned data
+  function acceptQRCode(data) {
+    stopCamera();
+    const input = document.getElementById('qr_data');
+    input.value = data;
+    document.getElementById('manualInput').classList.add('show');
+    input.scrollIntoView({ behavior: 'smooth', block: 'center' });
+
+    scanStatus.innerHTML = `
+      <small class="text-success">
+        <i class="bi bi-check-circle"></i>
+        Valid QR detected — ready to verify.
+      </small>`;
+    scanStatus.className = 'mt-1 success';
+  }
+
   // Process detected QR
   function handleQRCode(data) {
-    if (data.startsWith('{') && data.includes('appointment_id')) {
+    // Compact signed token: "GP" + base32 (signature is checked server side)
+    if (/^GP[A-Z2-7]{16,}$/.test(data)) {
+      acceptQRCode(data);
+    } else if (data.startsWith('{') && data.includes('appointment_id')) {
       try {
         const parsed = JSON.parse(data);
         if (parsed.appointment_id) {
-          stopCamera();
-          const input = document.getElementById('qr_data');
-          input.value = data;
-          document.getElementById('manualInput').classList.add('show');
-          input.scrollIntoView({ behavior: 'smooth', block: 'center' });
-
-          scanStatus.innerHTML = `
-            <small class="text-success">
-              <i class="bi bi-check-circle"></i>
-              Valid QR detected — ready to verify.
-            </small>`;
-          scanStatus.className = 'mt-1 success';
+          acceptQRCode(data);
         }
       } catch {
         invalidQR('Invalid JSON format in QR code');
@@ -0,0 +1,235 @@
+from __future__ import annotations
+import random
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import search
+from .managers import _hash_password_if_needed
+from .qr_tokens import EXPIRY_GRACE, make_appointment_token
+from .models import (
+    Governorate, City, Hospital, User, Staff, Donor, BloodRequest,
+    Match, DonationAppointment, Donation, Role, MatchStatus, RequestStatus,
+)
+
+# Every synthetic user can log in with this password.
+SYNTHETIC_PASSWORD = "Synth#Pass1"
+
+# Approximate population distribution of ABO/Rh blood types (percent).
+BLOOD_TYPE_WEIGHTS = {
+    ("O", "+"): 38, ("A", "+"): 34, ("B", "+"): 9, ("AB", "+"): 3,
+    ("O", "-"): 7, ("A", "-"): 6, ("B", "-"): 2, ("AB", "-"): 1,
+}
+
+MATCH_STATUS_WEIGHTS = {
+    MatchStatus.PENDING: 45,
+    MatchStatus.ACCEPTED: 20,
+    MatchStatus.DECLINED: 10,
+    MatchStatus.DONATED: 25,
+}
+
+SCALES = {
+    "tiny": dict(governorates=1, cities_per_governorate=2, hospitals_per_city=1,
+                 staff_per_hospital=2, donors=40, requests=10, matches_per_request=4),
+    "small": dict(governorates=2, cities_per_governorate=3, hospitals_per_city=2,
+                  staff_per_hospital=3, donors=1_000, requests=200, matches_per_request=8),
+    "medium": dict(governorates=5, cities_per_governorate=5, hospitals_per_city=3,
+                   staff_per_hospital=5, donors=20_000, requests=3_000, matches_per_request=15),
+    "large": dict(governorates=5, cities_per_governorate=10, hospitals_per_city=4,
+                  staff_per_hospital=10, donors=200_000, requests=30_000, matches_per_request=25),
+}
+
+FIRST_NAMES = ["Ahmed", "Fatima", "Omar", "Layla", "Yousef", "Mariam", "Khaled", "Noor",
+               "Sami", "Huda", "Rami", "Aya", "Tariq", "Dina", "Basel", "Rana"]
+LAST_NAMES = ["Haddad", "Khalil", "Nasser", "Saleh", "Awad", "Mansour", "Hamdan", "Odeh",
+              "Qasem", "Barakat", "Shaath", "Zaqout", "Abed", "Hijazi", "Darwish", "Farah"]
+
+BATCH_SIZE = 1000
+
+
+def _bulk_create(model, objs):
+    """bulk_create that leaves primary keys set on every backend.
+
+    MySQL cannot return ids from a multi-row INSERT, so ids are assigned
+    up front there; backends that can return rows keep their sequences.
+    """
+    if not objs:
+        return objs
+    if not connection.features.can_return_rows_from_bulk_insert:
+        start = (model.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        for offset, obj in enumerate(objs):
+            obj.pk = start + offset
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return objs
+
+
+def _compatible_donor_types(abo, rh):
+    """Blood types that can donate to a recipient of ``abo``/``rh``"""
+    abo_ok = {"O": {"O"}, "A": {"O", "A"}, "B": {"O", "B"}, "AB": {"O", "A", "B", "AB"}}[abo]
+    rh_ok = {"-"} if rh == "-" else {"+", "-"}
+    # Sorted so that a given seed always yields the same dataset.
+    return sorted((a, r) for a in abo_ok for r in rh_ok)
+
+
+@transaction.atomic
+def generate(*, prefix="synth", seed=0, governorates, cities_per_governorate, hospitals_per_city,
+             staff_per_hospital, donors, requests, matches_per_request, verified_ratio=0.9):
+    """Create a realistic synthetic dataset with bulk_create and return row counts.
+
+    ``prefix`` namespaces names and emails so several datasets can coexist.
+    The same ``seed`` always produces the same dataset.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = _hash_password_if_needed(SYNTHETIC_PASSWORD)
+    blood_types, blood_weights = zip(*BLOOD_TYPE_WEIGHTS.items())
+    statuses, status_weights = zip(*MATCH_STATUS_WEIGHTS.items())
+
+    def person(n, role):
+        return User(
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            email=f"{prefix}-{role}-{n}@example.invalid",
+            phone=f"+9705{rng.randrange(10**7, 10**8)}",
+            password=password,
+            role=role,
+        )
+
+    govs = _bulk_create(Governorate, [
+        Governorate(name=f"{prefix} Governorate {g}") for g in range(governorates)
+    ])
+    cities = _bulk_create(City, [
+        City(name=f"{prefix} City {g}-{c}", governorate=gov)
+        for g, gov in enumerate(govs) for c in range(cities_per_governorate)
+    ])
+    hospitals = _bulk_create(Hospital, [
+        Hospital(name=f"{prefix} Hospital {c}-{h}", city=city, is_verified=rng.random() < verified_ratio)
+        for c, city in enumerate(cities) for h in range(hospitals_per_city)
+    ])
+    if hospitals:
+        # Keep at least one verified hospital so staff views have data.
+        hospitals[0].is_verified = True
+        Hospital.objects.filter(pk=hospitals[0].pk).update(is_verified=True)
+
+    staff_users = _bulk_create(User, [
+        person(n, Role.STAFF) for n in range(len(hospitals) * staff_per_hospital)
+    ])
+    staff = _bulk_create(Staff, [
+        Staff(user=u, hospital=hospitals[n // staff_per_hospital],
+              is_verified=n % staff_per_hospital == 0 or rng.random() < verified_ratio)
+        for n, u in enumerate(staff_users)
+    ])
+
+    donor_users = _bulk_create(User, [person(n, Role.DONOR) for n in range(donors)])
+    donor_rows = []
+    for u in donor_users:
+        abo, rh = rng.choices(blood_types, blood_weights)[0]
+        donor_rows.append(Donor(
+            user=u, abo=abo, rh=rh, city=rng.choice(cities),
+            eligibility_consent=True,
+            public_alias=f"{u.first_name[0]}. {u.last_name}",
+        ))
+    donor_rows = _bulk_create(Donor, donor_rows)
+    donors_by_type_city = {}
+    for d in donor_rows:
+        donors_by_type_city.setdefault((d.city_id, d.abo, d.rh), []).append(d)
+
+    staff_by_hospital = {}
+    for s in staff:
+        if s.is_verified:
+            staff_by_hospital.setdefault(s.hospital_id, []).append(s)
+    request_hospitals = [h for h in hospitals if h.id in staff_by_hospital]
+
+    request_rows = []
+    for _ in range(requests if request_hospitals else 0):
+        hospital = rng.choice(request_hospitals)
+        abo, rh = rng.choices(blood_types, blood_weights)[0]
+        request_rows.append(BloodRequest(
+            hospital=hospital,
+            created_by=rng.choice(staff_by_hospital[hospital.id]),
+            units_requested=rng.randint(1, 6),
+            abo=abo, rh=rh,
+            city_id=hospital.city_id,
+            deadline_at=now + timedelta(days=rng.randint(-10, 30)),
+            notes=rng.choice(["", "Urgent surgery", "Trauma case", "Scheduled transfusion"]),
+        ))
+    request_rows = _bulk_create(BloodRequest, request_rows)
+
+    match_rows = []
+    for br in request_rows:
+        pool = []
+        for abo, rh in _compatible_donor_types(br.abo, br.rh):
+            pool.extend(donors_by_type_city.get((br.city_id, abo, rh), ()))
+        for donor in rng.sample(pool, min(len(pool), matches_per_request)):
+            status = rng.choices(statuses, status_weights)[0]
+            created = now - timedelta(hours=rng.randint(1, 24 * 60))
+            match_rows.append(Match(
+                blood_request=br, donor=donor, status=status,
+                notified_at=created,
+                accepted_at=created + timedelta(hours=1) if status in (MatchStatus.ACCEPTED, MatchStatus.DONATED) else None,
+                declined_at=created + timedelta(hours=1) if status == MatchStatus.DECLINED else None,
+                donated_at=created + timedelta(days=1) if status == MatchStatus.DONATED else None,
+            ))
+    match_rows = _bulk_create(Match, match_rows)
+
+    booked = [m for m in match_rows if m.status in (MatchStatus.ACCEPTED, MatchStatus.DONATED)]
+    appointments = []
+    for m in booked:
+        start = m.accepted_at + timedelta(hours=24)
+        appointments.append(DonationAppointment(match=m, window_start=start, window_end=start + timedelta(hours=2)))
+    appointments = _bulk_create(DonationAppointment, appointments)
+    for a in appointments:
+        a.qr_code_data = make_appointment_token(a.pk, a.match.pk, a.window_end + EXPIRY_GRACE)
+    DonationAppointment.objects.bulk_update(appointments, ["qr_code_data"], batch_size=BATCH_SIZE)
+
+    donated = [m for m in match_rows if m.status == MatchStatus.DONATED]
+    donations = _bulk_create(Donation, [
+        Donation(match=m, confirmed_by=rng.choice(staff_by_hospital[m.blood_request.hospital_id]),
+                 units=1, certificate_serial=f"GP-SYN-{prefix}-{m.pk:08d}")
+        for m in donated
+    ])
+
+    donor_stats = {}
+    for m in donated:
+        count, last = donor_stats.get(m.donor_id, (0, None))
+        day = timezone.localdate(m.donated_at)
+        donor_stats[m.donor_id] = (count + 1, max(last, day) if last else day)
+    donor_updates = [
+        Donor(pk=donor_id, donation_count=count, last_donation=last)
+        for donor_id, (count, last) in donor_stats.items()
+    ]
+    Donor.objects.bulk_update(donor_updates, ["donation_count", "last_donation"], batch_size=BATCH_SIZE)
+
+    fulfilled = {}
+    for m in donated:
+        fulfilled[m.blood_request_id] = fulfilled.get(m.blood_request_id, 0) + 1
+    touched = []
+    for br in request_rows:
+        br.units_fulfilled = fulfilled.get(br.id, 0)
+        if br.units_fulfilled >= br.units_requested:
+            br.status = RequestStatus.FULFILLED
+        elif br.units_fulfilled:
+            br.status = RequestStatus.PARTIAL
+        elif br.deadline_at < now:
+            br.status = RequestStatus.EXPIRED
+        else:
+            continue
+        touched.append(br)
+    BloodRequest.objects.bulk_update(touched, ["units_fulfilled", "status"], batch_size=BATCH_SIZE)
+
+    # bulk_create skips the signals that maintain the admin search index
+    search.rebuild()
+
+    return {
+        "governorates": len(govs),
+        "cities": len(cities),
+        "hospitals": len(hospitals),
+        "staff": len(staff),
+        "donors": len(donor_rows),
+        "requests": len(request_rows),
+        "matches": len(match_rows),
+        "appointments": len(appointments),
+        "donations": len(donations),
+    }
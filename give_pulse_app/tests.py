@@ -1,3 +1,1261 @@
-from django.test import TestCase
+import atexit
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from importlib import import_module
+from smtplib import SMTPException
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from PIL import Image
+
+from . import db, mail_queue, qr_tokens, rollups, scheduling, search, site_stats, synthetic, uploads, verification
+from . import urls as app_urls
+from .management.commands import gc_media
+from .pagination import EstimatedCountPaginator, estimated_rows
+from .media_storage import LocalMediaStorage, S3MediaStorage, media_storage
+from .metrics import LATENCY_BUCKETS_MS, bucket_index, bucket_percentile, load_metrics, store
+from .middleware import QueryMetricsMiddleware
+from .qr_tokens import make_appointment_token
+from .query_budgets import QUERY_BUDGETS_FILE, UPDATE_BUDGETS_ENV
+from .models import (
+    AppointmentSlot, BloodRequest, DailyHospitalStats, Donation, DonationAppointment, Donor, EmailStatus, Hospital, Match,
+    OutboundEmail, SearchEntry, SiteCounter, Staff, User,
+)
+
+ROLES = ("guest", "donor", "staff", "admin")
+
+# Fixed dataset every budget is measured against. Changing it means
+# re-recording the budgets (manage.py update_query_budgets).
+BUDGET_DATASET = dict(
+    prefix="budget", seed=1, governorates=1, cities_per_governorate=2, hospitals_per_city=2,
+    staff_per_hospital=2, donors=60, requests=12, matches_per_request=6, verified_ratio=1.0,
+)
+
+
+class QueryBudgetTests(TestCase):
+    """Visit every named URL in give_pulse_app.urls as each role and compare
+    the number of queries against query_budgets.json.
+
+    Views are fetched with GET, except POST-only views, which get the body
+    from ``post_data``. Views accepting both are only measured for GET.
+
+    A view that needs more queries than its budget fails the build. Run
+    ``manage.py update_query_budgets`` after an intentional change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**BUDGET_DATASET)
+        # Counters are kept fresh by the scheduled refresh_site_counters
+        site_stats.refresh()
+
+        busiest = (
+            BloodRequest.objects.annotate(n=Count("matches")).order_by("-n", "pk").first()
+        )
+        cls.staff = (
+            Staff.objects.filter(hospital_id=busiest.hospital_id, is_verified=True)
+            .order_by("pk").first()
+        )
+        cls.blood_request = busiest
+        cls.donor = (
+            Donor.objects.annotate(n=Count("matches")).order_by("-n", "pk").first()
+        )
+        cls.admin = User.objects.create(
+            first_name="Budget", last_name="Admin", email="budget-admin@example.invalid",
+            password=synthetic._hash_password_if_needed(synthetic.SYNTHETIC_PASSWORD), role="admin",
+        )
+        hospital_matches = Match.objects.filter(blood_request__hospital_id=busiest.hospital_id)
+        cls.pending_match = hospital_matches.filter(status="pending").order_by("pk").first()
+        cls.appointment = (
+            DonationAppointment.objects.filter(
+                match__blood_request__hospital_id=busiest.hospital_id,
+                match__status="accepted",
+                match__donation__isnull=True,
+            ).order_by("pk").first()
+        )
+        cls.donation = Donation.objects.filter(match__donor=cls.donor).order_by("pk").first() or \
+            Donation.objects.order_by("pk").first()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def url_for(self, pattern: URLPattern) -> str:
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            kwargs[name] = {
+                "request_id": self.blood_request.pk,
+                "match_id": self.pending_match.pk,
+                "appointment_id": self.appointment.pk,
+                "donation_id": self.donation.pk,
+                "serial": self.donation.certificate_serial,
+            }[name]
+        url = reverse(pattern.name, kwargs=kwargs)
+        if pattern.name == "api_hospitals_by_city":
+            url += f"?city_id={self.blood_request.city_id}"
+        return url
+
+    def login_as(self, role: str):
+        self.client.cookies.clear()
+        user = {
+            "guest": None,
+            "donor": self.donor.user,
+            "staff": self.staff.user,
+            "admin": self.admin,
+        }[role]
+        if user is not None:
+            self.client.post(reverse("login"), {"email": user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+
+    def post_data(self, name: str):
+        """Body for views that only accept POST (None: measure a GET)"""
+        if name == "bulk_match_action":
+            return {"data": {"action": "accept", "match_ids": [self.pending_match.pk]}}
+        if name == "api_verify":
+            return {
+                "data": json.dumps({"kind": "certificate", "codes": [self.donation.certificate_serial]}),
+                "content_type": "application/json",
+            }
+        return None
+
+    def measure(self) -> dict:
+        """Return {"<url name>:<role>": query count} for every URL and role"""
+        counts = {}
+        patterns = [p for p in app_urls.urlpatterns if isinstance(p, URLPattern) and p.name]
+        for role in ROLES:
+            self.login_as(role)
+            for pattern in patterns:
+                url = self.url_for(pattern)
+                cache.clear()
+                # Each visit runs in its own savepoint so state-changing
+                # views (accept_match, complete_donation) don't leak.
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as ctx:
+                        post = self.post_data(pattern.name)
+                        response = self.client.post(url, **post) if post else self.client.get(url)
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 500, f"{pattern.name} as {role} returned {response.status_code}")
+                counts[f"{pattern.name}:{role}"] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_budgets(self):
+        counts = self.measure()
+
+        if os.environ.get(UPDATE_BUDGETS_ENV):
+            QUERY_BUDGETS_FILE.write_text(json.dumps(counts, indent=2, sort_keys=True) + "\n")
+            return
+
+        budgets = json.loads(QUERY_BUDGETS_FILE.read_text()) if QUERY_BUDGETS_FILE.exists() else {}
+        missing = sorted(set(counts) - set(budgets))
+        over = {
+            key: (count, budgets[key])
+            for key, count in sorted(counts.items())
+            if key in budgets and count > budgets[key]
+        }
+        problems = []
+        if missing:
+            problems.append("No query budget recorded for: " + ", ".join(missing))
+        for key, (count, budget) in over.items():
+            problems.append(f"{key}: {count} queries (budget {budget})")
+        if problems:
+            self.fail(
+                "Query budget exceeded. Fix the regression or run "
+                "`python manage.py update_query_budgets` if the change is intended.\n"
+                + "\n".join(problems)
+            )
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+class SessionRevocationTests(TestCase):
+    """Logout revokes sessions that cannot be deleted server side."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            first_name="Session", last_name="Holder", email="session-holder@example.invalid",
+            password=synthetic._hash_password_if_needed(synthetic.SYNTHETIC_PASSWORD), role="donor",
+        )
+
+    def login(self):
+        self.client.post(reverse("login"), {"email": self.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        return self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def test_cookie_captured_before_logout_is_rejected(self):
+        captured = self.login()
+        self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+
+        self.client.post(reverse("logout"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = captured
+        response = self.client.get(reverse("dashboard"))
+        self.assertRedirects(response, reverse("login"), fetch_redirect_response=False)
+
+    def test_revocation_applies_to_every_session_of_the_user(self):
+        other = self.login()
+        self.client.cookies.clear()
+        self.login()
+        self.client.post(reverse("logout"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = other
+        self.assertEqual(self.client.get(reverse("dashboard")).status_code, 302)
+
+
+class VerifyEntitiesCommandTests(TestCase):
+    """verify_entities honours --dry-run, --governorate-id and --batch-size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for prefix in ("entities-a", "entities-b"):
+            synthetic.generate(**dict(BUDGET_DATASET, prefix=prefix, staff_per_hospital=3))
+        cls.governorate_id = Hospital.objects.order_by("pk").values_list("city__governorate_id", flat=True).first()
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command("verify_entities", *args, "--force", stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_without_writing(self):
+        out = self.run_command("--action", "unverify", "--type", "all", "--dry-run")
+        self.assertIn(f"would unverify {Hospital.objects.count()} hospitals", out)
+        self.assertIn(f"would unverify {Staff.objects.count()} staff members", out)
+        self.assertFalse(Hospital.objects.filter(is_verified=False).exists())
+        self.assertFalse(Staff.objects.filter(is_verified=False).exists())
+
+    def test_governorate_filter_across_batch_boundaries(self):
+        in_governorate = Staff.objects.filter(hospital__city__governorate_id=self.governorate_id)
+        total = in_governorate.count()
+        self.assertGreater(total % 5, 0)  # last batch is partial
+
+        out = self.run_command(
+            "--action", "unverify", "--type", "staff", "--governorate-id", str(self.governorate_id),
+            "--batch-size", "5", "--summary",
+        )
+        self.assertIn(f"Successfully unverified {total} staff members", out)
+        self.assertEqual(set(Staff.objects.filter(is_verified=False)), set(in_governorate))
+
+        # Already in the target state: nothing left to update
+        out = self.run_command(
+            "--action", "unverify", "--type", "staff", "--governorate-id", str(self.governorate_id),
+            "--batch-size", "5", "--summary",
+        )
+        self.assertIn("Successfully unverified 0 staff members", out)
+
+
+class QueryMetricsTests(TestCase):
+    """Sampled requests are recorded, flushed to JSONL and summarised by view_metrics."""
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp(prefix="givepulse-metrics-")
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.path = os.path.join(tmp, "view_metrics.jsonl")
+        # Drop whatever earlier tests recorded
+        store.flush(self.path)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_sampled_requests_are_flushed_and_summarised(self):
+        with override_settings(VIEW_METRICS_SAMPLE_RATE=1.0, VIEW_METRICS_FLUSH_SECONDS=0, VIEW_METRICS_FILE=self.path):
+            self.client.get(reverse("about"))
+            self.client.get(reverse("about"))
+        stats = load_metrics(self.path)["about"]
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(sum(stats.buckets), 2)
+
+        out = io.StringIO()
+        call_command("view_metrics", "--file", self.path, stdout=out)
+        self.assertIn("Top views by p95 latency", out.getvalue())
+        self.assertIn("about", out.getvalue())
+
+    def test_unsampled_requests_are_not_recorded(self):
+        with override_settings(VIEW_METRICS_SAMPLE_RATE=0.0, VIEW_METRICS_FLUSH_SECONDS=3600):
+            self.client.get(reverse("about"))
+        self.assertNotIn("about", store.snapshot())
+
+    def test_exit_flush_registered_once(self):
+        QueryMetricsMiddleware(lambda request: None)
+        registered = atexit._ncallbacks()
+        QueryMetricsMiddleware(lambda request: None)
+        QueryMetricsMiddleware(lambda request: None)
+        self.assertEqual(atexit._ncallbacks(), registered)
+
+    def test_bucket_percentile(self):
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        buckets[bucket_index(3)] = 90  # <= 5 ms
+        buckets[bucket_index(150)] = 10  # <= 200 ms
+        self.assertEqual(bucket_percentile(buckets, 50), 5.0)
+        self.assertEqual(bucket_percentile(buckets, 95), 200.0)
+
+
+class QRTokenTests(TestCase):
+    """Signed appointment tokens reject any tampering, expiry or foreign key."""
+
+    expires_at = timezone.now().replace(microsecond=0) + timedelta(days=2)
+
+    def raw(self, token):
+        body = token[len(qr_tokens.TOKEN_PREFIX):]
+        return bytearray(base64.b32decode(body + "=" * (-len(body) % 8)))
+
+    def encode(self, raw):
+        return qr_tokens.TOKEN_PREFIX + base64.b32encode(bytes(raw)).decode("ascii").rstrip("=")
+
+    def assertRejected(self, token, message):
+        with self.assertRaisesMessage(qr_tokens.InvalidQRToken, message):
+            qr_tokens.read_appointment_token(token)
+
+    def test_round_trip(self):
+        token = make_appointment_token(12345, 678, self.expires_at)
+        read = qr_tokens.read_appointment_token(token.lower())
+        self.assertEqual((read.appointment_id, read.match_id, read.expires_at), (12345, 678, self.expires_at))
+
+    def test_tampered_payload_or_signature_byte(self):
+        raw = self.raw(make_appointment_token(12345, 678, self.expires_at))
+        for index in (1, len(raw) - qr_tokens.SIGNATURE_BYTES - 1, len(raw) - 1):
+            tampered = bytearray(raw)
+            tampered[index] ^= 0x01
+            self.assertRejected(self.encode(tampered), "signature is invalid")
+
+    def test_expired(self):
+        token = make_appointment_token(1, 2, self.expires_at)
+        with self.assertRaisesMessage(qr_tokens.InvalidQRToken, "expired"):
+            qr_tokens.read_appointment_token(token, now=self.expires_at + timedelta(seconds=1))
+
+    def test_other_secret_or_salt(self):
+        with override_settings(SECRET_KEY="another-secret-key-for-this-test"):
+            token = make_appointment_token(1, 2, self.expires_at)
+        self.assertRejected(token, "signature is invalid")
+
+        raw = self.raw(make_appointment_token(1, 2, self.expires_at))
+        payload = bytes(raw[:-qr_tokens.SIGNATURE_BYTES])
+        foreign = salted_hmac("another.salt", payload, algorithm="sha256").digest()[:qr_tokens.SIGNATURE_BYTES]
+        self.assertRejected(self.encode(payload + foreign), "signature is invalid")
+
+    def test_malformed(self):
+        self.assertRejected("GP", "Malformed")
+        self.assertRejected("GP!!!!", "Malformed")
+        self.assertRejected("XX" + make_appointment_token(1, 2, self.expires_at)[2:], "Not a GivePulse")
+
+    def test_legacy_json_shapes(self):
+        parse = verification.parse_appointment_code
+        # The only accepted legacy shape: an object with all three keys and numeric
+        # (or numeric string) appointment and match ids; donor_id is not checked
+        self.assertEqual(parse('{"appointment_id": 5, "match_id": 7, "donor_id": 9}'), (5, 7))
+        self.assertEqual(parse('{"appointment_id": "5", "match_id": "7", "donor_id": "x"}'), (5, 7))
+        for code, message in [
+            ('{"appointment_id": 5, "match_id": 7}', "Missing required fields: donor_id"),
+            ('{"appointment_id": "a", "match_id": 7, "donor_id": 9}', "must be numbers"),
+            ('[5, 7, 9]', "Invalid QR code format"),
+            ('{"appointment_id": 5,', "Invalid JSON"),
+            ("5:7:9", "Invalid QR code format"),
+        ]:
+            with self.assertRaisesMessage(qr_tokens.InvalidQRToken, message):
+                parse(code)
+
+
+class VerificationServiceTests(TestCase):
+    """Scanner lookups resolve each batch with at most one query and serve
+    repeat scans from the cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="verify"))
+        cls.appointments = list(DonationAppointment.objects.order_by("pk")[:5])
+        cls.donations = list(Donation.objects.order_by("pk")[:5])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_appointment_batch_uses_one_query_then_cache(self):
+        # Synthetic windows are mostly in the past, so sign fresh tokens.
+        expires = timezone.now() + timedelta(days=1)
+        codes = [make_appointment_token(a.pk, a.match_id, expires) for a in self.appointments] + ["not a code"]
+        with self.assertNumQueries(1):
+            results = verification.verify_appointment_codes(codes)
+        self.assertEqual([r["valid"] for r in results], [True] * len(self.appointments) + [False])
+        self.assertEqual(results[0]["appointment_id"], self.appointments[0].pk)
+        with self.assertNumQueries(0):
+            verification.verify_appointment_codes(codes)
+
+    def test_certificate_accepts_serial_url_and_json(self):
+        donation = self.donations[0]
+        codes = [
+            donation.certificate_serial,
+            f"https://givepulse.com/verify/{donation.certificate_serial}",
+            json.dumps({"certificate_serial": donation.certificate_serial, "donation_id": donation.pk}),
+            json.dumps({"certificate_serial": donation.certificate_serial, "donation_id": donation.pk + 10_000}),
+        ]
+        with self.assertNumQueries(1):
+            results = verification.verify_certificate_codes(codes)
+        self.assertEqual([r["valid"] for r in results], [True, True, True, False])
+
+    def api(self, payload, **headers):
+        return self.client.post(reverse("api_verify"), json.dumps(payload), content_type="application/json", **headers)
+
+    @override_settings(SCANNER_API_KEYS=["scanner-test-key"])
+    def test_api_batch(self):
+        codes = [d.certificate_serial for d in self.donations] + ["GP-MISSING"]
+        response = self.api({"kind": "certificate", "codes": codes}, HTTP_X_SCANNER_KEY="scanner-test-key")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), len(codes))
+        self.assertFalse(results[-1]["valid"])
+        # Certificates only expose the donor's public alias
+        self.assertEqual(results[0]["donor_alias"], self.donations[0].match.donor.public_alias)
+        self.assertNotIn("donor_name", results[0])
+        self.assertNotIn("donor_id", results[0])
+
+        response = self.api(
+            {"kind": "appointment", "codes": ["x"] * (verification.MAX_BATCH_SIZE + 1)},
+            HTTP_X_SCANNER_KEY="scanner-test-key",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SCANNER_API_KEYS=["scanner-test-key"])
+    def test_api_rejects_anonymous_callers_and_legacy_payloads(self):
+        payload = {"kind": "certificate", "code": self.donations[0].certificate_serial}
+        self.assertEqual(self.api(payload).status_code, 403)
+        self.assertEqual(self.api(payload, HTTP_X_SCANNER_KEY="wrong-key").status_code, 403)
+        donor = Donor.objects.select_related("user").first()
+        self.client.post(reverse("login"), {"email": donor.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        self.assertEqual(self.api(payload).status_code, 403)
+
+        appointment = self.appointments[0]
+        legacy = json.dumps({"appointment_id": appointment.pk, "match_id": appointment.match_id, "donor_id": 1})
+        response = self.api({"kind": "appointment", "code": legacy}, HTTP_X_SCANNER_KEY="scanner-test-key")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["result"]["valid"])
+        self.assertIn("Only signed", response.json()["result"]["error"])
+
+    def test_api_accepts_verified_staff_session(self):
+        staff = Staff.objects.filter(is_verified=True).select_related("user").first()
+        self.client.post(reverse("login"), {"email": staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        response = self.api({"kind": "certificate", "code": self.donations[0].certificate_serial})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["result"]["valid"])
+
+    def test_public_serial_page_is_cached_with_etag(self):
+        donation = self.donations[0]
+        url = reverse("verify_certificate_serial", args=[donation.certificate_serial])
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_public_serial_page_is_the_same_for_every_visitor(self):
+        url = reverse("verify_certificate_serial", args=[self.donations[0].certificate_serial])
+        anonymous = self.client.get(url)
+        staff = Staff.objects.select_related("user").first()
+        self.client.post(reverse("login"), {"email": staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        response = self.client.get(url)
+        self.assertEqual(response["ETag"], anonymous["ETag"])
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+        self.assertNotContains(response, "Logout")
+        self.assertNotContains(response, "alert-dismissible")
+        # Flash messages are left for the user's next page
+        self.assertTrue(list(self.client.get(reverse("dashboard")).context["messages"]))
+
+    def test_public_serial_miss_is_cached(self):
+        url = reverse("verify_certificate_serial", args=["GP-00000000-BOGUS"])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(PROTECTED_MEDIA_SERVER="nginx")
+class ProtectedMediaTests(TestCase):
+    """Certificates are authorized in one query and handed to nginx."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="media"))
+        cls.donation = Donation.objects.select_related("match__donor__user").order_by("pk").first()
+        Donation.objects.filter(pk=cls.donation.pk).update(certificate_file="certificates/example.pdf")
+        cls.other_donor = Donor.objects.exclude(pk=cls.donation.match.donor_id).order_by("pk").first()
+
+    def login(self, user):
+        self.client.post(reverse("login"), {"email": user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+
+    def test_owner_gets_x_accel_redirect(self):
+        self.login(self.donation.match.donor.user)
+        url = reverse("download_certificate", args=[self.donation.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/certificates/example.pdf")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertEqual(response.content, b"")
+
+    def test_other_donor_is_refused(self):
+        self.login(self.other_donor.user)
+        response = self.client.get(reverse("download_certificate", args=[self.donation.pk]))
+        self.assertRedirects(response, reverse("index"), fetch_redirect_response=False)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+
+class AvatarPipelineTests(TestCase):
+    """Uploaded avatars are stored as small WebP variants without metadata."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="avatar", donors=2, requests=0))
+        self.donor = Donor.objects.order_by("pk").first()
+
+    def upload(self, size=(1600, 1200), color="red"):
+        buf = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = "TestCam"
+        Image.new("RGB", size, color).save(buf, format="JPEG", exif=exif)
+        return SimpleUploadedFile("me.jpg", buf.getvalue(), content_type="image/jpeg")
+
+    def test_variants_are_resized_webp_without_exif(self):
+        self.donor.set_profile_picture(self.upload())
+        self.donor.refresh_from_db()
+        name = self.donor.profile_picture.name
+        self.assertTrue(name.endswith("_display.webp"))
+
+        for variant, (edge, _) in uploads.AVATAR_VARIANTS.items():
+            with media_storage.open(uploads.avatar_variant_name(name, variant)) as fh:
+                img = Image.open(fh)
+                self.assertEqual((img.format, img.size), ("WEBP", (edge, edge)))
+                self.assertNotIn("exif", img.info)
+        self.assertIn("_thumb.webp", self.donor.profile_thumbnail_url)
+
+    def test_replacing_avatar_deletes_old_variants(self):
+        self.donor.set_profile_picture(self.upload())
+        old = self.donor.profile_picture.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.donor.set_profile_picture(self.upload(size=(300, 300), color="blue"))
+        for variant in uploads.AVATAR_VARIANTS:
+            self.assertFalse(media_storage.exists(uploads.avatar_variant_name(old, variant)))
+
+    def test_shared_avatar_is_kept_while_referenced(self):
+        other = Donor.objects.exclude(pk=self.donor.pk).order_by("pk").first()
+        self.donor.set_profile_picture(self.upload())
+        other.set_profile_picture(self.upload())
+        shared = self.donor.profile_picture.name
+        self.assertEqual(other.profile_picture.name, shared)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.donor.set_profile_picture(self.upload(color="blue"))
+        self.assertTrue(media_storage.exists(shared))
+
+    def test_saving_other_fields_does_not_reload_donor(self):
+        self.donor.set_profile_picture(self.upload())
+        with self.assertNumQueries(1):
+            self.donor.set_cooldown()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.donor.save()
+        self.assertEqual(callbacks, [])
+
+
+class InMemoryS3Client:
+    """Local stand-in for the boto3 S3 client calls S3MediaStorage makes"""
+
+    class NotFound(Exception):
+        response = {"Error": {"Code": "404"}}
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound()
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound()
+        return {"ContentLength": len(self.objects[(Bucket, Key)]), "LastModified": timezone.now()}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        source = (CopySource["Bucket"], CopySource["Key"])
+        if source not in self.objects:
+            raise self.NotFound()
+        self.objects[(Bucket, Key)] = self.objects[source]
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix, Delimiter):
+        keys = [k for b, k in self.objects if b == Bucket and k.startswith(Prefix)]
+        rest = [k[len(Prefix):] for k in keys]
+        return {
+            "Contents": [{"Key": Prefix + r} for r in rest if Delimiter not in r],
+            "CommonPrefixes": [{"Prefix": Prefix + p} for p in sorted({r.split(Delimiter)[0] + Delimiter for r in rest if Delimiter in r})],
+        }
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://s3.invalid/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+class MediaStorageTests(TestCase):
+    """Generated media is content-addressed, sharded and deduplicated."""
+
+    def check_backend(self, storage):
+        name = storage.save_content("qr_codes", b"png-bytes", ".png")
+        digest = name.rsplit("/", 1)[1][:-4]
+        self.assertEqual(name, f"qr_codes/{digest[:2]}/{digest[2:4]}/{digest}.png")
+        self.assertEqual(storage.save_content("qr_codes", b"png-bytes", ".png"), name)
+        with storage.open(name) as fh:
+            self.assertEqual(fh.read(), b"png-bytes")
+        self.assertEqual(storage.listdir(f"qr_codes/{digest[:2]}/{digest[2:4]}")[1], [f"{digest}.png"])
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+
+    def test_local_backend(self):
+        root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.check_backend(LocalMediaStorage(location=root))
+
+    def test_s3_backend(self):
+        client = InMemoryS3Client()
+        storage = S3MediaStorage("media", location="givepulse", client=client)
+        self.check_backend(storage)
+        name = storage.save_content("certificates", b"%PDF", ".pdf")
+        self.assertIn(("media", f"givepulse/{name}"), client.objects)
+        self.assertTrue(storage.url(name).startswith("https://s3.invalid/media/givepulse/certificates/"))
+
+
+class GarbageCollectMediaTests(TestCase):
+    """gc_media deletes only unreferenced files older than the threshold."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="gc"))
+
+    def age(self, name, hours):
+        then = time.time() - hours * 3600
+        os.utime(media_storage.path(name), (then, then))
+
+    def test_orphans_are_deleted(self):
+        appointment = DonationAppointment.objects.order_by("pk").first()
+        kept = media_storage.save_content("qr_codes", b"kept", ".png")
+        DonationAppointment.objects.filter(pk=appointment.pk).update(qr_code_image=kept)
+        orphan = media_storage.save_content("qr_codes", b"orphan", ".png")
+        fresh = media_storage.save_content("certificates", b"fresh", ".pdf")
+        donor = Donor.objects.order_by("pk").first()
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), "green").save(buf, format="PNG")
+        donor.set_profile_picture(buf)
+        avatar = donor.profile_picture.name
+        leftover = "temp/qr_GP-OLD.png"
+        media_storage.save(leftover, io.BytesIO(b"partial"))
+        for name in (kept, orphan, leftover, avatar, uploads.avatar_variant_name(avatar, "thumb")):
+            self.age(name, 48)
+
+        call_command("gc_media", dry_run=True, stdout=io.StringIO())
+        self.assertTrue(media_storage.exists(orphan))
+
+        call_command("gc_media", stdout=io.StringIO())
+        self.assertTrue(media_storage.exists(kept))
+        self.assertTrue(media_storage.exists(uploads.avatar_variant_name(avatar, "thumb")))
+        self.assertTrue(media_storage.exists(fresh))
+        self.assertFalse(media_storage.exists(orphan))
+        self.assertFalse(media_storage.exists(leftover))
+
+    def test_reupload_of_an_old_orphan_is_kept(self):
+        name = media_storage.save_content("qr_codes", b"same-bytes", ".png")
+        self.age(name, 48)
+        self.assertEqual(media_storage.save_content("qr_codes", b"same-bytes", ".png"), name)
+        self.assertGreater(os.stat(media_storage.path(name)).st_mtime, time.time() - 60)
+
+        call_command("gc_media", stdout=io.StringIO())
+        self.assertTrue(media_storage.exists(name))
+
+    def test_file_reuploaded_during_the_scan_is_kept(self):
+        name = media_storage.save_content("qr_codes", b"scanned-then-reused", ".png")
+        self.age(name, 48)
+
+        class ReuploadDuringScan(gc_media.Command):
+            def walk(self, top):
+                for entry in super().walk(top):
+                    yield entry
+                    # Identical upload after the scan saw the old mtime
+                    media_storage.save_content("qr_codes", b"scanned-then-reused", ".png")
+
+        out = io.StringIO()
+        call_command(ReuploadDuringScan(), dir=["qr_codes"], stdout=out)
+        self.assertTrue(media_storage.exists(name))
+        self.assertIn("deleted 0 orphans", out.getvalue())
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """Fails for recipients at fail.invalid and counts opened connections"""
+
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if any(to.endswith("@fail.invalid") for to in message.to):
+                raise SMTPException("550 mailbox unavailable")
+            mail.outbox.append(message)
+        return len(email_messages)
+
+
+class MailQueueTests(TestCase):
+    """Contact messages are queued, then sent in batches with backoff."""
+
+    def test_contact_form_queues_instead_of_sending(self):
+        response = self.client.post(reverse("contact"), {
+            "name": "Sara Odeh", "email": "sara@example.invalid", "message": "Where can I donate this week?",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, EmailStatus.PENDING)
+
+        self.assertEqual(mail_queue.send_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, EmailStatus.SENT)
+
+    @override_settings(EMAIL_BACKEND="give_pulse_app.tests.FlakyEmailBackend")
+    def test_batch_shares_one_connection_and_failures_back_off(self):
+        for n in range(3):
+            mail_queue.enqueue_email("Hello", "Body", [f"donor{n}@example.invalid"])
+        bad = mail_queue.enqueue_email("Hello", "Body", ["nobody@fail.invalid"])
+        FlakyEmailBackend.opened = 0
+
+        now = timezone.now()
+        self.assertEqual(mail_queue.send_pending(now=now), (3, 1))
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (EmailStatus.PENDING, 1))
+        self.assertEqual(bad.next_attempt_at, now + mail_queue.backoff(1))
+
+        # Not due yet, then retried until the queue gives up.
+        self.assertEqual(mail_queue.send_pending(now=now), (0, 0))
+        for attempt in range(2, mail_queue.MAX_ATTEMPTS + 1):
+            now += mail_queue.BACKOFF_MAX
+            self.assertEqual(mail_queue.send_pending(now=now), (0, 1))
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, EmailStatus.FAILED)
+
+
+class DonorEligibilityTests(TestCase):
+    """Eligibility is a queryset filter that agrees with Donor.is_in_cooldown."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="eligible", requests=0))
+
+    def test_queryset_matches_instance_rule(self):
+        now = timezone.now()
+        donors = list(Donor.objects.all())
+        donors[0].cooldown_until = now + timedelta(days=3)
+        donors[1].cooldown_until = now - timedelta(days=3)
+        donors[2].cooldown_until = None
+        Donor.objects.bulk_update(donors[:3], ["cooldown_until"])
+
+        eligible = set(Donor.objects.eligible(at=now).values_list("pk", flat=True))
+        in_cooldown = set(Donor.objects.in_cooldown(at=now).values_list("pk", flat=True))
+        self.assertEqual(eligible | in_cooldown, {d.pk for d in donors})
+        self.assertFalse(eligible & in_cooldown)
+        for donor in Donor.objects.with_eligibility(at=now):
+            self.assertEqual(donor.is_eligible, not donor.is_in_cooldown(at=now))
+            self.assertEqual(donor.pk in eligible, donor.is_eligible)
+
+    def test_cooldown_ends_at_boundary(self):
+        donor = Donor.objects.first()
+        donor.set_cooldown(days=1)
+        self.assertFalse(Donor.objects.eligible().filter(pk=donor.pk).exists())
+        self.assertTrue(Donor.objects.eligible(at=donor.cooldown_until).filter(pk=donor.pk).exists())
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=60)
+class SchedulingTests(TestCase):
+    """Appointments fill each hospital slot up to capacity, never beyond."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="slots"))
+
+    def setUp(self):
+        self.hospital = Hospital.objects.first()
+        self.hospital.slot_capacity = 2
+        self.hospital.save(update_fields=["slot_capacity"])
+        self.earliest = scheduling.slot_start(timezone.now()) + timedelta(days=1)
+
+    def test_allocation_moves_on_when_slot_is_full(self):
+        windows = scheduling.allocate_slots(self.hospital, 5, earliest=self.earliest)
+        starts = [start for start, end in windows]
+        hour = timedelta(hours=1)
+        self.assertEqual(starts, [self.earliest] * 2 + [self.earliest + hour] * 2 + [self.earliest + 2 * hour])
+        self.assertEqual(
+            list(AppointmentSlot.objects.filter(hospital=self.hospital).order_by("starts_at").values_list("booked", flat=True)),
+            [2, 2, 1],
+        )
+        # The known-full slots are skipped without trying to claim them
+        with CaptureQueriesContext(connection) as ctx:
+            scheduling.allocate_slot(self.hospital, earliest=self.earliest)
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_free_slots_and_release(self):
+        match = Match.objects.filter(blood_request__hospital=self.hospital).first()
+        DonationAppointment.objects.filter(match=match).delete()
+        start, end = scheduling.allocate_slot(self.hospital, earliest=self.earliest)
+        appointment = DonationAppointment.objects.create(match=match, window_start=start, window_end=end)
+
+        free = scheduling.free_slots(self.hospital, self.earliest, self.earliest + timedelta(hours=3))
+        self.assertEqual([(s["starts_at"], s["free"]) for s in free][:2], [(start, 1), (start + timedelta(hours=1), 2)])
+
+        appointment.delete()
+        self.assertEqual(AppointmentSlot.objects.get(hospital=self.hospital, starts_at=start).booked, 0)
+
+    def test_full_horizon_raises(self):
+        self.hospital.slot_capacity = 0
+        with self.assertRaises(scheduling.NoSlotAvailable):
+            scheduling.allocate_slot(self.hospital, earliest=self.earliest)
+
+    def test_first_booking_inserts_the_slot_before_claiming_it(self):
+        with CaptureQueriesContext(connection) as first:
+            scheduling.allocate_slot(self.hospital, earliest=self.earliest)
+        self.assertEqual([q["sql"].split()[0] for q in first.captured_queries], ["SELECT", "INSERT", "UPDATE"])
+        with CaptureQueriesContext(connection) as second:
+            scheduling.allocate_slot(self.hospital, earliest=self.earliest)
+        self.assertEqual([q["sql"].split()[0] for q in second.captured_queries], ["SELECT", "UPDATE"])
+        self.assertEqual(AppointmentSlot.objects.get(hospital=self.hospital, starts_at=self.earliest).booked, 2)
+
+    def test_slots_api_only_lists_bookable_slots(self):
+        staff = Staff.objects.filter(hospital=self.hospital).select_related("user").first()
+        self.client.post(reverse("login"), {"email": staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        response = self.client.get(reverse("api_appointment_slots"), {"days": 1})
+        slots = response.json()["slots"]
+        self.assertTrue(slots)
+        first = datetime.fromisoformat(slots[0]["starts_at"])
+        # The first listed slot is the one the next accept is given
+        self.assertEqual(first, scheduling.allocate_slot(self.hospital)[0])
+
+
+
+class DeadlockRetryTests(SimpleTestCase):
+    """Views that lose a deadlock run once more; other errors are raised."""
+
+    # No per-test transaction, so the retry path is reachable
+    databases = {"default"}
+
+    def flaky(self, error, failures=1):
+        calls = []
+
+        @db.retry_on_deadlock
+        def view():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise error
+            return "done"
+        return view, calls
+
+    def test_deadlock_victim_is_retried_once(self):
+        view, calls = self.flaky(OperationalError(db.MYSQL_DEADLOCK, "Deadlock found when trying to get lock"))
+        self.assertEqual(view(), "done")
+        self.assertEqual(len(calls), 2)
+
+        view, calls = self.flaky(OperationalError(db.MYSQL_DEADLOCK, "Deadlock"), failures=2)
+        with self.assertRaises(OperationalError):
+            view()
+        self.assertEqual(len(calls), 2)
+
+    def test_other_errors_are_not_retried(self):
+        view, calls = self.flaky(OperationalError(2006, "MySQL server has gone away"))
+        with self.assertRaises(OperationalError):
+            view()
+        self.assertEqual(len(calls), 1)
+
+    def test_not_retried_inside_an_outer_transaction(self):
+        view, calls = self.flaky(OperationalError(db.MYSQL_DEADLOCK, "Deadlock"))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            view()
+        self.assertEqual(len(calls), 1)
+
+
+class BulkMatchActionTests(TestCase):
+    """Staff accept or decline many matches with one POST."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="bulk"))
+        cls.blood_request = BloodRequest.objects.annotate(n=Count("matches")).order_by("-n", "pk").first()
+        cls.staff = Staff.objects.filter(hospital_id=cls.blood_request.hospital_id).select_related("user").first()
+        DonationAppointment.objects.filter(match__blood_request=cls.blood_request).delete()
+        Donation.objects.filter(match__blood_request=cls.blood_request).delete()
+        cls.blood_request.matches.update(status="pending", accepted_at=None, declined_at=None)
+        Donor.objects.filter(matches__blood_request=cls.blood_request).update(cooldown_until=None)
+        cls.match_ids = list(cls.blood_request.matches.values_list("pk", flat=True))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client.post(reverse("login"), {"email": self.staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+
+    def post(self, action, match_ids):
+        return self.client.post(
+            reverse("bulk_match_action", args=[self.blood_request.pk]),
+            {"action": action, "match_ids": match_ids},
+        )
+
+    def test_accept_books_appointments_and_queues_qr_rendering(self):
+        response = self.post("accept", self.match_ids)
+        self.assertRedirects(response, reverse("manage_matches", args=[self.blood_request.pk]), fetch_redirect_response=False)
+
+        matches = Match.objects.filter(pk__in=self.match_ids).select_related("donor", "appointment")
+        for match in matches:
+            self.assertEqual(match.status, "accepted")
+            self.assertTrue(match.donor.is_in_cooldown())
+            self.assertTrue(match.appointment.qr_code_data)
+            self.assertFalse(match.appointment.qr_code_image)
+        booked = AppointmentSlot.objects.filter(hospital_id=self.blood_request.hospital_id)
+        self.assertEqual(sum(booked.values_list("booked", flat=True)), len(self.match_ids))
+
+        call_command("render_qr_codes", stdout=io.StringIO())
+        for appointment in DonationAppointment.objects.filter(match_id__in=self.match_ids):
+            self.assertTrue(media_storage.exists(appointment.qr_code_image.name))
+
+    def test_query_count_does_not_grow_with_selection(self):
+        with CaptureQueriesContext(connection) as one:
+            self.post("decline", self.match_ids[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.post("decline", self.match_ids[1:])
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
+        self.assertFalse(Match.objects.filter(pk__in=self.match_ids).exclude(status="declined").exists())
+
+    def test_only_pending_matches_are_changed(self):
+        Match.objects.filter(pk=self.match_ids[0]).update(status="declined")
+        self.post("accept", self.match_ids[:2])
+        self.assertEqual(Match.objects.get(pk=self.match_ids[0]).status, "declined")
+        self.assertFalse(DonationAppointment.objects.filter(match_id=self.match_ids[0]).exists())
+        self.assertEqual(Match.objects.get(pk=self.match_ids[1]).status, "accepted")
+
+    def test_donors_in_cooldown_are_not_booked(self):
+        cooling = Match.objects.get(pk=self.match_ids[0])
+        Donor.objects.filter(pk=cooling.donor_id).update(cooldown_until=timezone.now() + timedelta(days=10))
+
+        self.post("accept", self.match_ids[:2])
+        self.assertEqual(Match.objects.get(pk=self.match_ids[0]).status, "pending")
+        self.assertFalse(DonationAppointment.objects.filter(match_id=self.match_ids[0]).exists())
+        self.assertEqual(Match.objects.get(pk=self.match_ids[1]).status, "accepted")
+
+        response = self.client.get(reverse("accept_match", args=[self.match_ids[0]]))
+        self.assertRedirects(response, reverse("manage_matches", args=[self.blood_request.pk]), fetch_redirect_response=False)
+        self.assertEqual(Match.objects.get(pk=self.match_ids[0]).status, "pending")
+
+    def test_single_accept_of_a_bulk_accepted_match_is_refused(self):
+        self.post("accept", self.match_ids[:1])
+        response = self.client.get(reverse("accept_match", args=[self.match_ids[0]]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(DonationAppointment.objects.filter(match_id=self.match_ids[0]).count(), 1)
+
+
+class DonationStatsTests(TestCase):
+    """Donor.donation_count/last_donation track donated matches."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="stats"))
+
+    def test_synthetic_data_is_consistent(self):
+        self.assertEqual(Donor.objects.reconcile_donation_stats(), 0)
+        self.assertTrue(Donor.objects.filter(donation_count__gt=0).exists())
+
+    def test_reconcile_fixes_drift_and_keeps_self_reported_dates(self):
+        expected = dict(Donor.objects.values_list("pk", "donation_count"))
+        never_donated = Donor.objects.filter(donation_count=0).first()
+        Donor.objects.update(donation_count=0)
+        Donor.objects.filter(pk=never_donated.pk).update(last_donation=timezone.localdate() - timedelta(days=400))
+
+        self.assertEqual(Donor.objects.reconcile_donation_stats(batch_size=7, dry_run=True), sum(1 for n in expected.values() if n))
+        Donor.objects.reconcile_donation_stats(batch_size=7)
+        self.assertEqual(dict(Donor.objects.values_list("pk", "donation_count")), expected)
+        never_donated.refresh_from_db()
+        self.assertEqual(never_donated.last_donation, timezone.localdate() - timedelta(days=400))
+
+    def test_backfill_migration_fills_the_new_columns(self):
+        backfill = import_module("give_pulse_app.migrations.0018_backfill_donation_stats")
+        expected = dict(Donor.objects.values_list("pk", "donation_count"))
+        Donor.objects.update(donation_count=0)
+
+        backfill.backfill_donation_stats(django_apps, None)
+        self.assertEqual(dict(Donor.objects.values_list("pk", "donation_count")), expected)
+        self.assertEqual(Donor.objects.reconcile_donation_stats(), 0)
+
+    def test_complete_donation_records_donation(self):
+        media_root = tempfile.mkdtemp(prefix="givepulse-test-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        appointment = DonationAppointment.objects.filter(match__status="accepted").select_related("match__donor").first()
+        donor = appointment.match.donor
+        staff = Staff.objects.filter(hospital_id=appointment.match.blood_request.hospital_id).select_related("user").first()
+        self.client.post(reverse("login"), {"email": staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+
+        with override_settings(MEDIA_ROOT=media_root):
+            self.client.post(reverse("complete_donation", args=[appointment.pk]))
+
+        updated = Donor.objects.get(pk=donor.pk)
+        self.assertEqual(updated.donation_count, donor.donation_count + 1)
+        self.assertEqual(updated.last_donation, timezone.localdate())
+        self.assertEqual(Donor.objects.reconcile_donation_stats(), 0)
+
+
+class DailyRollupTests(TestCase):
+    """Daily hospital rollups match the source tables and update incrementally."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="rollup"))
+
+    def totals(self):
+        return DailyHospitalStats.objects.aggregate(
+            requests=Sum("requests_created"), units=Sum("units_requested"), matches=Sum("matches_created"),
+            accepted=Sum("matches_accepted"), declined=Sum("matches_declined"), donations=Sum("donations"),
+        )
+
+    def test_full_rebuild_matches_source(self):
+        rollups.update(full=True)
+        self.assertEqual(self.totals(), {
+            "requests": BloodRequest.objects.count(),
+            "units": BloodRequest.objects.aggregate(n=Sum("units_requested"))["n"],
+            "matches": Match.objects.count(),
+            "accepted": Match.objects.exclude(accepted_at=None).count(),
+            "declined": Match.objects.exclude(declined_at=None).count(),
+            "donations": Donation.objects.count(),
+        })
+        fulfilled = BloodRequest.objects.filter(status="fulfilled").count()
+        self.assertEqual(DailyHospitalStats.objects.aggregate(n=Sum("requests_fulfilled"))["n"] or 0, fulfilled)
+
+    def test_incremental_run_only_recomputes_changed_days(self):
+        rollups.update()
+        before = self.totals()
+        match = Match.objects.filter(status="pending").select_related("blood_request").first()
+        Match.objects.filter(pk=match.pk).update(status="declined", declined_at=timezone.now())
+
+        days, rows = rollups.update(now=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(days, 1)
+        self.assertEqual(self.totals()["declined"], before["declined"] + 1)
+
+    def test_staff_page_reads_only_rollups(self):
+        rollups.update()
+        staff = Staff.objects.select_related("user").first()
+        self.client.post(reverse("login"), {"email": staff.user.email, "password": synthetic.SYNTHETIC_PASSWORD})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("hospital_stats"), {"days": 365})
+        self.assertEqual(response.status_code, 200)
+        tables = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("give_pulse_app_match", tables)
+        self.assertNotIn("give_pulse_app_bloodrequest", tables)
+        totals = response.context["totals"]
+        self.assertEqual(totals["requests_created"], BloodRequest.objects.filter(hospital_id=staff.hospital_id).count())
+        if totals["requests_fulfilled"]:
+            self.assertIsNotNone(totals["avg_median_hours"])
+
+
+class SiteCounterTests(TestCase):
+    """Dashboard totals come from the stored counters until they are refreshed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="counter"))
+
+    def test_snapshot_is_stored_and_served_until_refresh(self):
+        counters, _ = site_stats.snapshot()
+        self.assertEqual(counters, site_stats.compute())
+        self.assertEqual(SiteCounter.objects.count(), len(site_stats.COUNTERS))
+
+        Donor.objects.filter(pk=Donor.objects.first().pk).delete()
+        with self.assertNumQueries(1):
+            stale, _ = site_stats.snapshot()
+        self.assertEqual(stale["total_donors"], counters["total_donors"])
+
+        call_command("refresh_site_counters", stdout=io.StringIO())
+        fresh, _ = site_stats.snapshot()
+        self.assertEqual(fresh["total_donors"], counters["total_donors"] - 1)
+
+    def test_admin_index_shows_counters_and_refresh_time(self):
+        self.client.force_login(User.objects.create(
+            first_name="Counter", last_name="Admin", email="counter-admin@example.invalid", role="admin",
+        ))
+        site_stats.refresh()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("admin:index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("COUNT(", " ".join(q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(response.context["total_hospitals"], Hospital.objects.count())
+        self.assertIsNotNone(response.context["stats_refreshed_at"])
+        self.assertContains(response, "last refreshed")
+
+    def test_admin_refresh_requires_a_csrf_protected_post(self):
+        self.client.force_login(User.objects.create(
+            first_name="Refresh", last_name="Admin", email="refresh-admin@example.invalid", role="admin",
+        ))
+        site_stats.refresh()
+        Donor.objects.filter(pk=Donor.objects.first().pk).delete()
+
+        self.client.get(reverse("admin:index"), {"refresh_stats": 1})
+        self.assertEqual(site_stats.snapshot()[0]["total_donors"], Donor.objects.count() + 1)
+
+        csrf_client = self.client_class(enforce_csrf_checks=True)
+        csrf_client.force_login(User.objects.get(email="refresh-admin@example.invalid"))
+        self.assertEqual(csrf_client.post(reverse("admin:index"), {"refresh_stats": 1}).status_code, 403)
+
+        response = self.client.post(reverse("admin:index"), {"refresh_stats": 1})
+        self.assertRedirects(response, reverse("admin:index"), fetch_redirect_response=False)
+        self.assertEqual(site_stats.snapshot()[0]["total_donors"], Donor.objects.count())
+
+
+class AdminSearchTests(TestCase):
+    """Admin searches are answered from the full-text search index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="search"))
+        cls.donor = Donor.objects.select_related("user").order_by("pk").first()
+
+    def found(self, model, term):
+        return set(model.objects.filter(pk__in=search.matching_ids(model, term)).values_list("pk", flat=True))
+
+    def test_finds_rows_by_name_prefix_email_and_phone(self):
+        user = self.donor.user
+        self.assertIn(self.donor.pk, self.found(Donor, f"{user.first_name[:4]} {user.last_name}"))
+        self.assertIn(self.donor.pk, self.found(Donor, user.email))
+        self.assertEqual(self.found(Donor, "nosuchdonorname"), set())
+        User.objects.filter(pk=user.pk).update(phone="+20 100-555-0199")
+        search.index(Donor, pk=self.donor.pk)
+        self.assertEqual(self.found(Donor, "201005550199"), {self.donor.pk})
+
+    def test_renaming_a_user_reindexes_their_donor_and_matches(self):
+        user = self.donor.user
+        user.last_name = "Zephyrine"
+        user.save()
+        self.assertEqual(self.found(Donor, "zephyr"), {self.donor.pk})
+        self.assertEqual(self.found(Match, "zephyrine"), set(self.donor.matches.values_list("pk", flat=True)))
+
+    def test_renaming_a_city_reindexes_its_donors(self):
+        city = self.donor.city
+        city.name = "Quillborough"
+        city.save()
+        self.assertEqual(self.found(Donor, "quillborough"), set(city.donors.values_list("pk", flat=True)))
+
+    def test_backfill_migration_indexes_existing_rows(self):
+        backfill = import_module("give_pulse_app.migrations.0019_backfill_search_entries")
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.found(Donor, self.donor.user.email), set())
+
+        backfill.rebuild_search_index(django_apps, None)
+        self.assertIn(self.donor.pk, self.found(Donor, self.donor.user.email))
+        self.assertIn(self.donor.user_id, self.found(User, self.donor.user.email))
+
+    def test_changelist_search_uses_index(self):
+        admin = User.objects.create(
+            first_name="Search", last_name="Admin", email="search-admin@example.invalid", role="admin",
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("admin:give_pulse_app_donor_changelist"),
+                {"q": f"{self.donor.user.first_name} {self.donor.user.last_name}"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.donor, response.context["cl"].result_list)
+        self.assertNotIn("LIKE", " ".join(q["sql"] for q in ctx.captured_queries if "searchentry" in q["sql"]))
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Admin changelists count once, and reuse the count while paging."""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(**dict(BUDGET_DATASET, prefix="paging"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create(
+            first_name="Paging", last_name="Admin", email="paging-admin@example.invalid", role="admin",
+        ))
+
+    def counts(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, sum("COUNT(" in q["sql"] for q in ctx.captured_queries)
+
+    def test_changelist_counts_once_and_caches(self):
+        url = reverse("admin:give_pulse_app_match_changelist")
+        response, counts = self.counts(url, {"status__exact": "pending"})
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.context["cl"].result_count, Match.objects.filter(status="pending").count())
+        self.assertEqual(self.counts(url, {"status__exact": "pending", "p": 2})[1], 0)
+
+    def test_exact_count_without_engine_statistics(self):
+        self.assertIsNone(estimated_rows(Match))  # SQLite keeps no row statistics
+        paginator = EstimatedCountPaginator(Match.objects.order_by("pk"), 100)
+        self.assertEqual(paginator.count, Match.objects.count())
+
+
+class ReplicaRouterTests(TestCase):
+    """Only reads inside read-only views go to the replica, and never for users."""
+
+    router = db.ReplicaRouter()
+
+    def test_reads_use_replica_only_inside_read_only_views(self):
+        replica_db = {**connection.settings_dict, "TEST": {"MIRROR": "default"}}
+        with override_settings(DATABASES={"default": connection.settings_dict, "replica": replica_db}):
+            self.assertEqual(self.router.db_for_read(Match), "default")
+            with db.replica():
+                self.assertEqual(self.router.db_for_read(Match), "replica")
+                self.assertEqual(self.router.db_for_read(User), "default")
+                self.assertEqual(self.router.db_for_write(Match), "default")
+            self.assertEqual(self.router.db_for_read(Match), "default")
+
+    def test_replica_misses_are_rechecked_on_the_primary(self):
+        replica_db = {**connection.settings_dict, "TEST": {"MIRROR": "default"}}
+        with override_settings(
+            DATABASES={"default": connection.settings_dict, "replica": replica_db},
+            DATABASE_ROUTERS=["give_pulse_app.db.ReplicaRouter"],
+        ):
+            self.assertIsNone(db.recheck_on_primary(Donation.objects.all()))
+            with db.replica():
+                self.assertEqual(db.recheck_on_primary(Donation.objects.all()).db, "default")
+                self.assertIsNone(db.recheck_on_primary(User.objects.all()))
+
+    def test_without_replica_everything_stays_on_default(self):
+        with db.replica():
+            self.assertEqual(self.router.db_for_read(Match), "default")
+        self.assertTrue(self.router.allow_migrate("default", "give_pulse_app"))
+        self.assertFalse(self.router.allow_migrate("replica", "give_pulse_app"))
@@ -1,6 +1,85 @@
 from __future__ import annotations
-import os, uuid
+import hashlib, io, os, uuid
+
+from PIL import Image, ImageOps
+
+from .media_storage import content_name, media_storage
+
+# Square variants stored for every avatar, (edge in px, WebP quality).
+# "thumb" covers the 140px dashboard avatar on 1x-2x screens.
+AVATAR_VARIANTS = {
+    "thumb": (160, 80),
+    "display": (480, 82),
+}
+AVATAR_FIELD_VARIANT = "display"
+
+# Refuse to decode anything larger; a 2 MB PNG can still expand to gigabytes.
+MAX_AVATAR_PIXELS = 40_000_000
+
 
 def donor_avatar_path(instance, filename):
     ext = os.path.splitext(filename)[1].lower()
     return f"donors/{instance.user_id}/profile_{uuid.uuid4().hex}{ext}"
+
+
+def avatar_variant_name(name, variant):
+    """Storage name of ``variant`` for the avatar stored as ``name``.
+
+    Returns None for avatars uploaded before variants existed.
+    """
+    suffix = f"_{AVATAR_FIELD_VARIANT}.webp"
+    if not name or not name.endswith(suffix):
+        return None
+    return f"{name[:-len(suffix)]}_{variant}.webp"
+
+
+def render_avatar_variants(file):
+    """Decode ``file`` once and return {variant: WebP bytes}.
+
+    EXIF orientation is applied and all metadata (EXIF, GPS, ICC) is dropped
+    by re-encoding the pixels only.
+    """
+    file.seek(0)
+    with Image.open(file) as img:
+        if img.width * img.height > MAX_AVATAR_PIXELS:
+            raise ValueError("Image dimensions are too large.")
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for variant, (edge, quality) in AVATAR_VARIANTS.items():
+        resized = ImageOps.fit(img, (edge, edge), method=Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        resized.save(buf, format="WEBP", quality=quality, method=4)
+        variants[variant] = buf.getvalue()
+    return variants
+
+
+def store_avatar(file):
+    """Write every avatar variant and return the name for the field.
+
+    Variants share the content address of the field variant, e.g.
+    ``avatars/ab/cd/<sha256>_thumb.webp``, so identical uploads are stored once.
+    """
+    variants = render_avatar_variants(file)
+    digest = hashlib.sha256(variants[AVATAR_FIELD_VARIANT]).hexdigest()
+    # The field variant goes last, so once it exists all others do too.
+    for variant in sorted(variants, key=lambda v: v == AVATAR_FIELD_VARIANT):
+        media_storage.save_content("avatars", variants[variant], f"_{variant}.webp", digest=digest)
+    return content_name("avatars", digest, f"_{AVATAR_FIELD_VARIANT}.webp")
+
+
+def delete_avatar(name):
+    """Delete the avatar stored as ``name`` and all its variants.
+
+    Content-addressed avatars can be shared by identical uploads, so files
+    still referenced by a donor are kept.
+    """
+    from .models import Donor
+
+    if not name or Donor.objects.filter(profile_picture=name).exists():
+        return
+    names = {name} | {avatar_variant_name(name, v) for v in AVATAR_VARIANTS}
+    for n in names - {None}:
+        media_storage.delete(n)
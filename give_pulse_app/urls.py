@@ -24,10 +24,13 @@ urlpatterns = [
     path("requests/<int:request_id>/match-ajax/", views.match_blood_request_ajax, name="match_blood_request_ajax"),
     path("matches/<int:match_id>/accept/", views.accept_match, name="accept_match"),
     path("matches/<int:match_id>/decline/", views.decline_match, name="decline_match"),
+    path("api/slots/", views.appointment_slots_api, name="api_appointment_slots"),
     
     # Staff management
     path("staff/requests/", views.staff_blood_requests, name="staff_blood_requests"),
+    path("staff/stats/", views.hospital_stats, name="hospital_stats"),
     path("requests/<int:request_id>/manage/", views.manage_matches, name="manage_matches"),
+    path("requests/<int:request_id>/matches/bulk/", views.bulk_match_action, name="bulk_match_action"),
     
     # Donor management
     path("donor/matches/", views.donor_matches, name="donor_matches"),
@@ -37,7 +40,10 @@ urlpatterns = [
     # QR Code and Donation Management
     path("verify-qr/", views.verify_qr_code, name="verify_qr"),
     path("verify-certificate/", views.verify_certificate, name="verify_certificate"),
+    path("api/verify/", views.verify_codes_api, name="api_verify"),
+    path("verify/<str:serial>/", views.verify_certificate_serial, name="verify_certificate_serial"),
     path("complete-donation/<int:appointment_id>/", views.complete_donation, name="complete_donation"),
     path("download-certificate/<int:donation_id>/", views.download_certificate, name="download_certificate"),
+    path("appointments/<int:appointment_id>/qr/", views.appointment_qr_image, name="appointment_qr"),
     
 ]
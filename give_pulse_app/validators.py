@@ -3,6 +3,7 @@ from __future__ import annotations
 import re
 from PIL import Image
 from django.core.exceptions import ValidationError
+from .uploads import MAX_AVATAR_PIXELS
 
 NAME_RE  = re.compile(r"^[A-Za-z][A-Za-z\s'\-]{1,149}$")
 PHONE_RE = re.compile(r"^\+?[0-9]{7,15}$")
@@ -35,6 +36,8 @@ def validate_profile_image(file, *, max_mb=2):
     try:
         pos = file.tell()
         img = Image.open(file)
+        if img.width * img.height > MAX_AVATAR_PIXELS:
+            raise ValidationError("Image dimensions are too large.")
         img.verify()
         file.seek(pos)
     except ValidationError:
@@ -0,0 +1,314 @@
+"""
+Verification of scanned appointment QR codes and donation certificates.
+
+Every lookup loads the whole record graph in one joined query. Summaries of
+recently verified records are kept in the cache so repeated scans during a
+drive skip the database, and batches resolve all cache misses with a single
+query. Views may read from a lagging replica, so a record not found there is
+looked up again on the primary before it is reported or cached as missing.
+"""
+from __future__ import annotations
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import db
+from .models import Donation, DonationAppointment
+from .qr_tokens import InvalidQRToken, looks_like_token, read_appointment_token
+
+# Scanned payloads are short; anything larger is not one of ours.
+MAX_CODE_LENGTH = 2048
+MAX_BATCH_SIZE = 200
+
+CERTIFICATE_SERIAL_RE = re.compile(r"^[A-Za-z0-9-]{1,40}$")
+CERTIFICATE_URL_RE = re.compile(r"/verify/([A-Za-z0-9-]{1,40})/?$")
+
+APPOINTMENT_CACHE_KEY = "verify:appointment:{}"
+CERTIFICATE_CACHE_KEY = "verify:certificate:{}"
+PUBLIC_CERTIFICATE_CACHE_KEY = "verify:public:{}"
+
+# Certificates never change once issued, so public lookups are cached for a
+# day; unknown serials are remembered briefly so guessing stays off the DB.
+PUBLIC_CACHE_SECONDS = 24 * 60 * 60
+NEGATIVE_CACHE_SECONDS = 5 * 60
+NOT_FOUND = "missing"
+
+
+def _cache_seconds():
+    return getattr(settings, "VERIFICATION_CACHE_SECONDS", 60)
+
+
+def _get(queryset, **lookup):
+    """``queryset.get(**lookup)``, confirming a replica miss on the primary"""
+    try:
+        return queryset.get(**lookup)
+    except queryset.model.DoesNotExist:
+        primary = db.recheck_on_primary(queryset)
+        if primary is None:
+            raise
+        return primary.get(**lookup)
+
+
+def _fetch(queryset, key, wanted):
+    """Rows of ``queryset`` whose ``key`` is in ``wanted``, confirming replica misses on the primary"""
+    rows = list(queryset.filter(**{f"{key}__in": wanted}))
+    missing = set(wanted) - {getattr(row, key) for row in rows}
+    primary = db.recheck_on_primary(queryset) if missing else None
+    if primary is not None:
+        rows += primary.filter(**{f"{key}__in": missing})
+    return rows
+
+
+def _load_json_object(code):
+    try:
+        data = json.loads(code)
+    except json.JSONDecodeError as e:
+        raise InvalidQRToken(f"Invalid JSON format in QR code. Error: {str(e)}")
+    if not isinstance(data, dict):
+        raise InvalidQRToken("Invalid QR code. This doesn't appear to be a GivePulse QR code.")
+    return data
+
+
+def _clean_code(code):
+    code = (code or "").strip() if isinstance(code, str) else ""
+    if not code:
+        raise InvalidQRToken("No QR code data received.")
+    if len(code) > MAX_CODE_LENGTH:
+        raise InvalidQRToken("QR code data is too long.")
+    return code
+
+
+# Appointments --------------------------------------------------------------
+
+def parse_appointment_code(code, *, allow_legacy=True):
+    """Return ``(appointment_id, match_id)`` from a compact token or legacy JSON.
+
+    Legacy JSON is unsigned and made of sequential ids, so it can be forged;
+    pass ``allow_legacy=False`` wherever only signed tokens may be trusted.
+    """
+    code = _clean_code(code)
+    if looks_like_token(code):
+        token = read_appointment_token(code)
+        return token.appointment_id, token.match_id
+
+    if not allow_legacy:
+        raise InvalidQRToken("Only signed GivePulse QR codes are accepted here.")
+    if not code.startswith("{"):
+        raise InvalidQRToken(f"Invalid QR code format. Expected a GivePulse QR code, but got: {repr(code[:50])}")
+    data = _load_json_object(code)
+    required_fields = ["appointment_id", "match_id", "donor_id"]
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise InvalidQRToken(f"Invalid QR code. Missing required fields: {', '.join(missing_fields)}")
+    try:
+        return int(data["appointment_id"]), int(data["match_id"])
+    except (TypeError, ValueError):
+        raise InvalidQRToken("Invalid QR code. Appointment and match IDs must be numbers.")
+
+
+def resolve_appointment(code):
+    """Return the DonationAppointment (with donor and hospital loaded) for a scanned code.
+
+    Raises InvalidQRToken or DonationAppointment.DoesNotExist.
+    """
+    appointment_id, match_id = parse_appointment_code(code)
+    return _get(DonationAppointment.objects.with_verification_graph(), pk=appointment_id, match_id=match_id)
+
+
+def appointment_record(appointment):
+    return {
+        "valid": True,
+        "kind": "appointment",
+        **appointment.qr_summary(),
+        "status": appointment.match.status,
+        "window_start": appointment.window_start.isoformat(),
+        "window_end": appointment.window_end.isoformat(),
+    }
+
+
+def verify_appointment_codes(codes, *, allow_legacy=False):
+    """Verify scanned appointment codes; returns one record per code, in order"""
+    parsed = []
+    for code in codes:
+        try:
+            parsed.append(parse_appointment_code(code, allow_legacy=allow_legacy))
+        except InvalidQRToken as e:
+            parsed.append(str(e))
+
+    wanted = {p[0] for p in parsed if isinstance(p, tuple)}
+    cached = cache.get_many([APPOINTMENT_CACHE_KEY.format(pk) for pk in wanted])
+    records = {pk: cached[APPOINTMENT_CACHE_KEY.format(pk)] for pk in wanted if APPOINTMENT_CACHE_KEY.format(pk) in cached}
+    missing = wanted - set(records)
+    if missing:
+        fetched = {}
+        for appointment in _fetch(DonationAppointment.objects.with_verification_graph(), "pk", missing):
+            fetched[appointment.pk] = appointment_record(appointment)
+        cache.set_many({APPOINTMENT_CACHE_KEY.format(pk): r for pk, r in fetched.items()}, _cache_seconds())
+        records.update(fetched)
+
+    results = []
+    for p in parsed:
+        if not isinstance(p, tuple):
+            results.append({"valid": False, "kind": "appointment", "error": p})
+            continue
+        appointment_id, match_id = p
+        record = records.get(appointment_id)
+        if record is None or record["match_id"] != match_id:
+            results.append({"valid": False, "kind": "appointment", "error": "Appointment not found. Please check the QR code."})
+        else:
+            results.append(record)
+    return results
+
+
+def invalidate_appointment(appointment_id):
+    cache.delete(APPOINTMENT_CACHE_KEY.format(appointment_id))
+
+
+# Certificates --------------------------------------------------------------
+
+def parse_certificate_code(code):
+    """Return ``(certificate_serial, donation_id or None)`` from a scanned certificate code.
+
+    Accepts the certificate QR JSON, a verification URL or a bare serial.
+    """
+    code = _clean_code(code)
+    donation_id = None
+    if code.startswith("{"):
+        data = _load_json_object(code)
+        required_fields = ["certificate_serial", "donation_id"]
+        missing_fields = [field for field in required_fields if field not in data]
+        if missing_fields:
+            raise InvalidQRToken(f"Invalid certificate QR code. Missing required fields: {', '.join(missing_fields)}")
+        serial = str(data["certificate_serial"])
+        try:
+            donation_id = int(data["donation_id"])
+        except (TypeError, ValueError):
+            raise InvalidQRToken("Invalid certificate QR code. Donation ID must be a number.")
+    else:
+        url_match = CERTIFICATE_URL_RE.search(code)
+        serial = url_match.group(1) if url_match else code
+
+    serial = serial.strip()
+    if not CERTIFICATE_SERIAL_RE.match(serial):
+        raise InvalidQRToken("Invalid certificate serial number.")
+    return serial, donation_id
+
+
+def resolve_donation(code):
+    """Return the Donation (with donor and hospital loaded) for a scanned certificate code.
+
+    Raises InvalidQRToken or Donation.DoesNotExist.
+    """
+    serial, donation_id = parse_certificate_code(code)
+    donation = _get(Donation.objects.with_verification_graph(), certificate_serial=serial)
+    if donation_id is not None and donation.pk != donation_id:
+        raise InvalidQRToken("Certificate serial number mismatch. This certificate may be invalid.")
+    return donation
+
+
+def certificate_record(donation):
+    donor = donation.match.donor
+    return {
+        "valid": True,
+        "kind": "certificate",
+        "certificate_serial": donation.certificate_serial,
+        "donation_id": donation.pk,
+        "donor_id": donor.id,
+        "donor_name": f"{donor.user.first_name} {donor.user.last_name}",
+        "blood_type": f"{donor.abo}{donor.rh}",
+        "hospital": donation.match.blood_request.hospital.name,
+        "units": donation.units,
+        "confirmed_at": donation.confirmed_at.isoformat(),
+    }
+
+
+def scanner_certificate_record(donation):
+    """Certificate record for the scanner API: like the public page, only the donor's alias"""
+    donor = donation.match.donor
+    return {
+        "valid": True,
+        "kind": "certificate",
+        "certificate_serial": donation.certificate_serial,
+        "donation_id": donation.pk,
+        "donor_alias": donor.public_alias,
+        "blood_type": f"{donor.abo}{donor.rh}",
+        "hospital": donation.match.blood_request.hospital.name,
+        "units": donation.units,
+        "confirmed_at": donation.confirmed_at.isoformat(),
+    }
+
+
+def verify_certificate_codes(codes):
+    """Verify scanned certificate codes; returns one record per code, in order"""
+    parsed = []
+    for code in codes:
+        try:
+            parsed.append(parse_certificate_code(code))
+        except InvalidQRToken as e:
+            parsed.append(str(e))
+
+    wanted = {p[0] for p in parsed if isinstance(p, tuple)}
+    cached = cache.get_many([CERTIFICATE_CACHE_KEY.format(s) for s in wanted])
+    records = {s: cached[CERTIFICATE_CACHE_KEY.format(s)] for s in wanted if CERTIFICATE_CACHE_KEY.format(s) in cached}
+    missing = wanted - set(records)
+    if missing:
+        fetched = {}
+        for donation in _fetch(Donation.objects.with_verification_graph(), "certificate_serial", missing):
+            fetched[donation.certificate_serial] = scanner_certificate_record(donation)
+        cache.set_many({CERTIFICATE_CACHE_KEY.format(s): r for s, r in fetched.items()}, _cache_seconds())
+        records.update(fetched)
+
+    results = []
+    for p in parsed:
+        if not isinstance(p, tuple):
+            results.append({"valid": False, "kind": "certificate", "error": p})
+            continue
+        serial, donation_id = p
+        record = records.get(serial)
+        if record is None:
+            results.append({"valid": False, "kind": "certificate", "error": "Certificate not found. This certificate may be invalid or expired."})
+        elif donation_id is not None and record["donation_id"] != donation_id:
+            results.append({"valid": False, "kind": "certificate", "error": "Certificate serial number mismatch. This certificate may be invalid."})
+        else:
+            results.append(record)
+    return results
+
+
+def public_certificate(serial):
+    """Public summary of the certificate with ``serial``, or None if there is none.
+
+    Backed by the unique certificate_serial index and cached, including
+    misses confirmed on the primary, so repeat checks of the same serial
+    never reach the database.
+    Only the donor's public alias is exposed.
+    """
+    if not CERTIFICATE_SERIAL_RE.match(serial or ""):
+        return None
+    key = PUBLIC_CERTIFICATE_CACHE_KEY.format(serial)
+    record = cache.get(key)
+    if record is None:
+        rows = Donation.objects.filter(certificate_serial=serial).values(
+            "certificate_serial", "units", "confirmed_at",
+            "match__donor__public_alias", "match__donor__abo", "match__donor__rh",
+            "match__blood_request__hospital__name",
+        )
+        row = rows.first()
+        primary = db.recheck_on_primary(rows) if row is None else None
+        if primary is not None:
+            # Only the primary's answer is cached as missing
+            row = primary.first()
+        if row is None:
+            cache.set(key, NOT_FOUND, NEGATIVE_CACHE_SECONDS)
+            return None
+        record = {
+            "certificate_serial": row["certificate_serial"],
+            "donor_alias": row["match__donor__public_alias"],
+            "blood_type": f"{row['match__donor__abo']}{row['match__donor__rh']}",
+            "hospital": row["match__blood_request__hospital__name"],
+            "units": row["units"],
+            "confirmed_at": row["confirmed_at"].isoformat(),
+        }
+        cache.set(key, record, PUBLIC_CACHE_SECONDS)
+    return None if record == NOT_FOUND else record
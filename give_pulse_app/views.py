@@ -1,35 +1,50 @@
 from __future__ import annotations
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_GET
-from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.http import JsonResponse, HttpRequest, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+import hashlib
 import json
 import logging
+from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.http import quote_etag
+from django.utils.crypto import constant_time_compare
 
 logger = logging.getLogger(__name__)
-from django.db import models
+from django.db import models, transaction
 from functools import wraps
 from .forms import LoginForm, DonorRegistrationForm, StaffRegistrationForm, BloodRequestForm
-from .models import ContactMessage, User, Staff, Hospital, BloodRequest, Match, DonationAppointment, Donation, SuccessStory
-from django.db.models import Count
+from .models import ContactMessage, DailyHospitalStats, User, Staff, Donor, Hospital, BloodRequest, Match, DonationAppointment, Donation, SuccessStory, MatchStatus
 from .forms import ContactForm
-from django.core.mail import send_mail, BadHeaderError
+from django.core.mail import BadHeaderError
+from .session_auth import get_session_user, login_session, logout_session
+from .protected_media import serve_protected
+from .mail_queue import enqueue_email
+from .qr_tokens import InvalidQRToken
+from .scheduling import NoSlotAvailable, allocate_slot, allocate_slots, free_slots, lead_time
+from . import site_stats
+from .db import replica_reads, retry_on_deadlock
+from .verification import (
+    MAX_BATCH_SIZE, NEGATIVE_CACHE_SECONDS, certificate_record, invalidate_appointment, public_certificate,
+    resolve_appointment, resolve_donation, verify_appointment_codes, verify_certificate_codes,
+)
+
+# Browser/proxy cache lifetime for a valid public certificate page.
+PUBLIC_MAX_AGE = 60 * 60
 
 
 def require_login(view_func):
     """Decorator to handle user authentication"""
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        user = None
-        if request.session.get("user_id"):
-            try:
-                user = User.objects.get(pk=request.session["user_id"])
-            except User.DoesNotExist:
-                _logout(request)
-                return redirect("login")
-        else:
+        user = get_session_user(request)
+        if user is None:
             return redirect("login")
         
         return view_func(request, user, *args, **kwargs)
@@ -79,55 +94,44 @@ def about(request):
     return render(request, "about.html")
 
 def _login(request, user: User):
-    request.session["user_id"] = user.id
-    request.session["user_role"] = user.role
+    login_session(request, user)
 
 def _logout(request):
-    """Logout user and clear session data"""
-    for k in ("user_id", "user_role"):
-        request.session.pop(k, None)
-    
-    # Clear the entire session to ensure complete logout
-    request.session.flush()
+    """Logout user, revoke their sessions and clear session data"""
+    logout_session(request)
 
 
+@replica_reads
 def index(request):
-    user = None
-    if request.session.get("user_id"):
-        try:
-            user = User.objects.get(pk=request.session["user_id"])
-        except User.DoesNotExist:
-            _logout(request)
-    
-    # Get leaderboard data (top 10 donors by donation count)
-    # Include both 'completed' and 'donated' statuses for existing data compatibility
-    leaderboard_users = User.objects.filter(
-        donor__matches__status__in=['completed', 'donated']
-    ).annotate(
-        donation_count=Count('donor__matches', filter=models.Q(donor__matches__status__in=['completed', 'donated']))
-    ).filter(
-        donation_count__gt=0
+    user = get_session_user(request)
+    
+    # Get leaderboard data (top 10 donors by donation count), read from the
+    # denormalized Donor.donation_count index
+    leaderboard_donors = Donor.objects.filter(donation_count__gt=0).select_related(
+        'user', 'city'
+    ).only(
+        'donation_count', 'user__first_name', 'user__last_name', 'city__name'
     ).order_by('-donation_count')[:10]
     
     # Format leaderboard data for template
     leaderboard = []
-    for rank, leaderboard_user in enumerate(leaderboard_users, 1):
+    for rank, donor in enumerate(leaderboard_donors, 1):
         leaderboard.append({
             'rank': rank,
-            'name': f"{leaderboard_user.first_name} {leaderboard_user.last_name}",
-            'donation_count': leaderboard_user.donation_count,
-            'city': leaderboard_user.donor.city.name if hasattr(leaderboard_user, 'donor') and leaderboard_user.donor.city else 'N/A'
+            'name': f"{donor.user.first_name} {donor.user.last_name}",
+            'donation_count': donor.donation_count,
+            'city': donor.city.name if donor.city else 'N/A'
         })
     
     # Get success stories from database (limit to first 4)
     success_stories = SuccessStory.objects.filter(is_published=True).order_by('display_order', '-created_at')[:4]
     
-    # Get global statistics
-    from .models import Donation, Donor, Hospital
-    total_donations = Donation.objects.count()
+    # Get global statistics from the stored site counters
+    counters, _ = site_stats.snapshot()
+    total_donations = counters['total_donations']
     total_lives_saved = total_donations  # Each donation saves one life
-    total_donors = Donor.objects.count()
-    total_hospitals = Hospital.objects.filter(is_verified=True).count()
+    total_donors = counters['total_donors']
+    total_hospitals = counters['verified_hospitals']
     
     context = {
         "user": user,
@@ -247,6 +251,7 @@ def _check_blood_type_compatibility(donor_abo, donor_rh, request_abo, request_rh
     
     return abo_compatible and rh_compatible
 
+@replica_reads
 @require_login
 def blood_requests_list(request, user):
     """List blood requests for donors"""
@@ -303,17 +308,13 @@ def blood_requests_list(request, user):
 
 def blood_request_detail(request, request_id):
     """Show detailed view of a blood request"""
-    user = None
-    if request.session.get("user_id"):
-        try:
-            user = User.objects.get(pk=request.session["user_id"])
-        except User.DoesNotExist:
-            _logout(request)
-            return redirect("login")
-    else:
+    user = get_session_user(request)
+    if user is None:
         return redirect("login")
 
-    blood_request = get_object_or_404(BloodRequest, pk=request_id)
+    blood_request = get_object_or_404(
+        BloodRequest.objects.select_related('hospital', 'city', 'created_by__user'), pk=request_id
+    )
     
     # Check if donor has already matched this request
     already_matched = False
@@ -345,14 +346,8 @@ def blood_request_detail(request, request_id):
 
 def match_blood_request(request, request_id):
     """Allow donors to match/respond to blood requests"""
-    user = None
-    if request.session.get("user_id"):
-        try:
-            user = User.objects.get(pk=request.session["user_id"])
-        except User.DoesNotExist:
-            _logout(request)
-            return redirect("login")
-    else:
+    user = get_session_user(request)
+    if user is None:
         return redirect("login")
 
     if not hasattr(user, "donor"):
@@ -408,16 +403,11 @@ def match_blood_request_ajax(request, request_id):
     logger.info(f"AJAX match request for request_id: {request_id}, method: {request.method}")
     
     # Handle authentication using session (since we're not using Django's built-in auth)
-    if not request.session.get("user_id"):
-        logger.warning("No user_id in session")
-        return JsonResponse({"success": False, "error": "Authentication required"})
-    
-    try:
-        user = User.objects.get(pk=request.session["user_id"])
-        logger.info(f"User found: {user.email}")
-    except User.DoesNotExist:
-        logger.warning(f"User not found for session user_id: {request.session.get('user_id')}")
+    user = get_session_user(request)
+    if user is None:
+        logger.warning("No valid user in session")
         return JsonResponse({"success": False, "error": "Authentication required"})
+    logger.info(f"User found: {user.email}")
 
     if not hasattr(user, "donor"):
         return JsonResponse({"success": False, "error": "Only donors can match blood requests"})
@@ -483,6 +473,7 @@ def match_blood_request_ajax(request, request_id):
 
 @require_login
 @require_staff
+@retry_on_deadlock
 def accept_match(request, user, staff, match_id):
     """Accept a donor match (staff only, verified)"""
 
@@ -493,28 +484,49 @@ def accept_match(request, user, staff, match_id):
         return redirect("manage_matches", request_id=match.blood_request.id)
 
     from django.utils import timezone
-    match.status = "accepted"
-    match.accepted_at = timezone.now()
-    match.save()
+    try:
+        with transaction.atomic():
+            # Lock the match, then the donor (same order as bulk_match_action), so a
+            # concurrent accept waits here and then sees the new status and cooldown
+            still_pending = (
+                Match.objects.select_for_update()
+                .filter(pk=match.pk, status=MatchStatus.PENDING).values_list("pk", flat=True).first()
+            )
+            if still_pending is None:
+                messages.error(request, "This match is not pending and cannot be accepted.")
+                return redirect("manage_matches", request_id=match.blood_request_id)
+            eligible = (
+                Donor.objects.select_for_update().eligible()
+                .filter(pk=match.donor_id).values_list("pk", flat=True).first()
+            )
+            if eligible is None:
+                messages.error(request, "This donor is in their cooldown period and cannot be booked.")
+                return redirect("manage_matches", request_id=match.blood_request_id)
 
-    # Note: We don't update blood_request status here because the donation hasn't been completed yet
-    # The request should remain "open" until the actual donation is completed
-    # Status will be updated in the complete_donation view
-    
-    # Set cooldown period for the donor (8 weeks = 56 days)
-    donor = match.donor
-    donor.set_cooldown(days=56)
+            # Earliest slot with room at this hospital; released again if anything below fails
+            appointment_start, appointment_end = allocate_slot(staff.hospital)
 
-    # Create donation appointment with QR code
-    from datetime import timedelta
-    appointment_start = timezone.now() + timedelta(hours=24)  # 24 hours from now
-    appointment_end = appointment_start + timedelta(hours=2)  # 2-hour window
-    
-    appointment = DonationAppointment.objects.create(
-        match=match,
-        window_start=appointment_start,
-        window_end=appointment_end
-    )
+            match.status = "accepted"
+            match.accepted_at = timezone.now()
+            match.save()
+
+            # Note: We don't update blood_request status here because the donation hasn't been completed yet
+            # The request should remain "open" until the actual donation is completed
+            # Status will be updated in the complete_donation view
+            
+            # Set cooldown period for the donor (8 weeks = 56 days)
+            donor = match.donor
+            donor.set_cooldown(days=56)
+
+            # Create donation appointment with QR code
+            appointment = DonationAppointment.objects.create(
+                match=match,
+                window_start=appointment_start,
+                window_end=appointment_end
+            )
+    except NoSlotAvailable as e:
+        messages.error(request, f"{e} Increase the hospital's slot capacity or try again later.")
+        return redirect("manage_matches", request_id=match.blood_request.id)
     
     # Generate QR code data
     appointment.qr_code_data = appointment.generate_qr_data()
@@ -522,156 +534,183 @@ def accept_match(request, user, staff, match_id):
     
     # Generate QR code image
     try:
-        import qrcode
-        from django.conf import settings
-        import os
-        
-        # Ensure we have QR data
-        if not appointment.qr_code_data:
-            raise Exception("No QR code data available")
-        
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(appointment.qr_code_data)
-        qr.make(fit=True)
-        
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        qr_filename = f"qr_appointment_{appointment.id}.png"
-        qr_path = os.path.join(settings.MEDIA_ROOT, "qr_codes", qr_filename)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(qr_path), exist_ok=True)
-        
-        # Save QR code image
-        qr_image.save(qr_path)
-        
-        # Update appointment with QR code image path
-        appointment.qr_code_image.name = f"qr_codes/{qr_filename}"
-        appointment.save()
-        
-        # Verify the file was created
-        if not os.path.exists(qr_path):
-            raise Exception(f"QR code file was not created at {qr_path}")
-            
+        appointment.render_qr_code()
     except ImportError:
         messages.warning(request, "QR code generation failed - qrcode module not available. Appointment created without QR code image.")
     except Exception as e:
         messages.warning(request, f"QR code generation failed: {str(e)}. Appointment created without QR code image.")
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"QR code generation failed for appointment {appointment.id}: {str(e)}")
 
     messages.success(request, f"Match #{match.id} has been accepted. Donation appointment created with QR code. Donor is now in cooldown period. Request remains open until donation is completed.")
     return redirect("manage_matches", request_id=match.blood_request.id)
 
+@require_login
+@require_staff
+def appointment_slots_api(request, user, staff):
+    """Free appointment slots at the staff member's hospital.
+
+    Starts after the booking lead time, like the allocator, so only slots an
+    accept can actually be given are listed. ``?days=N`` (1-31, default 7)
+    limits how far past that to look.
+    """
+    try:
+        days = min(max(int(request.GET.get("days", 7)), 1), 31)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "days must be a number"}, status=400)
+    start = timezone.now() + lead_time()
+    slots = free_slots(staff.hospital, start, start + timedelta(days=days))
+    return JsonResponse({
+        "success": True,
+        "capacity": staff.hospital.slot_capacity,
+        "slots": [
+            {"starts_at": s["starts_at"].isoformat(), "ends_at": s["ends_at"].isoformat(), "free": s["free"]}
+            for s in slots
+        ],
+    })
+
+@replica_reads
 def verify_qr_code(request):
     """Verify QR code and show appointment details"""
     if request.method == "POST":
-        qr_data = request.POST.get("qr_data")
+        qr_data = (request.POST.get("qr_data") or "").strip()
         
-        if qr_data:
-            # Clean and validate the QR data
-            qr_data = qr_data.strip()
-            
-            # Check if it looks like our appointment QR code
-            if not qr_data.startswith('{'):
-                messages.error(request, f"Invalid QR code format. Expected JSON data starting with '{{', but got: {repr(qr_data[:50])}")
-                return render(request, "verify_qr.html", {"is_valid": False})
-            
-            if 'appointment_id' not in qr_data:
-                messages.error(request, f"Invalid QR code. This doesn't appear to be a GivePulse appointment QR code. Data: {repr(qr_data[:100])}")
-                return render(request, "verify_qr.html", {"is_valid": False})
-            
-            try:
-                import json
-                data = json.loads(qr_data)
-                
-                # Validate required fields
-                required_fields = ['appointment_id', 'match_id', 'donor_id']
-                missing_fields = [field for field in required_fields if field not in data]
-                if missing_fields:
-                    messages.error(request, f"Invalid QR code. Missing required fields: {', '.join(missing_fields)}")
-                    return render(request, "verify_qr.html", {"is_valid": False})
-                
-                appointment_id = data.get("appointment_id")
-                appointment = get_object_or_404(DonationAppointment, pk=appointment_id)
-                
-                context = {
-                    "appointment": appointment,
-                    "qr_data": data,
-                    "is_valid": True
-                }
-                return render(request, "verify_qr.html", context)
-                
-            except json.JSONDecodeError as e:
-                messages.error(request, f"Invalid JSON format in QR code. Error: {str(e)}. Data: {repr(qr_data[:100])}")
-                return render(request, "verify_qr.html", {"is_valid": False})
-            except DonationAppointment.DoesNotExist as e:
-                messages.error(request, f"Appointment not found. Please check the QR code.")
-                return render(request, "verify_qr.html", {"is_valid": False})
-            except Exception as e:
-                messages.error(request, f"Error processing QR code: {str(e)}")
-                return render(request, "verify_qr.html", {"is_valid": False})
-        else:
+        if not qr_data:
             messages.error(request, "No QR code data received.")
             return render(request, "verify_qr.html", {"is_valid": False})
+
+        try:
+            appointment = resolve_appointment(qr_data)
+        except InvalidQRToken as e:
+            messages.error(request, str(e))
+            return render(request, "verify_qr.html", {"is_valid": False})
+        except DonationAppointment.DoesNotExist:
+            messages.error(request, "Appointment not found. Please check the QR code.")
+            return render(request, "verify_qr.html", {"is_valid": False})
+
+        context = {
+            "appointment": appointment,
+            "qr_data": appointment.qr_summary(),
+            "is_valid": True
+        }
+        return render(request, "verify_qr.html", context)
     
     return render(request, "verify_qr.html", {"is_valid": None})
 
+@replica_reads
 def verify_certificate(request):
     """Verify certificate authenticity using QR code data"""
     if request.method == "POST":
-        qr_data = request.POST.get("qr_data")
-        if qr_data:
-            try:
-                import json
-                data = json.loads(qr_data)
-                
-                # Validate required fields
-                required_fields = ['certificate_serial', 'donation_id']
-                missing_fields = [field for field in required_fields if field not in data]
-                if missing_fields:
-                    messages.error(request, f"Invalid certificate QR code. Missing required fields: {', '.join(missing_fields)}")
-                    return render(request, "verify_certificate.html", {"is_valid": False})
-                
-                # Get the donation record
-                donation = get_object_or_404(Donation, pk=data['donation_id'])
-                
-                # Verify the certificate serial matches
-                if donation.certificate_serial != data['certificate_serial']:
-                    messages.error(request, "Certificate serial number mismatch. This certificate may be invalid.")
-                    return render(request, "verify_certificate.html", {"is_valid": False})
-                
-                context = {
-                    "donation": donation,
-                    "qr_data": data,
-                    "is_valid": True
-                }
-                return render(request, "verify_certificate.html", context)
-                
-            except json.JSONDecodeError as e:
-                messages.error(request, f"Invalid JSON format in QR code. Error: {str(e)}")
-                return render(request, "verify_certificate.html", {"is_valid": False})
-            except Donation.DoesNotExist:
-                messages.error(request, "Certificate not found. This certificate may be invalid or expired.")
-                return render(request, "verify_certificate.html", {"is_valid": False})
-            except Exception as e:
-                messages.error(request, f"Error verifying certificate: {str(e)}")
-                return render(request, "verify_certificate.html", {"is_valid": False})
-        else:
+        qr_data = (request.POST.get("qr_data") or "").strip()
+        if not qr_data:
             messages.error(request, "No QR code data received.")
             return render(request, "verify_certificate.html", {"is_valid": False})
+
+        try:
+            donation = resolve_donation(qr_data)
+        except InvalidQRToken as e:
+            messages.error(request, str(e))
+            return render(request, "verify_certificate.html", {"is_valid": False})
+        except Donation.DoesNotExist:
+            messages.error(request, "Certificate not found. This certificate may be invalid or expired.")
+            return render(request, "verify_certificate.html", {"is_valid": False})
+
+        context = {
+            "donation": donation,
+            "qr_data": certificate_record(donation),
+            "is_valid": True
+        }
+        return render(request, "verify_certificate.html", context)
     
     return render(request, "verify_certificate.html", {"is_valid": None})
 
+def scanner_authorized(request):
+    """True for a verified staff session or a valid X-Scanner-Key header"""
+    key = request.headers.get("X-Scanner-Key", "")
+    if key:
+        return any(constant_time_compare(key, valid) for valid in getattr(settings, "SCANNER_API_KEYS", []))
+    user = get_session_user(request)
+    staff = getattr(user, "staff", None) if user else None
+    return bool(staff and staff.is_verified)
+
+
+@replica_reads
+@csrf_exempt
+@require_http_methods(["POST"])
+def verify_codes_api(request):
+    """JSON endpoint for handheld scanners.
+
+    Callers authenticate with a verified staff session or a key from
+    SCANNER_API_KEYS in the X-Scanner-Key header. Only signed appointment
+    tokens are accepted, and certificate records carry the donor's public
+    alias, not their name.
+
+    Body: {"kind": "appointment" | "certificate", "code": "..."} for a single
+    scan or {"kind": ..., "codes": [...]} to verify a batch in one request.
+    Returns one record per code, in the order given.
+    """
+    if not scanner_authorized(request):
+        return JsonResponse({"success": False, "error": "Staff login or scanner API key required"}, status=403)
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Request body must be JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"success": False, "error": "Request body must be a JSON object"}, status=400)
+
+    verify = {
+        "appointment": verify_appointment_codes,
+        "certificate": verify_certificate_codes,
+    }.get(payload.get("kind", "appointment"))
+    if verify is None:
+        return JsonResponse({"success": False, "error": "kind must be 'appointment' or 'certificate'"}, status=400)
+
+    if "codes" in payload:
+        codes = payload["codes"]
+        if not isinstance(codes, list):
+            return JsonResponse({"success": False, "error": "codes must be a list"}, status=400)
+        if len(codes) > MAX_BATCH_SIZE:
+            return JsonResponse({"success": False, "error": f"At most {MAX_BATCH_SIZE} codes per request"}, status=400)
+        return JsonResponse({"success": True, "results": verify(codes)})
+
+    result = verify([payload.get("code")])[0]
+    return JsonResponse({"success": True, "result": result})
+
+
+@replica_reads
+@require_GET
+def verify_certificate_serial(request, serial):
+    """Public certificate check behind the URL printed in certificate QR codes.
+
+    Served from the verification cache (hits and misses) with an ETag, so
+    repeat checks of a certificate are answered without touching donor or
+    match rows, and revalidations get a 304 without rendering. Shared caches
+    keep it, so it is rendered without the request: the page never carries
+    the visitor's account menu or flash messages.
+    """
+    record = public_certificate(serial)
+    etag = quote_etag(hashlib.sha256(
+        json.dumps(record, sort_keys=True).encode()
+    ).hexdigest()[:32])
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        context = {"serial": serial, "certificate": record, "is_valid": record is not None}
+        if record:
+            context["confirmed_at"] = datetime.fromisoformat(record["confirmed_at"])
+        response = HttpResponse(render_to_string("verify_serial.html", context), status=200 if record else 404)
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=PUBLIC_MAX_AGE if record else NEGATIVE_CACHE_SECONDS)
+    return response
+
 
 @require_login
 @require_staff
 def complete_donation(request, user, staff, appointment_id):
     """Staff marks donation as completed and generates certificate"""
-    appointment = get_object_or_404(DonationAppointment, pk=appointment_id)
+    appointment = get_object_or_404(DonationAppointment.objects.with_verification_graph(), pk=appointment_id)
     
     # Verify the appointment belongs to staff's hospital
-    if appointment.match.blood_request.hospital != staff.hospital:
+    if appointment.match.blood_request.hospital_id != staff.hospital_id:
         messages.error(request, "You can only complete donations for your hospital.")
         return redirect("index")
     
@@ -692,13 +731,37 @@ def complete_donation(request, user, staff, appointment_id):
         unique_id = str(uuid.uuid4())[:8].upper()
         certificate_serial = f"GP-{timestamp}-{unique_id}"
         
-        # Create donation record with certificate serial
-        donation = Donation.objects.create(
-            match=appointment.match,
-            confirmed_by=staff,
-            units=1,  # Default 1 unit, can be made configurable
-            certificate_serial=certificate_serial
-        )
+        with transaction.atomic():
+            # Create donation record with certificate serial
+            donation = Donation.objects.create(
+                match=appointment.match,
+                confirmed_by=staff,
+                units=1,  # Default 1 unit, can be made configurable
+                certificate_serial=certificate_serial
+            )
+            
+            # Update match status
+            appointment.match.status = "donated"
+            appointment.match.donated_at = timezone.now()
+            appointment.match.save()
+            
+            # Donor's denormalized donation count and last donation date
+            Donor.objects.filter(pk=appointment.match.donor_id).record_donation(
+                timezone.localdate(appointment.match.donated_at)
+            )
+            
+            # Update blood request status based on actual donation completion
+            blood_request = appointment.match.blood_request
+            blood_request.units_fulfilled += donation.units
+            
+            # Update request status based on fulfillment level
+            if blood_request.units_fulfilled >= blood_request.units_requested:
+                blood_request.status = "fulfilled"
+            elif blood_request.units_fulfilled > 0:
+                blood_request.status = "partial"
+            
+            blood_request.save()
+        invalidate_appointment(appointment.id)
         
         # Generate certificate
         try:
@@ -707,24 +770,6 @@ def complete_donation(request, user, staff, appointment_id):
         except Exception as e:
             messages.error(request, f"Donation completed but certificate generation failed: {str(e)}")
         
-        # Update match status
-        from django.utils import timezone
-        appointment.match.status = "donated"
-        appointment.match.donated_at = timezone.now()
-        appointment.match.save()
-        
-        # Update blood request status based on actual donation completion
-        blood_request = appointment.match.blood_request
-        blood_request.units_fulfilled += donation.units
-        
-        # Update request status based on fulfillment level
-        if blood_request.units_fulfilled >= blood_request.units_requested:
-            blood_request.status = "fulfilled"
-        elif blood_request.units_fulfilled > 0:
-            blood_request.status = "partial"
-        
-        blood_request.save()
-        
         return redirect("staff_blood_requests")
     
     context = {
@@ -740,7 +785,7 @@ def donor_appointments(request, user):
     """Donor view of their appointments"""
     donor = user.donor
     from django.db import models
-    appointments = DonationAppointment.objects.filter(
+    appointments = DonationAppointment.objects.for_donor_history().filter(
         match__donor=donor,
         match__status__in=["accepted", "checked_in", "donated"]
     ).filter(
@@ -757,7 +802,7 @@ def donor_appointments(request, user):
 def donor_donations(request, user):
     """Donor view of their donation history"""
     donor = user.donor
-    donations = Donation.objects.filter(
+    donations = Donation.objects.for_donor_history().filter(
         match__donor=donor
     ).order_by("-confirmed_at")
     
@@ -768,46 +813,50 @@ def donor_donations(request, user):
 
 def download_certificate(request, donation_id):
     """Download donation certificate"""
-    donation = get_object_or_404(Donation, pk=donation_id)
-    
-    # Check if user is the donor or staff from the same hospital
-    user = None
-    if request.session.get("user_id"):
-        try:
-            user = User.objects.get(pk=request.session["user_id"])
-        except User.DoesNotExist:
-            pass
+    user = get_session_user(request)
     
     if not user:
         messages.error(request, "You must be logged in to download certificates.")
         return redirect("login")
     
-    # Check permissions
-    can_download = False
-    if hasattr(user, "donor") and donation.match.donor == user.donor:
-        can_download = True
-    elif hasattr(user, "staff") and donation.match.blood_request.hospital == user.staff.hospital:
-        can_download = True
-    
-    if not can_download:
+    # One query: the donor or staff from the same hospital
+    row = (
+        Donation.objects.accessible_to(user).filter(pk=donation_id)
+        .values_list("certificate_file", "certificate_serial").first()
+    )
+    if row is None:
+        get_object_or_404(Donation, pk=donation_id)
         messages.error(request, "You don't have permission to download this certificate.")
         return redirect("index")
     
-    if not donation.certificate_file:
+    certificate_file, certificate_serial = row
+    if not certificate_file:
         messages.error(request, "Certificate not found.")
         return redirect("index")
     
-    from django.http import FileResponse
-    import os
-    from django.conf import settings
-    
-    file_path = os.path.join(settings.MEDIA_ROOT, donation.certificate_file.name)
-    if os.path.exists(file_path):
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=f"donation_certificate_{donation.certificate_serial}.pdf")
-    else:
+    try:
+        return serve_protected(
+            certificate_file, as_attachment=True,
+            filename=f"donation_certificate_{certificate_serial}.pdf",
+        )
+    except Http404:
         messages.error(request, "Certificate file not found.")
         return redirect("index")
 
+@require_login
+def appointment_qr_image(request, user, appointment_id):
+    """QR code image for the donor's appointment (or staff at its hospital)"""
+    qr_code_image = (
+        DonationAppointment.objects.accessible_to(user).filter(pk=appointment_id)
+        .values_list("qr_code_image", flat=True).first()
+    )
+    if not qr_code_image:
+        raise Http404("QR code not found.")
+    return serve_protected(
+        qr_code_image, as_attachment="download" in request.GET,
+        filename=f"appointment_{appointment_id}_qr.png",
+    )
+
 @require_login
 @require_staff
 def staff_blood_requests(request, user, staff):
@@ -825,21 +874,97 @@ def staff_blood_requests(request, user, staff):
     }
     return render(request, "staff_blood_requests.html", context)
 
+STATS_PERIODS = (30, 90, 365)
+
+@replica_reads
+@require_login
+@require_staff
+def hospital_stats(request, user, staff):
+    """Staff statistics for their hospital, read only from the daily rollups"""
+    try:
+        days = int(request.GET.get("days", 90))
+    except ValueError:
+        days = 90
+    if days not in STATS_PERIODS:
+        days = 90
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rollups = DailyHospitalStats.objects.filter(hospital_id=staff.hospital_id, day__gte=since)
+
+    sums = {
+        # Daily medians weighted by the requests they cover; their mean is not
+        # the median of the period, so it is shown as an average. Listed first,
+        # so its F() refers to the column and not the requests_fulfilled sum.
+        "fulfil_hours_weighted": models.Sum(
+            models.F("median_hours_to_fulfil") * models.F("requests_fulfilled"), output_field=models.FloatField()
+        ),
+        **{
+            field: models.Sum(field) for field in (
+                "requests_created", "units_requested", "units_fulfilled", "requests_fulfilled",
+                "matches_created", "matches_accepted", "matches_declined", "donations",
+            )
+        },
+    }
+    daily = list(rollups.values("day").annotate(**sums).order_by("day"))
+    by_type = list(rollups.values("abo", "rh").annotate(**sums).order_by("abo", "rh"))
+
+    def summarize(row):
+        decided = (row["matches_accepted"] or 0) + (row["matches_declined"] or 0)
+        row["accept_rate"] = round(100 * (row["matches_accepted"] or 0) / decided) if decided else None
+        row["avg_median_hours"] = (
+            round(row["fulfil_hours_weighted"] / row["requests_fulfilled"], 1)
+            if row["requests_fulfilled"] and row["fulfil_hours_weighted"] is not None else None
+        )
+        return row
+
+    totals = summarize({key: sum(row[key] or 0 for row in daily) for key in sums})
+    context = {
+        "user": user,
+        "hospital": staff.hospital,
+        "days": days,
+        "periods": STATS_PERIODS,
+        "totals": totals,
+        "by_type": [summarize(row) for row in by_type],
+        "chart": {
+            "labels": [row["day"].isoformat() for row in daily],
+            "units_requested": [row["units_requested"] for row in daily],
+            "units_fulfilled": [row["units_fulfilled"] for row in daily],
+            "matches_created": [row["matches_created"] for row in daily],
+        },
+    }
+    return render(request, "hospital_stats.html", context)
+
 @require_login
 @require_staff
 def manage_matches(request, user, staff, request_id):
     """Staff manage matches for a specific blood request (staff only, verified)"""
 
-    blood_request = get_object_or_404(BloodRequest, pk=request_id, hospital=staff.hospital)
-    matches = Match.objects.filter(blood_request=blood_request).select_related(
-        'donor__user'
-    ).order_by('-created_at')
+    blood_request = get_object_or_404(
+        BloodRequest.objects.select_related('hospital', 'city'), pk=request_id, hospital_id=staff.hospital_id
+    )
+    request_matches = Match.objects.filter(blood_request=blood_request)
+    status_counts = request_matches.status_counts()
+
+    # Optional server-side status filter (?status=pending)
+    status_filter = request.GET.get("status", "")
+    if status_filter not in MatchStatus.values:
+        status_filter = ""
+    matches = request_matches.for_staff_board().order_by('-created_at')
+    if status_filter:
+        matches = matches.filter(status=status_filter)
+
+    status_tabs = [
+        {"value": value, "label": label, "count": status_counts[value]}
+        for value, label in MatchStatus.choices
+    ]
 
     context = {
         "user": user,
         "blood_request": blood_request,
         "matches": matches,
-        "hospital": staff.hospital,
+        "status_counts": status_counts,
+        "status_tabs": status_tabs,
+        "status_filter": status_filter,
+        "hospital": blood_request.hospital,
     }
     return render(request, "manage_matches.html", context)
 
@@ -849,9 +974,7 @@ def donor_matches(request, user):
     """Donor view of their matches"""
 
     # Get all matches for this donor
-    matches = Match.objects.filter(donor=user.donor).select_related(
-        'blood_request__hospital', 'blood_request__city'
-    ).order_by('-created_at')
+    matches = Match.objects.with_request_details().filter(donor=user.donor).order_by('-created_at')
 
     context = {
         "user": user,
@@ -878,6 +1001,77 @@ def decline_match(request, user, staff, match_id):
     messages.success(request, f"Match #{match.id} has been declined.")
     return redirect("manage_matches", request_id=match.blood_request.id)
 
+@require_http_methods(["POST"])
+@require_login
+@require_staff
+@retry_on_deadlock
+def bulk_match_action(request, user, staff, request_id):
+    """Accept or decline the selected pending matches of a request in one transaction.
+
+    Accepted donors get their cooldown and an appointment slot; QR images are
+    rendered afterwards by `manage.py render_qr_codes`.
+    """
+    blood_request = get_object_or_404(BloodRequest, pk=request_id, hospital_id=staff.hospital_id)
+    action = request.POST.get("action")
+    match_ids = [int(pk) for pk in request.POST.getlist("match_ids") if pk.isdigit()]
+    if action not in ("accept", "decline") or not match_ids:
+        messages.error(request, "Select at least one pending match and an action.")
+        return redirect("manage_matches", request_id=request_id)
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            # Matches, then donors, are locked in the same order as accept_match,
+            # so a concurrent single accept waits and cannot book the same match twice
+            matches = list(
+                Match.objects.select_for_update()
+                .filter(blood_request=blood_request, status=MatchStatus.PENDING, pk__in=match_ids)
+                .order_by("created_at")
+                .values_list("id", "donor_id")
+            )
+            if action == "accept":
+                # Only donors out of cooldown, and each donor at most once
+                eligible = set(
+                    Donor.objects.select_for_update().eligible()
+                    .filter(pk__in={donor_id for match_id, donor_id in matches}).values_list("pk", flat=True)
+                )
+                booked = set()
+                for match_id, donor_id in list(matches):
+                    if donor_id not in eligible or donor_id in booked:
+                        matches.remove((match_id, donor_id))
+                    booked.add(donor_id)
+            ids = [match_id for match_id, donor_id in matches]
+            if action == "decline":
+                Match.objects.filter(pk__in=ids).update(status=MatchStatus.DECLINED, declined_at=now)
+            elif matches:
+                windows = allocate_slots(staff.hospital, len(matches))
+                Match.objects.filter(pk__in=ids).update(status=MatchStatus.ACCEPTED, accepted_at=now)
+                # Same 8-week cooldown as accept_match
+                Donor.objects.filter(pk__in=[donor_id for match_id, donor_id in matches]).update(
+                    cooldown_until=now + timedelta(days=56)
+                )
+                DonationAppointment.objects.bulk_create([
+                    DonationAppointment(match_id=match_id, window_start=start, window_end=end)
+                    for match_id, (start, end) in zip(ids, windows)
+                ])
+                # MySQL does not return bulk-created keys; the token needs them
+                appointments = list(DonationAppointment.objects.filter(match_id__in=ids).only("id", "match_id", "window_end"))
+                for appointment in appointments:
+                    appointment.qr_code_data = appointment.generate_qr_data()
+                DonationAppointment.objects.bulk_update(appointments, ["qr_code_data"])
+    except NoSlotAvailable as e:
+        messages.error(request, f"{e} No matches were accepted.")
+        return redirect("manage_matches", request_id=request_id)
+
+    skipped = len(set(match_ids)) - len(matches)
+    verb = "accepted" if action == "accept" else "declined"
+    message = f"{len(matches)} matches {verb}."
+    if skipped:
+        reason = "are no longer pending" if action == "decline" else "are no longer pending or the donor is in cooldown"
+        message += f" {skipped} were skipped because they {reason}."
+    messages.success(request, message)
+    return redirect("manage_matches", request_id=request_id)
+
 
 def contact_view(request):
     if request.method == "POST":
@@ -887,18 +1081,17 @@ def contact_view(request):
             email = form.cleaned_data["email"]
             message = form.cleaned_data["message"]
 
-            ContactMessage.objects.create(name=name, email=email, message=message)
-
             subject = f"📩 New Message from {name}"
             body = f"From: {name} <{email}>\n\nMessage:\n{message}"
 
+            # Delivered by the send_queued_email worker, never inside the request
             try:
-                send_mail(subject, body, email, ["givepulse25@gmail.com"])
+                with transaction.atomic():
+                    ContactMessage.objects.create(name=name, email=email, message=message)
+                    enqueue_email(subject, body, ["givepulse25@gmail.com"], from_email=email)
                 messages.success(request, "✅ Your message has been sent successfully!")
             except BadHeaderError:
                 messages.error(request, "Invalid header found.")
-            except Exception as e:
-                messages.error(request, f"⚠️ Error sending email: {e}")
 
             return redirect("contact")
     else:
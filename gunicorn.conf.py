@@ -47,6 +47,13 @@ raw_env = [
 # Preload app for better performance
 preload_app = True
 
+
+def post_fork(server, worker):
+    # With preload_app a connection opened in the master would be shared by
+    # every worker; each worker opens (and then keeps) its own instead
+    from django.db import connections
+    connections.close_all()
+
 # Worker timeout for graceful shutdown
 graceful_timeout = 30
 